@@ -0,0 +1,84 @@
+"""
+Benchmark: clip window expansion, original per-segment loop vs SegmentTimeline.
+
+Run from backend/:
+    python -m benchmarks.bench_clip_windows
+"""
+import random
+import time
+from services.segment_timeline import SegmentTimeline
+
+SIZES = [1_000, 5_000, 10_000, 50_000]
+ANCHORS = [3, 100, 1_000]
+MIN_DURATION = 60.0
+
+
+def make_segments(n, seed=0):
+    rng = random.Random(seed)
+    segments, t = [], 0.0
+    for i in range(n):
+        duration = rng.uniform(1.0, 12.0)
+        segments.append({"id": i, "start": f"{t:.2f}", "end": f"{t + duration:.2f}", "text": f"segment {i}"})
+        t += duration + rng.uniform(0.0, 0.8)
+    return segments
+
+
+def legacy_expand_segment(match, segments, min_duration=60.0):
+    """The pre-SegmentTimeline implementation, kept here as the baseline."""
+    match_index = segments.index(match)
+    start_idx = end_idx = match_index
+    start_time = float(segments[start_idx]["start"])
+    end_time = float(segments[end_idx]["end"])
+    total_duration = end_time - start_time
+
+    while total_duration < min_duration:
+        can_expand_before = start_idx > 0
+        can_expand_after = end_idx < len(segments) - 1
+        if can_expand_before and (not can_expand_after or total_duration < min_duration):
+            start_idx -= 1
+        elif can_expand_after:
+            end_idx += 1
+        else:
+            break
+        start_time = float(segments[start_idx]["start"])
+        end_time = float(segments[end_idx]["end"])
+        total_duration = end_time - start_time
+
+    combined_text = " ".join(seg["text"] for seg in segments[start_idx:end_idx + 1])
+    return {"start": start_time, "end": end_time, "matched_segment": combined_text}
+
+
+def best_of(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    print(f"{'segments':>9} {'anchors':>8} {'legacy ms':>11} {'build ms':>10} {'batched ms':>11} {'speedup':>8}")
+    for n in SIZES:
+        segments = make_segments(n)
+        rng = random.Random(n)
+        build = best_of(lambda: SegmentTimeline(segments))
+        timeline = SegmentTimeline(segments)
+
+        for k in ANCHORS:
+            picks = [rng.randrange(n) for _ in range(k)]
+
+            legacy = best_of(lambda: [legacy_expand_segment(segments[i], segments, MIN_DURATION) for i in picks])
+            batched = best_of(lambda: timeline.windows([(i, i) for i in picks], MIN_DURATION))
+
+            expected = [legacy_expand_segment(segments[i], segments, MIN_DURATION) for i in picks]
+            assert expected == timeline.windows([(i, i) for i in picks], MIN_DURATION)
+
+            print(
+                f"{n:>9} {k:>8} {legacy * 1e3:>11.2f} {build * 1e3:>10.2f} "
+                f"{batched * 1e3:>11.2f} {legacy / (build + batched):>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmark: local keyword-extraction hashtags vs the LLM path.
+
+Run from backend/:
+    python -m benchmarks.bench_hashtags
+
+The LLM path needs OPEN_AI_API_KEY, or OPENAI_BASE_URL pointing at
+benchmarks/mock_llm_server.py; it is skipped otherwise. LLM calls bypass the
+response cache so every run is a real round trip.
+"""
+import os
+import time
+import statistics
+from services.keyword_extractor import CorpusStats, extract_hashtags
+from services.hashtag_generator import generate_hashtags_from_transcript
+
+RUNS_LOCAL = 200
+RUNS_LLM = 5
+
+EPISODE = (
+    "So today we're talking about mental health for college athletes. Mental health is something a lot of "
+    "college athletes struggle with, and the pressure of college sports is real. I remember my first season "
+    "playing basketball, I had panic attacks before every game. Nobody talked about mental health back then. "
+    "Now coaches are finally starting to bring in sports psychologists. A sports psychologist changed my career. "
+    "We worked on breathing, on visualization, on sleep. Sleep is huge. If you're an athlete and you're not "
+    "sleeping, your performance tanks. And social media makes it worse, because every mistake goes viral. "
+    "My advice to young athletes: find someone to talk to, protect your sleep, and get off social media before games. "
+)
+CORPUS = [
+    EPISODE * 6,
+    "We talked about money, investing early and why index funds beat stock picking for most people. " * 20,
+    "Basketball season recap: the playoffs, the trade deadline and which rookies surprised us. " * 20,
+]
+
+CASES = {
+    "video (4000 chars)": (EPISODE * 6)[:4000],
+    "clip quote": "Nobody talked about mental health back then. Now coaches are finally bringing in sports psychologists.",
+}
+
+
+def timed(fn, runs):
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples) * 1000, result
+
+
+def main():
+    corpus = CorpusStats(CORPUS)
+    llm_available = bool(os.getenv("OPEN_AI_API_KEY") or os.getenv("OPENAI_BASE_URL"))
+
+    for name, text in CASES.items():
+        local_ms, (tags, confidence) = timed(lambda: extract_hashtags(text, 5, corpus), RUNS_LOCAL)
+        print(f"\n{name}")
+        print(f"  local  {local_ms:9.2f} ms  confidence {confidence:.2f}  {tags}")
+
+        if llm_available:
+            llm_ms, llm_tags = timed(
+                lambda: generate_hashtags_from_transcript({"text": text}, num_hashtags=5, bypass_cache=True, mode="llm"),
+                RUNS_LLM
+            )
+            print(f"  llm    {llm_ms:9.2f} ms  {llm_tags}  ({llm_ms / local_ms:.0f}x slower)")
+        else:
+            print("  llm    skipped (set OPEN_AI_API_KEY or OPENAI_BASE_URL)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark: smart-cut rendering vs the full libx264/aac re-encode.
+
+Run from backend/:
+    python -m benchmarks.bench_smart_cut [source.mp4]
+
+Without a source, a 10-minute 720p H.264 test video with 2-second GOPs is
+generated first (needs ffmpeg/ffprobe on PATH). Every clip is rendered both
+ways and the wall time, CPU time of the ffmpeg children and output size are
+reported.
+"""
+import os
+import sys
+import time
+import resource
+import tempfile
+import subprocess
+from services.smart_cut import smart_cut, full_reencode
+
+CLIPS = [(12.3, 73.9), (181.7, 242.0), (400.05, 455.5)]
+SYNTHETIC_SECONDS = 600
+
+
+def make_source(path):
+    print(f"🎞️ Generating {SYNTHETIC_SECONDS}s test source: {path}")
+    subprocess.run([
+        "ffmpeg", "-y", "-v", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size=1280x720:rate=30:duration={SYNTHETIC_SECONDS}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:duration={SYNTHETIC_SECONDS}",
+        "-c:v", "libx264", "-profile:v", "high", "-pix_fmt", "yuv420p", "-g", "60", "-preset", "veryfast",
+        "-c:a", "aac", "-shortest", path
+    ], check=True)
+
+
+def children_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def measure(render):
+    wall, cpu = time.perf_counter(), children_cpu()
+    result = render()
+    return time.perf_counter() - wall, children_cpu() - cpu, result
+
+
+def main():
+    workdir = tempfile.mkdtemp(prefix="bench_smart_cut_")
+    source = sys.argv[1] if len(sys.argv) > 1 else os.path.join(workdir, "source.mp4")
+    if not os.path.exists(source):
+        make_source(source)
+
+    totals = {"full": [0.0, 0.0], "smart": [0.0, 0.0]}
+    print(f"{'clip':>16} | {'full wall/cpu':>15} | {'smart wall/cpu':>15} | {'copied':>7} | {'sizes (MB)':>13}")
+    for start, end in CLIPS:
+        full_path = os.path.join(workdir, f"full_{start}.mp4")
+        smart_path = os.path.join(workdir, f"smart_{start}.mp4")
+        full_wall, full_cpu, _ = measure(lambda: full_reencode(source, start, end, full_path))
+        smart_wall, smart_cpu, result = measure(lambda: smart_cut(source, start, end, smart_path))
+        totals["full"][0] += full_wall
+        totals["full"][1] += full_cpu
+        totals["smart"][0] += smart_wall
+        totals["smart"][1] += smart_cpu
+        sizes = f"{os.path.getsize(full_path) / 1e6:.1f}/{os.path.getsize(smart_path) / 1e6:.1f}"
+        print(
+            f"{start:7.1f}-{end:7.1f}s | {full_wall:6.2f}s/{full_cpu:6.2f}s | {smart_wall:6.2f}s/{smart_cpu:6.2f}s"
+            f" | {result['copied']:6.1f}s | {sizes:>13}"
+            + (f"  (fell back: {result['reason']})" if result["mode"] == "full" else "")
+        )
+
+    full_wall, full_cpu = totals["full"]
+    smart_wall, smart_cpu = totals["smart"]
+    print(f"\nTotal: full {full_wall:.2f}s wall / {full_cpu:.2f}s CPU, smart {smart_wall:.2f}s wall / {smart_cpu:.2f}s CPU")
+    print(f"Speedup: {full_wall / smart_wall:.1f}x wall, {full_cpu / max(smart_cpu, 1e-9):.1f}x CPU")
+    print(f"Outputs kept in {workdir}")
+
+
+if __name__ == "__main__":
+    main()
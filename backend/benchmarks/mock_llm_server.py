@@ -0,0 +1,110 @@
+"""
+Local stand-in for the OpenAI chat completions API, for exercising the LLM
+gateway's rate limiting and retries without spending tokens.
+
+Run from backend/:
+    python -m benchmarks.mock_llm_server
+then start the app (or a script) with
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1
+
+MOCK_LATENCY (seconds), MOCK_429_RATE and MOCK_500_RATE (0-1) shape the replies.
+Highlight prompts get the first sentence of the transcript back, so quote
+matching works (one JSON object per sentence, streamed with "stream": true);
+hashtag prompts get a fixed list (or per-clip JSON).
+"""
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+MOCK_LATENCY = float(os.getenv("MOCK_LATENCY", "0.3"))
+MOCK_429_RATE = float(os.getenv("MOCK_429_RATE", "0.1"))
+MOCK_500_RATE = float(os.getenv("MOCK_500_RATE", "0.02"))
+MOCK_PORT = int(os.getenv("MOCK_PORT", "8089"))
+
+app = FastAPI()
+stats = {"requests": 0, "rate_limited": 0, "failed": 0}
+
+
+def find_sentences(prompt):
+    return re.findall(r"[^.!?\n\"]{20,}[.!?]", prompt.split('"""')[-2] if '"""' in prompt else prompt)
+
+
+async def stream_moments(body, prompt):
+    """Streams one JSON moment per line in small deltas, MOCK_LATENCY apart per moment."""
+    top_n = int((re.search(r"top (\d+)", prompt) or [0, 3])[1])
+    sentences = find_sentences(prompt)
+    step = max(1, len(sentences) // max(top_n, 1))
+    chunk = {"id": f"chatcmpl-mock-{stats['requests']}", "object": "chat.completion.chunk",
+             "created": int(time.time()), "model": body.get("model", "mock")}
+    for sentence in sentences[::step][:top_n]:
+        line = json.dumps({"quote": sentence.strip(), "description": "mock moment"}) + "\n"
+        for i in range(0, len(line), 16):
+            await asyncio.sleep(MOCK_LATENCY / max(len(line) // 16, 1))
+            delta = {"choices": [{"index": 0, "delta": {"content": line[i:i + 16]}, "finish_reason": None}]}
+            yield f"data: {json.dumps({**chunk, **delta})}\n\n"
+    usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": 50, "total_tokens": len(prompt) // 4 + 50}
+    yield f"data: {json.dumps({**chunk, 'choices': [], 'usage': usage})}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats["requests"] += 1
+    prompt = body["messages"][-1]["content"]
+
+    roll = random.random()
+    if roll < MOCK_429_RATE:
+        stats["rate_limited"] += 1
+        return JSONResponse(
+            {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+            status_code=429,
+            headers={"retry-after": "1"}
+        )
+    if roll < MOCK_429_RATE + MOCK_500_RATE:
+        stats["failed"] += 1
+        return JSONResponse({"error": {"message": "Server error", "type": "server_error"}}, status_code=500)
+
+    await asyncio.sleep(MOCK_LATENCY * random.uniform(0.5, 1.5))
+
+    if "hashtags" in prompt:
+        tags = ["podcast", "storytime", "mindset", "viral", "fyp"]
+        if body.get("response_format", {}).get("type") == "json_object":
+            clips = re.findall(r"Clip (\d+):", prompt)
+            content = json.dumps({"clips": {i: tags[:3] for i in clips}})
+        else:
+            content = json.dumps(tags)
+    elif body.get("stream"):
+        return StreamingResponse(stream_moments(body, prompt), media_type="text/event-stream")
+    else:
+        sentences = find_sentences(prompt)
+        content = f'"{sentences[0].strip()}"' if sentences else '"Nothing stood out."'
+    prompt_tokens = len(prompt) // 4
+    completion_tokens = len(content) // 4
+    return {
+        "id": f"chatcmpl-mock-{stats['requests']}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "mock"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+@app.get("/stats")
+def get_stats():
+    return stats
+
+
+if __name__ == "__main__":
+    uvicorn.run(app, host="127.0.0.1", port=MOCK_PORT)
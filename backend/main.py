@@ -1,18 +1,22 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Depends, BackgroundTasks, Body
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Depends, BackgroundTasks, Body, Header
 import uvicorn
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from fastapi import Request
+import hashlib
 from fastapi.staticfiles import StaticFiles
 from sqlalchemy.orm import Session
 import os
 from services.video_processing import extract_audio
 from services.transcription import transcribe_audio
-from services.database import SessionLocal, engine, Transcription, init_db, Video, Clip, Hashtag
+from services.database import SessionLocal, engine, Transcription, init_db, Video, Clip, Job
 from services.clips_generator import generate_clip
-from typing import List
+from typing import List, Optional
 from pydantic import BaseModel
 
 #testing ai clip gen
-from services.ai_clip_selector import run_pipeline_and_return_highlights
+from services.ai_clip_selector import run_pipeline_and_return_highlights, stream_highlights, selection_settings
 import json  
 import glob
 
@@ -22,12 +26,32 @@ from uuid import uuid4
 import io
 from botocore.exceptions import NoCredentialsError
 import requests
-from services.hashtag_generator import generate_hashtags_from_transcript
-
-from services.ecs_launcher import launch_ecs_task
-import time
+from services.hashtag_generator import generate_hashtags_from_transcript, generate_hashtags_batch, uses_local_hashtags
+from services.keyword_extractor import get_user_corpus
+from services.hashtag_store import normalize_tags, link_video_hashtags, link_clip_hashtags, tag_clips, unlink_video_hashtag
+from concurrent.futures import ThreadPoolExecutor
+from services.llm_cache import cache_stats
+from services.llm_gateway import get_llm_gateway
+
+from services.ecs_launcher import launch_ecs_batch_task, CLIP_RENDER_PROFILES
+from services.media_index import load_media_index, media_index_key_for, cut_plan
+from services.job_queue import create_job, enqueue_job, resume_pending_jobs, job_to_dict
+from services.storage import s3_client, AWS_S3_BUCKET, AWS_REGION, s3_url_for_key, s3_key_from_url
+from services.ecs_completion import notify_output, ECS_CALLBACK_TOKEN
+from services.transcript_store import (
+    store_segments, delete_segments, ensure_segments, all_segments, segments_in_range, transcript_text,
+    page_segments, apply_segment_edits, SegmentEditError
+)
+from services.artifact_store import (
+    HashingReader, get_json_artifact, get_artifact_keys, put_artifact,
+    highlights_variant, clip_variant, clip_artifact_key, rendition_key,
+    record_rendered_clip, forget_artifact_objects,
+    video_object_in_use, clip_object_in_use
+)
+import services.ingest_pipeline  # registers the "ingest" pipeline
 
 from routes.auth_routes import router as auth_router
+from routes.upload_routes import router as upload_router
 from services.auth_dependency import get_current_user
 from fastapi.openapi.utils import get_openapi
 
@@ -55,6 +79,7 @@ def on_startup():
     print("🔌 Connecting to the database...")
     init_db()
     print("✅ Database initialized (tables created if they didn't exist)")
+    resume_pending_jobs()
 
 # Enable CORS
 app.add_middleware(
@@ -63,23 +88,33 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
+# Compress large JSON responses (transcripts compress roughly 4-6x)
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 
+# Shared pool for hashtag batches that run while a request launches its ECS renders
+hashtag_executor = ThreadPoolExecutor(max_workers=int(os.getenv("HASHTAG_WORKERS", "4")))
+
+
+def corpus_for_hashtags(db: Session, user_id, regenerate: bool = False):
+    """The user's corpus, loaded only when local keyword extraction will run."""
+    return get_user_corpus(db, user_id) if uses_local_hashtags(regenerate=regenerate) else None
+
+
+def hashtags_for_user(texts: list, user_id, bypass_cache: bool = False) -> list:
+    """Runs on hashtag_executor, so it reads the user's corpus with its own session."""
+    corpus = None
+    if uses_local_hashtags(regenerate=bypass_cache):
+        db = SessionLocal()
+        try:
+            corpus = get_user_corpus(db, user_id)
+        finally:
+            db.close()
+    return generate_hashtags_batch(texts, num_hashtags=3, bypass_cache=bypass_cache, corpus=corpus)
 
-# AWS S3 Configuration
-AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
-AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
-AWS_REGION = os.getenv("AWS_REGION")
-AWS_S3_BUCKET = os.getenv("AWS_S3_BUCKET")
 
-# Initialize S3 Client
-s3_client = boto3.client(
-    "s3",
-    aws_access_key_id=AWS_ACCESS_KEY_ID,
-    aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-    region_name=AWS_REGION,
-)
 
 # Define Pydantic models for request/response
 class HashtagBase(BaseModel):
@@ -91,19 +126,21 @@ class HashtagCreate(HashtagBase):
 class HashtagResponse(HashtagBase):
     videos: List[str] = []
 
-def wait_for_s3_file(bucket: str, key: str, timeout: int = 60):
-    """Polls S3 until a file appears or times out."""
-    for _ in range(timeout):
-        try:
-            s3_client.head_object(Bucket=bucket, Key=key)
-            print(f"✅ Found {key} in S3.")
-            return True
-        except s3_client.exceptions.ClientError:
-            print(f"⏳ Waiting for {key} to appear in S3...")
-            time.sleep(1)
-    raise Exception(f"⏰ Timeout waiting for {key} in S3.")
+class SegmentEdit(BaseModel):
+    id: int  # Segment index, as returned by GET /transcript/
+    text: Optional[str] = None
+    start: Optional[float] = None
+    end: Optional[float] = None
 
+class TranscriptPatch(BaseModel):
+    filename: str
+    edits: List[SegmentEdit]
+    expected_revision: Optional[int] = None
 
+class EcsCallback(BaseModel):
+    output_key: str
+    status: str = "succeeded"
+    error: Optional[str] = None
 
 def custom_openapi():
     if app.openapi_schema:
@@ -137,16 +174,18 @@ def read_root():
 
 
 app.include_router(auth_router, prefix="/auth")
+app.include_router(upload_router, prefix="/uploads")
 
 @app.post("/upload/")
-async def upload_video(
+def upload_video(
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user)
 ):
     """
     Uploads a video to AWS S3, saves metadata in the database,
-    and immediately transcribes it.
+    and queues a background job that extracts audio and transcribes it.
+    Returns the job id right away; poll GET /jobs/{job_id} for progress.
     """
     print(f"📤 Uploading video: {file.filename}")
     user_id = current_user["user_id"]
@@ -159,46 +198,101 @@ async def upload_video(
 
     if existing_video:
         print(f"⚠️ Video '{file.filename}' already exists for this user. Skipping re-upload.")
+        latest_job = db.query(Job).filter(Job.filename == existing_video.filename) \
+            .order_by(Job.created_at.desc()).first()
         return {
             "filename": existing_video.filename,
             "s3_url": existing_video.s3_url,
+            "job_id": latest_job.id if latest_job else None,
             "message": "Video already uploaded."
         }
 
     # Generate a unique S3 filename
     unique_filename = f"{uuid4()}_{file.filename}"
 
-    # Upload to S3
-    s3_client.upload_fileobj(file.file, AWS_S3_BUCKET, unique_filename)
+    # Upload to S3, hashing the bytes as they stream through
+    reader = HashingReader(file.file)
+    s3_client.upload_fileobj(reader, AWS_S3_BUCKET, unique_filename)
 
     # Get public S3 URL
-    s3_url = f"https://{AWS_S3_BUCKET}.s3.{AWS_REGION}.amazonaws.com/{unique_filename}"
+    s3_url = s3_url_for_key(unique_filename)
 
     # Save to DB with user_id
     db_video = Video(
         filename=file.filename,
         s3_url=s3_url,
-        user_id=user_id
+        user_id=user_id,
+        content_hash=reader.hexdigest()
     )
     db.add(db_video)
     db.commit()
 
-    # Transcribe
-    try:
-        transcript = transcribe_and_store(file.filename, db)
-    except HTTPException as e:
-        return {
-            "filename": file.filename,
-            "s3_url": s3_url,
-            "message": f"Upload successful, but transcription failed: {e.detail}"
-        }
+    # Queue audio extraction + transcription in the background
+    job = create_job(db, "ingest", file.filename, user_id)
+    enqueue_job(job.id)
 
     return {
         "filename": file.filename,
         "s3_url": s3_url,
-        "transcript": transcript,
-        "message": "Upload and transcription successful."
+        "job_id": job.id,
+        "message": "Upload successful. Transcription queued."
     }
+
+
+@app.get("/jobs/{job_id}")
+def get_job(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    """
+    Reports the status and per-stage progress of a background job.
+    """
+    job = db.query(Job).filter(
+        Job.id == job_id,
+        Job.user_id == current_user["user_id"]
+    ).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_to_dict(job)
+
+
+@app.get("/llm-cache/stats")
+def llm_cache_stats(current_user=Depends(get_current_user)):
+    """
+    Hit/miss counters of the LLM response cache for this server process.
+    """
+    return cache_stats()
+
+
+@app.get("/llm/metrics")
+def llm_metrics(current_user=Depends(get_current_user)):
+    """
+    Call counts, token usage, retries and latency percentiles of the LLM gateway.
+    """
+    return get_llm_gateway().metrics()
+
+
+@app.post("/ecs/callback")
+def ecs_callback(
+    payload: EcsCallback,
+    x_callback_token: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Completion notification sent by the ECS worker once its output is in S3.
+    Rendered clips are recorded as artifacts here, once they actually exist.
+    """
+    if ECS_CALLBACK_TOKEN and x_callback_token != ECS_CALLBACK_TOKEN:
+        raise HTTPException(status_code=401, detail="Invalid callback token")
+
+    if payload.status == "succeeded":
+        record_rendered_clip(db, payload.output_key)
+
+    delivered = notify_output(payload.output_key, payload.status, payload.error)
+    return {"output_key": payload.output_key, "delivered": delivered}
+
+
 # @app.post("/upload/")
 # async def upload_video(
 #     file: UploadFile = File(...), 
@@ -247,57 +341,6 @@ async def upload_video(
 #         "message": "Upload and transcription successful."
 #     }
 
-def transcribe_and_store(filename: str, db: Session):
-    video_record = db.query(Video).filter(Video.filename == filename).first()
-    if not video_record:
-        raise HTTPException(status_code=404, detail="❌ Video not found in DB")
-
-    s3_url = video_record.s3_url
-    video_s3_key = s3_url.split(f"https://{AWS_S3_BUCKET}.s3.{AWS_REGION}.amazonaws.com/")[-1]
-
-    audio_filename = f"{uuid4()}_{filename.rsplit('.', 1)[0]}.mp3"
-    audio_key = f"audios/{audio_filename}"
-    audio_s3_url = f"https://{AWS_S3_BUCKET}.s3.{AWS_REGION}.amazonaws.com/{audio_key}"
-
-    try:
-        print("🚀 Launching ECS task to extract audio...")
-        launch_ecs_task(
-            mode="extract_audio",
-            bucket=AWS_S3_BUCKET,
-            input_key=video_s3_key,
-            output_key=audio_key
-        )
-
-        # ⏳ Wait until audio is available in S3
-        wait_for_s3_file(AWS_S3_BUCKET, audio_key)
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"❌ ECS audio extraction or wait failed: {e}")
-
-    # ✅ Transcribe from S3 audio URL
-    try:
-        transcript = transcribe_audio(audio_s3_url)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"❌ Transcription failed: {e}")
-
-    # ✅ Save transcript in DB
-    db_transcription = Transcription(filename=filename, transcript=json.dumps(transcript))
-    db.add(db_transcription)
-    db.commit()
-
-    # ✅ Optionally clean up
-    try:
-        s3_client.delete_object(Bucket=AWS_S3_BUCKET, Key=audio_key)
-        print(f"🗑️ Deleted temp audio from S3: {audio_key}")
-    except Exception as e:
-        print(f"⚠️ Could not delete audio file from S3: {e}")
-
-    return transcript
-
-
-
-
-
 # @app.get("/videos/")
 # def list_videos(db: Session = Depends(get_db)):
 #     """
@@ -346,33 +389,43 @@ def delete_video(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to parse video S3 key: {e}")
 
-    # 🗑️ Delete video from S3
-    try:
-        s3_client.delete_object(Bucket=AWS_S3_BUCKET, Key=video_s3_key)
-        print(f"✅ Deleted video from S3: {video_s3_key}")
-    except Exception as e:
-        print(f"❌ Failed to delete video from S3: {e}")
+    # 🗑️ Delete video from S3 (unless an identical upload shares the object)
+    if video_object_in_use(db, video_record.s3_url, filename):
+        print(f"♻️ Video object still used by another upload, keeping: {video_s3_key}")
+    else:
+        try:
+            s3_client.delete_object(Bucket=AWS_S3_BUCKET, Key=video_s3_key)
+            print(f"✅ Deleted video from S3: {video_s3_key}")
+        except Exception as e:
+            print(f"❌ Failed to delete video from S3: {e}")
 
     # 🗑️ Delete associated clips
     clips = db.query(Clip).filter(Clip.filename == filename).all()
     for clip in clips:
-        # Delete clip from S3
-        clip_s3_key = clip.clip_url.split(f"https://{AWS_S3_BUCKET}.s3.{AWS_REGION}.amazonaws.com/")[-1]
-        try:
-            s3_client.delete_object(Bucket=AWS_S3_BUCKET, Key=clip_s3_key)
-            print(f"✅ Deleted clip from S3: {clip_s3_key}")
-        except Exception as e:
-            print(f"❌ Failed to delete clip from S3: {e}")
+        # Delete clip (every rendition) from S3
+        if not clip_object_in_use(db, clip.clip_url, clip.id):
+            for clip_s3_key in clip_object_keys(clip):
+                try:
+                    s3_client.delete_object(Bucket=AWS_S3_BUCKET, Key=clip_s3_key)
+                    print(f"✅ Deleted clip from S3: {clip_s3_key}")
+                except Exception as e:
+                    print(f"❌ Failed to delete clip from S3: {e}")
+            forget_artifact_objects(db, clip_object_keys(clip))
         
         # Delete clip from DB
         db.delete(clip)
 
     # 🗑️ Delete transcription
+    delete_segments(db, filename)
     transcription = db.query(Transcription).filter(Transcription.filename == filename).first()
     if transcription:
         db.delete(transcription)
         print("✅ Deleted transcript from DB")
 
+    # 🗑️ Delete background job records
+    for job in db.query(Job).filter(Job.filename == filename).all():
+        db.delete(job)
+
     # 🗑️ Finally delete video record
     db.delete(video_record)
 
@@ -389,12 +442,44 @@ def delete_video(
 
 
 @app.get("/transcript/")
-def get_transcript(filename: str = Query(...), db: Session = Depends(get_db)):
+def get_transcript(
+    request: Request,
+    filename: str = Query(...),
+    start: Optional[float] = Query(None, description="Only segments ending at or after this time (s)"),
+    end: Optional[float] = Query(None, description="Only segments starting at or before this time (s)"),
+    limit: int = Query(500, ge=1, le=5000),
+    cursor: Optional[int] = Query(None, ge=0, description="next_cursor from the previous page"),
+    compact: bool = Query(False, description="Return rows as arrays instead of objects"),
+    db: Session = Depends(get_db)
+):
+    """
+    Returns a window/page of transcript segments as plain JSON.
+    Supports ETag / If-None-Match so unchanged pages cost a 304.
+    """
     print(f"🔍 Fetching transcript for: {filename}")
-    record = db.query(Transcription).filter(Transcription.filename == filename).first()
+    record = ensure_segments(db, filename)
     if not record:
         raise HTTPException(status_code=404, detail="Transcript not found")
-    return {"filename": filename, "transcript": record.transcript}
+
+    params = f"{filename}|{record.revision}|{start}|{end}|{limit}|{cursor}|{compact}"
+    etag = f'W/"{hashlib.sha1(params.encode()).hexdigest()}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    segments, next_cursor = page_segments(db, record, start=start, end=end, cursor=cursor, limit=limit)
+
+    body = {
+        "filename": filename,
+        "revision": record.revision,
+        "next_cursor": next_cursor
+    }
+    if compact:
+        body["fields"] = ["id", "start", "end", "text"]
+        body["rows"] = [[seg["id"], seg["start"], seg["end"], seg["text"]] for seg in segments]
+    else:
+        body["segments"] = segments
+
+    return JSONResponse(content=body, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
 
 
 @app.put("/transcript/")
@@ -407,17 +492,64 @@ def update_transcript(
     record = db.query(Transcription).filter(Transcription.filename == filename).first()
     if not record:
         raise HTTPException(status_code=404, detail="Transcript not found")
+
+    # The segment table is rebuilt from the replacement, so it must be a full transcript
+    try:
+        updated = json.loads(updated_text)
+    except json.JSONDecodeError:
+        updated = None
+    if not isinstance(updated, dict) or not isinstance(updated.get("segments"), list):
+        raise HTTPException(status_code=400, detail="updated_text must be a JSON transcript with a segments list")
+
     record.transcript = updated_text
+    store_segments(db, filename, updated)  # bumps record.revision
     db.commit()
     return {"message": f"Transcript for {filename} updated."}
 
 
+@app.patch("/transcript/")
+def patch_transcript(
+    patch: TranscriptPatch,
+    db: Session = Depends(get_db)
+):
+    """
+    Applies a batch of segment edits (text and/or retimed start/end) atomically.
+    Only the edited segment rows are written.
+    """
+    print(f"✏️ Patching {len(patch.edits)} segment(s) of: {patch.filename}")
+    if not ensure_segments(db, patch.filename):
+        raise HTTPException(status_code=404, detail="Transcript not found")
+
+    try:
+        record = apply_segment_edits(
+            db,
+            patch.filename,
+            [edit.model_dump() for edit in patch.edits],
+            expected_revision=patch.expected_revision
+        )
+        db.commit()
+    except LookupError as e:
+        db.rollback()
+        raise HTTPException(status_code=404, detail=str(e))
+    except SegmentEditError as e:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=str(e))
+
+    return {
+        "filename": patch.filename,
+        "revision": record.revision,
+        "updated": len(patch.edits),
+        "message": f"Transcript for {patch.filename} updated."
+    }
+
+
 @app.delete("/transcript/")
 def delete_transcript(filename: str = Query(...), db: Session = Depends(get_db)):
     print(f"🗑️ Deleting transcript for: {filename}")
     record = db.query(Transcription).filter(Transcription.filename == filename).first()
     if not record:
         raise HTTPException(status_code=404, detail="Transcript not found")
+    delete_segments(db, filename)
     db.delete(record)
     db.commit()
     return {"message": f"Transcript for {filename} deleted."}
@@ -454,9 +586,118 @@ def upload_to_s3(file_path: str, s3_key: str) -> str:
         print(f"❌ Upload failed: {str(e)}")
         return None
 
+def plan_clip_output(db: Session, video_record: Video, i: int, start: float, end: float):
+    """
+    Returns (output_key, reused): an identical rendered clip's key, or a fresh one.
+    Read-only: renditions are recorded by /ecs/callback once they exist.
+    """
+    content_hash = video_record.content_hash
+
+    # ♻️ Same media + same cut already rendered in every profile: reuse the objects
+    variants = [clip_variant(start, end, profile) for profile in CLIP_RENDER_PROFILES]
+    keys = get_artifact_keys(db, content_hash, "clip", variants)
+    if all(variant in keys for variant in variants):
+        print(f"♻️ Reusing rendered clip: {keys[variants[0]]}")
+        return keys[variants[0]], True
+    if content_hash:
+        return clip_artifact_key(content_hash, start, end), False
+    return f"clips/{uuid4()}_{video_record.filename}_clip{i}.mp4", False
+
+
+def clip_object_keys(clip: Clip) -> list:
+    """S3 keys of every rendition of a clip (just clip_url for clips rendered before profiles)."""
+    urls = json.loads(clip.renditions).values() if clip.renditions else [clip.clip_url]
+    return [s3_key_from_url(url) for url in urls]
+
+
+def save_clip(db: Session, video_record: Video, user_id: str, i: int, highlight: dict, output_key: str, task_arn=None):
+    """Saves the Clip row and returns (db_clip, clip dict for the response)."""
+    clip_url = f"https://{AWS_S3_BUCKET}.s3.{AWS_REGION}.amazonaws.com/{output_key}"
+    renditions = {profile: s3_url_for_key(rendition_key(output_key, profile)) for profile in CLIP_RENDER_PROFILES}
+
+    # ✅ Save metadata in DB with user_id
+    db_clip = Clip(
+        id=str(uuid4()),
+        filename=video_record.filename,
+        start_time=highlight["start"],
+        end_time=highlight["end"],
+        clip_url=clip_url,
+        renditions=json.dumps(renditions),
+        poster_url=renditions.get("poster"),
+        preview_url=renditions.get("preview"),
+        user_id=user_id  # ✅ Secure!
+    )
+    db.add(db_clip)
+    db.commit()
+
+    return db_clip, {
+        "clip_index": i,
+        "start": highlight["start"],
+        "end": highlight["end"],
+        "text": highlight["quote"],
+        "clip_url": clip_url,
+        "renditions": renditions,
+        "poster_url": db_clip.poster_url,
+        "preview_url": db_clip.preview_url,
+        "hashtags": [],
+        "task_arn": task_arn
+    }
+
+
+def clamp_to_media(highlight: dict, media_index) -> dict:
+    """Transcript timings can run past the last frame; cut at the indexed duration."""
+    if media_index and media_index.get("duration"):
+        highlight["end"] = min(highlight["end"], media_index["duration"])
+    return highlight
+
+
+def launch_clip_batch(db: Session, video_record: Video, video_s3_key: str, user_id: str, highlights: dict, media_index=None) -> list:
+    """
+    Plans each highlight ({clip index: highlight}), renders the new ones in one
+    ECS batch task (a single download of the source) and saves their Clip rows.
+    Returns [(clip index, db_clip, clip dict)]; clips whose render could not be
+    launched are left out.
+    """
+    content_hash = video_record.content_hash
+    output_keys = {}
+    renders = []
+    for i, highlight in highlights.items():
+        clamp_to_media(highlight, media_index)
+        output_keys[i], reused = plan_clip_output(db, video_record, i, highlight["start"], highlight["end"])
+        if not reused:
+            renders.append({"index": i, "start": highlight["start"], "end": highlight["end"], "output_key": output_keys[i]})
+            if media_index:
+                plan = cut_plan(media_index, highlight["start"], highlight["end"])
+                print(f"✂️ Clip {i}: {plan['copied']}s stream-copied, {plan['reencoded']}s re-encoded")
+
+    task_arn = None
+    if renders:
+        try:
+            ecs_response = launch_ecs_batch_task(
+                AWS_S3_BUCKET, video_s3_key, renders, media_index_key=media_index_key_for(db, content_hash)
+            )
+            task_arn = ecs_response["tasks"][0]["taskArn"]
+        except Exception as e:
+            print(f"❌ Failed to launch ECS batch for {len(renders)} clips: {e}")
+            for render in renders:
+                output_keys.pop(render["index"])
+    rendered = {render["index"] for render in renders}
+
+    saved = []
+    for i, highlight in highlights.items():
+        if i not in output_keys:
+            continue
+        db_clip, clip = save_clip(
+            db, video_record, user_id, i, highlight, output_keys[i], task_arn if i in rendered else None
+        )
+        saved.append((i, db_clip, clip))
+    return saved
+
+
 @app.post("/generate-ai-clips/")
 def generate_ai_clips(
     filename: str = Body(..., embed=True),
+    regenerate: bool = Body(False, embed=True, description="Ask the LLM again instead of reusing cached highlights"),
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user)  # 🔒 Require auth
 ):
@@ -476,100 +717,182 @@ def generate_ai_clips(
     video_s3_key = s3_url.split(f"https://{AWS_S3_BUCKET}.s3.{AWS_REGION}.amazonaws.com/")[-1]
     print(f"🎥 Found S3 key: {video_s3_key}")
 
-    # 2️⃣ Fetch transcript for the video
-    record = db.query(Transcription).filter(Transcription.filename == filename).first()
+    # 2️⃣ Fetch transcript segments for the video
+    record = ensure_segments(db, filename)
     if not record:
         raise HTTPException(status_code=404, detail="Transcript not found")
 
-    try:
-        transcript_data = json.loads(record.transcript)
-    except json.JSONDecodeError:
-        raise HTTPException(status_code=500, detail="Transcript is not valid JSON")
-
-    segments = transcript_data.get("segments", [])
+    segments = all_segments(db, filename)
     if not segments:
         raise HTTPException(status_code=400, detail="No segments found in transcript.")
 
-    # 3️⃣ AI Highlight Selection
-    try:
-        top_highlights = run_pipeline_and_return_highlights(segments, top_n=3)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"LLM analysis failed: {e}")
+    # 3️⃣ AI Highlight Selection (reused for identical media)
+    content_hash = video_record.content_hash
+    variant = highlights_variant(3, 60.0, segments, selection_settings())
+    top_highlights = None if regenerate else get_json_artifact(db, content_hash, "highlights", variant)
+    llm_report = {}
+    if top_highlights is None:
+        try:
+            top_highlights = run_pipeline_and_return_highlights(
+                segments, top_n=3, cache_key=(filename, record.revision), bypass_cache=regenerate,
+                report=llm_report
+            )
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"LLM analysis failed: {e}")
+        put_artifact(db, content_hash, "highlights", variant, payload=top_highlights)
+    else:
+        print(f"♻️ Reusing highlights for {content_hash[:12]}")
+
+    # 4️⃣ Hashtags for every clip in one LLM call, running while the ECS tasks launch
+    hashtags_future = hashtag_executor.submit(
+        hashtags_for_user,
+        [highlight.get("quote", "") for highlight in top_highlights],
+        user_id,
+        bypass_cache=regenerate
+    )
 
-    # 4️⃣ Generate ECS tasks to create clips
+    # 5️⃣ One ECS batch task renders every new clip from a single download
+    media_index = load_media_index(db, content_hash)
     clips = []
-    for i, highlight in enumerate(top_highlights):
-        start = highlight["start"]
-        end = highlight["end"]
-        text = highlight["quote"]
+    db_clips = {}
+    for i, db_clip, clip in launch_clip_batch(
+        db, video_record, video_s3_key, user_id, dict(enumerate(top_highlights)), media_index
+    ):
+        db_clips[i] = db_clip
+        clips.append(clip)
+
+    # ✅ Attach the batched hashtags (one transaction for every clip)
+    try:
+        all_hashtags = hashtags_future.result()
+        clip_tags = {}
+        for clip in clips:
+            i = clip["clip_index"]
+            clip["hashtags"] = normalize_tags(all_hashtags[i])
+            clip_tags[db_clips[i].id] = clip["hashtags"]
+
+        tag_clips(db, filename, clip_tags)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Hashtag generation failed: {e}")
 
-        output_key = f"clips/{uuid4()}_{filename}_clip{i}.mp4"
-        clip_url = f"https://{AWS_S3_BUCKET}.s3.{AWS_REGION}.amazonaws.com/{output_key}"
+    print(f"✅ All ECS tasks launched for {filename}")
+    return {"filename": filename, "clips": clips, "llm_tokens": llm_report or None}
 
-        try:
-            ecs_response = launch_ecs_task(
-                mode="generate_clip",
-                bucket=AWS_S3_BUCKET,
-                input_key=video_s3_key,
-                output_key=output_key,
-                start=start,
-                end=end
-            )
-            task_arn = ecs_response["tasks"][0]["taskArn"]
 
-            # ✅ Save metadata in DB with user_id
-            db_clip = Clip(
-                id=str(uuid4()),
-                filename=filename,
-                start_time=start,
-                end_time=end,
-                clip_url=clip_url,
-                user_id=user_id  # ✅ Secure!
-            )
-            db.add(db_clip)
-            db.commit()
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-            # ✅ Hashtag generation
-            clip_hashtags = []
-            segment_text = highlight.get("quote", "")
-            if segment_text:
-                try:
-                    segment_transcript = json.dumps({"text": segment_text})
-                    clip_hashtags = generate_hashtags_from_transcript(segment_transcript, num_hashtags=3)
 
-                    for tag in clip_hashtags:
-                        db_hashtag = db.query(Hashtag).filter(Hashtag.name == tag).first()
-                        if not db_hashtag:
-                            db_hashtag = Hashtag(name=tag)
-                            db.add(db_hashtag)
-                            db.commit()
+@app.post("/generate-ai-clips/stream")
+def generate_ai_clips_stream(
+    filename: str = Body(..., embed=True),
+    regenerate: bool = Body(False, embed=True, description="Ask the LLM again instead of reusing cached highlights"),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)  # 🔒 Require auth
+):
+    """
+    Streaming variant of /generate-ai-clips/ (Server-Sent Events). Each clip's
+    ECS render is launched (via launch_clip_batch) as soon as its highlight
+    arrives from the LLM stream.
+    Events: "highlight", "clip", "hashtags" (once, after all clips), "done", "error".
+    """
+    user_id = current_user["user_id"]
+    print(f"🤖 Streaming AI clips for: {filename} by user {user_id}")
 
-                        if db_hashtag not in db_clip.hashtags:
-                            db_clip.hashtags.append(db_hashtag)
+    video_record = db.query(Video).filter(
+        Video.filename == filename,
+        Video.user_id == user_id
+    ).first()
+    if not video_record:
+        raise HTTPException(status_code=404, detail=f"Video '{filename}' not found or access denied.")
 
-                        if db_hashtag not in video_record.hashtags:
-                            video_record.hashtags.append(db_hashtag)
+    record = ensure_segments(db, filename)
+    if not record:
+        raise HTTPException(status_code=404, detail="Transcript not found")
+    segments = all_segments(db, filename)
+    if not segments:
+        raise HTTPException(status_code=400, detail="No segments found in transcript.")
 
-                    db.commit()
-                except Exception as e:
-                    print(f"❌ Hashtag generation failed for clip {i}: {e}")
-
-            clips.append({
-                "clip_index": i,
-                "start": start,
-                "end": end,
-                "text": text,
-                "clip_url": clip_url,
-                "hashtags": clip_hashtags,
-                "task_arn": task_arn
-            })
+    cache_key = (filename, record.revision)
 
+    def events():
+        # The request's session may be closed before the body is streamed; use our own
+        stream_db = SessionLocal()
+        try:
+            video = stream_db.query(Video).filter(
+                Video.filename == filename,
+                Video.user_id == user_id
+            ).first()
+            video_s3_key = video.s3_url.split(f"https://{AWS_S3_BUCKET}.s3.{AWS_REGION}.amazonaws.com/")[-1]
+            variant = highlights_variant(3, 60.0, segments, selection_settings())
+            cached = None if regenerate else get_json_artifact(stream_db, video.content_hash, "highlights", variant)
+            llm_report = {}
+            highlights = cached if cached is not None else stream_highlights(
+                segments, top_n=3, cache_key=cache_key, bypass_cache=regenerate, report=llm_report
+            )
+            media_index = load_media_index(stream_db, video.content_hash)
+
+            # Hashtags run on the shared executor while clips launch: one batch when the
+            # highlights are known up front, otherwise one call per highlight as it arrives
+            hashtag_futures = []
+            if cached is not None:
+                hashtag_futures.append((range(len(cached)), hashtag_executor.submit(
+                    hashtags_for_user, [h.get("quote", "") for h in cached], user_id, bypass_cache=regenerate
+                )))
+
+            top_highlights = []
+            clips = []
+            db_clips = {}
+            for i, highlight in enumerate(highlights):
+                clamp_to_media(highlight, media_index)
+                top_highlights.append(highlight)
+                yield sse_event("highlight", {"clip_index": i, **highlight})
+                if cached is None:
+                    hashtag_futures.append(([i], hashtag_executor.submit(
+                        hashtags_for_user, [highlight.get("quote", "")], user_id, bypass_cache=regenerate
+                    )))
+
+                launched = launch_clip_batch(stream_db, video, video_s3_key, user_id, {i: highlight}, media_index)
+                if not launched:
+                    yield sse_event("error", {"clip_index": i, "detail": "Clip launch failed"})
+                    continue
+                _, db_clips[i], clip = launched[0]
+                clips.append(clip)
+                yield sse_event("clip", clip)
+
+            if cached is None:
+                put_artifact(stream_db, video.content_hash, "highlights", variant, payload=top_highlights)
+
+            try:
+                all_hashtags = {}
+                for indices, future in hashtag_futures:
+                    all_hashtags.update(zip(indices, future.result()))
+                clip_tags = {}
+                for clip in clips:
+                    i = clip["clip_index"]
+                    clip["hashtags"] = normalize_tags(all_hashtags[i])
+                    clip_tags[db_clips[i].id] = clip["hashtags"]
+                tag_clips(stream_db, filename, clip_tags)
+                stream_db.commit()
+                yield sse_event("hashtags", {clip["clip_index"]: clip["hashtags"] for clip in clips})
+            except Exception as e:
+                stream_db.rollback()
+                print(f"❌ Hashtag generation failed: {e}")
+
+            print(f"✅ All ECS tasks launched for {filename}")
+            yield sse_event("done", {"filename": filename, "clips": clips, "llm_tokens": llm_report or None})
         except Exception as e:
-            print(f"❌ Failed to launch ECS for clip {i}: {e}")
-            continue
-
-    print(f"✅ All ECS tasks launched for {filename}")
-    return {"filename": filename, "clips": clips}
+            print(f"❌ Streaming AI clips failed: {e}")
+            yield sse_event("error", {"detail": f"LLM analysis failed: {e}"})
+        finally:
+            stream_db.close()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 @app.get("/get-clips/")
@@ -600,7 +923,10 @@ def get_clips(
                 "clip_id": clip.id,
                 "start_time": clip.start_time,
                 "end_time": clip.end_time,
-                "clip_url": clip.clip_url
+                "clip_url": clip.clip_url,
+                "renditions": json.loads(clip.renditions) if clip.renditions else {"default": clip.clip_url},
+                "poster_url": clip.poster_url,
+                "preview_url": clip.preview_url
             }
             for clip in clips
         ]
@@ -615,20 +941,23 @@ def delete_clip(
     if not clip:
         raise HTTPException(status_code=404, detail="Clip not found")
 
-    # Delete from S3
-    try:
-        clip_s3_key = clip.clip_url.split(f"https://{AWS_S3_BUCKET}.s3.{AWS_REGION}.amazonaws.com/")[-1]
-        s3_client.delete_object(Bucket=AWS_S3_BUCKET, Key=clip_s3_key)
-    except Exception as e:
-        print(f"❌ Failed to delete from S3: {e}")
+    # Delete from S3 (unless another clip reuses the same render)
+    if not clip_object_in_use(db, clip.clip_url, clip.id):
+        for clip_s3_key in clip_object_keys(clip):
+            try:
+                s3_client.delete_object(Bucket=AWS_S3_BUCKET, Key=clip_s3_key)
+            except Exception as e:
+                print(f"❌ Failed to delete from S3: {e}")
+        forget_artifact_objects(db, clip_object_keys(clip))
 
     db.delete(clip)
     db.commit()
     return {"message": f"Clip {clip_id} deleted."}
 
 @app.post("/generate-clip-hashtags/")
-async def generate_clip_hashtags(
+def generate_clip_hashtags(
     clip_id: str = Body(..., embed=True),
+    regenerate: bool = Body(False, embed=True),
     db: Session = Depends(get_db)
 ):
     """
@@ -640,46 +969,29 @@ async def generate_clip_hashtags(
         raise HTTPException(status_code=404, detail="Clip not found")
     
     # Get the video's transcript
-    transcript_record = db.query(Transcription).filter(Transcription.filename == clip.filename).first()
+    transcript_record = ensure_segments(db, clip.filename)
     if not transcript_record:
         raise HTTPException(status_code=404, detail="Transcript not found for this video")
     
     try:
-        # Parse transcript
-        transcript_data = json.loads(transcript_record.transcript)
-        
-        # Find segments that overlap with the clip's time range
-        segments = transcript_data.get("segments", [])
-        clip_segments = []
-        
-        for segment in segments:
-            seg_start = float(segment.get("start", 0))
-            seg_end = float(segment.get("end", 0))
-            
-            # Check if segment overlaps with clip time range
-            if (seg_start <= clip.end_time and seg_end >= clip.start_time):
-                clip_segments.append(segment)
+        # Find segments that overlap with the clip's time range (indexed lookup)
+        clip_segments = segments_in_range(
+            db, clip.filename, clip.start_time, clip.end_time, record=transcript_record
+        )
         
         # Create a mini-transcript with just the clip segments
         clip_text = " ".join([seg.get("text", "") for seg in clip_segments])
         mini_transcript = json.dumps({"text": clip_text})
         
         # Generate hashtags
-        hashtags = generate_hashtags_from_transcript(mini_transcript, num_hashtags=5)
+        hashtags = generate_hashtags_from_transcript(
+            mini_transcript, num_hashtags=5, bypass_cache=regenerate,
+            corpus=corpus_for_hashtags(db, clip.user_id, regenerate)
+        )
         
         # Store hashtags in database
-        for tag in hashtags:
-            # Check if hashtag already exists
-            db_hashtag = db.query(Hashtag).filter(Hashtag.name == tag).first()
-            if not db_hashtag:
-                db_hashtag = Hashtag(name=tag)
-                db.add(db_hashtag)
-                db.commit()
-            
-            # Link hashtag to clip if not already linked
-            if db_hashtag not in clip.hashtags:
-                clip.hashtags.append(db_hashtag)
-        
+        hashtags = normalize_tags(hashtags)
+        link_clip_hashtags(db, {clip.id: hashtags})
         db.commit()
         
         return {"clip_id": clip_id, "hashtags": hashtags}
@@ -690,8 +1002,9 @@ async def generate_clip_hashtags(
 
 # Generate hashtags for a video based on its transcript
 @app.post("/generate-hashtags/")
-async def generate_hashtags(
+def generate_hashtags(
     filename: str = Body(..., embed=True),
+    regenerate: bool = Body(False, embed=True),
     db: Session = Depends(get_db)
 ):
     """
@@ -703,32 +1016,26 @@ async def generate_hashtags(
         raise HTTPException(status_code=404, detail=f"Video '{filename}' not found")
     
     # Get transcript
-    transcript_record = db.query(Transcription).filter(Transcription.filename == filename).first()
+    transcript_record = ensure_segments(db, filename)
     if not transcript_record:
         raise HTTPException(status_code=404, detail="Transcript not found for this video")
     
-    # Generate hashtags
-    hashtags = generate_hashtags_from_transcript(transcript_record.transcript)
+    # Generate hashtags (the generator only reads the first 4000 characters)
+    full_text = transcript_text(db, filename, max_chars=4000)
+    hashtags = generate_hashtags_from_transcript(
+        {"text": full_text}, bypass_cache=regenerate, corpus=corpus_for_hashtags(db, video.user_id, regenerate)
+    )
     
     # Store hashtags in database
-    for tag in hashtags:
-        # Check if hashtag already exists
-        db_hashtag = db.query(Hashtag).filter(Hashtag.name == tag).first()
-        if not db_hashtag:
-            db_hashtag = Hashtag(name=tag)
-            db.add(db_hashtag)
-        
-        # Link hashtag to video if not already linked
-        if db_hashtag not in video.hashtags:
-            video.hashtags.append(db_hashtag)
-    
+    hashtags = normalize_tags(hashtags)
+    link_video_hashtags(db, filename, hashtags)
     db.commit()
     
     return {"filename": filename, "hashtags": hashtags}
 
 # Get hashtags for a specific video
 @app.get("/video-hashtags/")
-async def get_video_hashtags(
+def get_video_hashtags(
     filename: str = Query(...),
     db: Session = Depends(get_db)
 ):
@@ -746,7 +1053,7 @@ async def get_video_hashtags(
 
 # Get hashtags for a specific clip
 @app.get("/clip-hashtags/")
-async def get_clip_hashtags(
+def get_clip_hashtags(
     clip_id: str = Query(...),
     db: Session = Depends(get_db)
 ):
@@ -764,7 +1071,7 @@ async def get_clip_hashtags(
 
 # Add custom hashtags to a video
 @app.post("/add-video-hashtag/")
-async def add_video_hashtag(
+def add_video_hashtag(
     filename: str = Body(...),
     hashtag: str = Body(...),
     db: Session = Depends(get_db)
@@ -779,23 +1086,17 @@ async def add_video_hashtag(
     # Normalize hashtag (remove # if present, convert to lowercase)
     hashtag = hashtag.lstrip('#').lower()
     
-    # Check if hashtag already exists
-    db_hashtag = db.query(Hashtag).filter(Hashtag.name == hashtag).first()
-    if not db_hashtag:
-        db_hashtag = Hashtag(name=hashtag)
-        db.add(db_hashtag)
-    
     # Link hashtag to video if not already linked
-    if db_hashtag not in video.hashtags:
-        video.hashtags.append(db_hashtag)
-        db.commit()
+    added = link_video_hashtags(db, filename, [hashtag])
+    db.commit()
+    if added:
         return {"message": f"Hashtag '#{hashtag}' added to video '{filename}'"}
     else:
         return {"message": f"Hashtag '#{hashtag}' already exists for video '{filename}'"}
 
 # Remove a hashtag from a video
 @app.delete("/remove-video-hashtag/")
-async def remove_video_hashtag(
+def remove_video_hashtag(
     filename: str = Query(...),
     hashtag: str = Query(...),
     db: Session = Depends(get_db)
@@ -810,13 +1111,9 @@ async def remove_video_hashtag(
     # Normalize hashtag
     hashtag = hashtag.lstrip('#').lower()
     
-    # Find hashtag
-    db_hashtag = db.query(Hashtag).filter(Hashtag.name == hashtag).first()
-    if not db_hashtag or db_hashtag not in video.hashtags:
-        raise HTTPException(status_code=404, detail=f"Hashtag '#{hashtag}' not found for this video")
-    
     # Remove association between video and hashtag
-    video.hashtags.remove(db_hashtag)
+    if not unlink_video_hashtag(db, filename, hashtag):
+        raise HTTPException(status_code=404, detail=f"Hashtag '#{hashtag}' not found for this video")
     db.commit()
     
     return {"message": f"Hashtag '#{hashtag}' removed from video '{filename}'"}
@@ -0,0 +1,232 @@
+import os
+import math
+from uuid import uuid4
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+from services.database import SessionLocal, Video, UploadSession
+from services.auth_dependency import get_current_user
+from services.job_queue import create_job, enqueue_job
+from services.storage import s3_client, AWS_S3_BUCKET, s3_url_for_key, MAX_PARTS, UPLOAD_PART_SIZE
+from services.artifact_store import content_hash_from_checksum
+
+router = APIRouter()
+
+PRESIGNED_URL_EXPIRY = int(os.getenv("UPLOAD_URL_EXPIRY", "3600"))
+
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+class InitiateUploadRequest(BaseModel):
+    filename: str
+    size: int
+    content_type: Optional[str] = "video/mp4"
+
+
+def _part_size_for(total_size: int) -> int:
+    return max(UPLOAD_PART_SIZE, math.ceil(total_size / MAX_PARTS))
+
+
+def _presign_part(session: UploadSession, part_number: int) -> dict:
+    url = s3_client.generate_presigned_url(
+        "upload_part",
+        Params={
+            "Bucket": AWS_S3_BUCKET,
+            "Key": session.s3_key,
+            "UploadId": session.upload_id,
+            "PartNumber": part_number,
+            "ChecksumAlgorithm": "SHA256",
+        },
+        ExpiresIn=PRESIGNED_URL_EXPIRY,
+    )
+    return {"part_number": part_number, "url": url}
+
+
+def _list_uploaded_parts(session: UploadSession) -> list:
+    parts = []
+    kwargs = {"Bucket": AWS_S3_BUCKET, "Key": session.s3_key, "UploadId": session.upload_id}
+    while True:
+        response = s3_client.list_parts(**kwargs)
+        parts += [
+            {"part_number": p["PartNumber"], "etag": p["ETag"], "size": p["Size"], "checksum": p.get("ChecksumSHA256")}
+            for p in response.get("Parts", [])
+        ]
+        if not response.get("IsTruncated"):
+            return parts
+        kwargs["PartNumberMarker"] = response["NextPartNumberMarker"]
+
+
+def _get_session(db: Session, upload_id: str, user_id: str) -> UploadSession:
+    session = db.query(UploadSession).filter(
+        UploadSession.upload_id == upload_id,
+        UploadSession.user_id == user_id
+    ).first()
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return session
+
+
+@router.post("/initiate")
+def initiate_upload(
+    data: InitiateUploadRequest,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    """
+    Starts an S3 multipart upload and returns one presigned URL per part.
+    The client PUTs each byte range straight to S3, in parallel.
+    """
+    user_id = current_user["user_id"]
+    print(f"📤 Initiating direct upload: {data.filename} ({data.size} bytes)")
+
+    if data.size <= 0:
+        raise HTTPException(status_code=400, detail="File size must be positive.")
+
+    existing_video = db.query(Video).filter(
+        Video.filename == data.filename,
+        Video.user_id == user_id
+    ).first()
+    if existing_video:
+        raise HTTPException(status_code=409, detail="Video already uploaded.")
+
+    s3_key = f"{uuid4()}_{data.filename}"
+    response = s3_client.create_multipart_upload(
+        Bucket=AWS_S3_BUCKET,
+        Key=s3_key,
+        ContentType=data.content_type or "application/octet-stream",
+        # Each part carries its SHA-256, so S3 hands back the content hash on completion
+        ChecksumAlgorithm="SHA256"
+    )
+
+    session = UploadSession(
+        upload_id=response["UploadId"],
+        s3_key=s3_key,
+        filename=data.filename,
+        user_id=user_id,
+        total_size=data.size,
+        part_size=_part_size_for(data.size),
+        content_type=data.content_type
+    )
+    db.add(session)
+    db.commit()
+
+    part_count = math.ceil(session.total_size / session.part_size)
+    return {
+        "upload_id": session.upload_id,
+        "part_size": session.part_size,
+        "part_count": part_count,
+        "parts": [_presign_part(session, n) for n in range(1, part_count + 1)]
+    }
+
+
+@router.get("/{upload_id}")
+def get_upload_status(
+    upload_id: str,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    """
+    Lists the parts S3 already has and fresh URLs for the missing ones,
+    so an interrupted upload resumes from where it stopped.
+    """
+    session = _get_session(db, upload_id, current_user["user_id"])
+
+    uploaded = _list_uploaded_parts(session)
+    done = {p["part_number"] for p in uploaded}
+    part_count = math.ceil(session.total_size / session.part_size)
+
+    return {
+        "upload_id": session.upload_id,
+        "filename": session.filename,
+        "part_size": session.part_size,
+        "part_count": part_count,
+        "uploaded_parts": uploaded,
+        "parts": [_presign_part(session, n) for n in range(1, part_count + 1) if n not in done]
+    }
+
+
+@router.post("/{upload_id}/complete")
+def complete_upload(
+    upload_id: str,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    """
+    Finalizes the multipart upload, creates the Video row and queues ingest.
+    Part ETags are read back from S3, so the browser never has to expose them.
+    """
+    user_id = current_user["user_id"]
+    session = _get_session(db, upload_id, user_id)
+
+    uploaded = _list_uploaded_parts(session)
+    part_count = math.ceil(session.total_size / session.part_size)
+    if len(uploaded) != part_count:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Upload incomplete: {len(uploaded)}/{part_count} parts received."
+        )
+
+    parts = []
+    for p in sorted(uploaded, key=lambda p: p["part_number"]):
+        part = {"PartNumber": p["part_number"], "ETag": p["etag"]}
+        if p["checksum"]:
+            part["ChecksumSHA256"] = p["checksum"]
+        parts.append(part)
+    completed = s3_client.complete_multipart_upload(
+        Bucket=AWS_S3_BUCKET,
+        Key=session.s3_key,
+        UploadId=session.upload_id,
+        MultipartUpload={"Parts": parts}
+    )
+    print(f"✅ Multipart upload complete: {session.s3_key}")
+
+    s3_url = s3_url_for_key(session.s3_key)
+    filename = session.filename
+    db.add(Video(
+        filename=filename,
+        s3_url=s3_url,
+        user_id=user_id,
+        content_hash=content_hash_from_checksum(completed.get("ChecksumSHA256"))
+    ))
+    db.delete(session)
+    db.commit()
+
+    job = create_job(db, "ingest", filename, user_id)
+    enqueue_job(job.id)
+
+    return {
+        "filename": filename,
+        "s3_url": s3_url,
+        "job_id": job.id,
+        "message": "Upload successful. Transcription queued."
+    }
+
+
+@router.delete("/{upload_id}")
+def abort_upload(
+    upload_id: str,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    """Aborts a multipart upload and frees the parts already stored in S3."""
+    session = _get_session(db, upload_id, current_user["user_id"])
+
+    try:
+        s3_client.abort_multipart_upload(
+            Bucket=AWS_S3_BUCKET,
+            Key=session.s3_key,
+            UploadId=session.upload_id
+        )
+    except Exception as e:
+        print(f"⚠️ Could not abort multipart upload: {e}")
+
+    db.delete(session)
+    db.commit()
+    return {"message": f"Upload {upload_id} aborted."}
@@ -1,6 +1,13 @@
-from openai import OpenAI
-import difflib
 import random
+from services.quote_matcher import get_match_index
+from services.segment_timeline import SegmentTimeline, get_timeline
+from services.llm_cache import cached_completion, cache_lookup, cache_store
+from services.llm_gateway import get_llm_gateway
+from services.moment_ranker import PRERANK_ENABLED, PRERANK_TOP_K, prerank_segments, excerpt_text, prerank_settings
+from services.highlight_mapreduce import (
+    HIGHLIGHT_MODEL, HIGHLIGHT_MODE, count_tokens, should_chunk, select_highlight_spans
+)
+from services.highlight_stream import JsonObjectStream, stream_prompt
 import re
 import os
 from dotenv import load_dotenv
@@ -8,11 +15,21 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
-# ✅ Uses API key from environment variable
-client = OpenAI(api_key=os.getenv("OPEN_AI_API_KEY"))
+def complete_prompt(prompt, max_tokens=1000, temperature=0.9, bypass_cache=False):
+    """
+    Default LLM callable: one chat completion, returns the reply text.
+    Answers are cached per (model, prompt, params); bypass_cache forces a fresh call.
+    """
+    def call():
+        return get_llm_gateway().chat(prompt, HIGHLIGHT_MODEL, max_tokens=max_tokens, temperature=temperature)
+
+    return cached_completion(
+        HIGHLIGHT_MODEL, prompt, call, bypass=bypass_cache, max_tokens=max_tokens, temperature=temperature
+    )
+
 
 # 🔹 Step 1: Ask LLM to identify viral/emotional/storytelling moments
-def generate_highlights_from_full_transcript(full_text, top_n=3):
+def generate_highlights_from_full_transcript(full_text, top_n=3, llm=None):
     prompt = f"""
 You are a content analyst assistant helping a creator make short, engaging TikTok videos from a podcast or interview.
 
@@ -34,83 +51,47 @@ Transcript:
 {full_text}
 \"\"\"
 """
-    response = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.9,  # 🔹 Higher temp for more diverse responses
-        max_tokens=1000
-    )
-
-    return response.choices[0].message.content
-
-
-# 🔹 Step 2: Match each quote to a transcript segment using string similarity
-def find_segment_for_quote(quote, segments, fuzz_threshold=0.6):
-    best_match = None
-    highest_ratio = 0
-    for seg in segments:
-        ratio = difflib.SequenceMatcher(None, quote, seg["text"]).ratio()
-        if ratio > highest_ratio:
-            best_match = seg
-            highest_ratio = ratio
-    return best_match if highest_ratio >= fuzz_threshold else None
+    llm = llm or complete_prompt
+    return llm(prompt, max_tokens=1000, temperature=0.9)  # 🔹 Higher temp for more diverse responses
 
 
-# 🔹 Step 3: Expand selected segments to meet minimum clip duration
-def expand_segment(match, segments, min_duration=60.0):
-    if not match:
-        return None
+# 🔹 Step 2: Match each quote to a transcript span using the n-gram match index
+def find_span_for_quote(quote, segments, fuzz_threshold=0.6, match_index=None):
+    """Returns (start_idx, end_idx, score) of the best-matching span, or None."""
+    match_index = match_index or get_match_index(segments)
+    return match_index.match(quote, min_score=fuzz_threshold)
 
-    match_index = segments.index(match)
-    start_idx = match_index
-    end_idx = match_index
 
-    start_time = float(segments[start_idx]["start"])
-    end_time = float(segments[end_idx]["end"])
-    total_duration = end_time - start_time
-
-    # Expand to neighboring segments until we hit min duration
-    while total_duration < min_duration:
-        can_expand_before = start_idx > 0
-        can_expand_after = end_idx < len(segments) - 1
-
-        if can_expand_before and (not can_expand_after or total_duration < min_duration):
-            start_idx -= 1
-        elif can_expand_after:
-            end_idx += 1
-        else:
-            break  # Can't expand anymore
+# 🔹 Step 3: Expand matched spans, ensure at least `top_n` clips & add randomness
+def process_llm_highlights(llm_output, segments, min_duration=60.0, top_n=3, match_index=None, timeline=None):
+    matches = re.findall(r'"([^"]+)"', llm_output)  # Extract quoted strings
 
-        start_time = float(segments[start_idx]["start"])
-        end_time = float(segments[end_idx]["end"])
-        total_duration = end_time - start_time
+    # Built once per transcript and reused for every quote
+    match_index = match_index or get_match_index(segments)
+    timeline = timeline or SegmentTimeline(segments)
 
-    combined_text = " ".join(seg["text"] for seg in segments[start_idx:end_idx + 1])
+    quotes, spans = [], []
+    for quote in matches:
+        span = find_span_for_quote(quote, segments, match_index=match_index)
+        if span:
+            quotes.append(quote)
+            spans.append((span[0], span[1]))
 
-    return {
-        "start": start_time,
-        "end": end_time,
-        "matched_segment": combined_text
-    }
+    return expand_quote_spans(quotes, spans, segments, min_duration, top_n, timeline)
 
 
-# 🔹 Step 4: Ensure at least `top_n` clips & add randomness
-def process_llm_highlights(llm_output, segments, min_duration=60.0, top_n=3):
-    highlights = []
-    matches = re.findall(r'"([^"]+)"', llm_output)  # Extract quoted strings
+def expand_quote_spans(quotes, spans, segments, min_duration=60.0, top_n=3, timeline=None):
+    timeline = timeline or SegmentTimeline(segments)
 
-    for quote in matches:
-        match = find_segment_for_quote(quote, segments)
-        if match:
-            highlight = expand_segment(match, segments, min_duration)
-            if highlight:
-                highlight["quote"] = quote
-                highlights.append(highlight)
+    # All matched spans are expanded in one vectorized call
+    highlights = timeline.windows(spans, min_duration)
+    for highlight, quote in zip(highlights, quotes):
+        highlight["quote"] = quote
 
     # If fewer than top_n, select random segments
     while len(highlights) < top_n:
-        random_segment = random.choice(segments)
-        highlight = expand_segment(random_segment, segments, min_duration)
+        random_idx = random.randrange(len(segments))
+        highlight = timeline.windows([(random_idx, random_idx)], min_duration)[0]
         if highlight and highlight not in highlights:
             highlight["quote"] = "Randomly selected engaging moment"
             highlights.append(highlight)
@@ -118,17 +99,161 @@ def process_llm_highlights(llm_output, segments, min_duration=60.0, top_n=3):
     return highlights
 
 
-# 🔹 Step 5: Main pipeline function
-def run_pipeline_and_return_highlights(segments, top_n=3, min_duration=60.0):
-    full_transcript = " ".join(seg["text"] for seg in segments)
+def selection_settings(mode=None, prerank=None, top_k=None):
+    """The settings that shape the selected highlights, for keying cached results."""
+    return f"{mode or HIGHLIGHT_MODE}:{HIGHLIGHT_MODEL}:{prerank_settings(prerank, top_k)}"
+
+
+def prompt_renderer(prompt_segments, spans=None):
+    """
+    Returns render(first=0, last=None) -> prompt text of prompt_segments[first:last + 1].
+    Pre-ranked windows (spans) each get a header with their time range.
+    """
+    def render(first=0, last=None):
+        if spans:
+            return excerpt_text(prompt_segments, spans, first, last)
+        last = len(prompt_segments) - 1 if last is None else last
+        return " ".join(seg["text"] for seg in prompt_segments[first:last + 1])
+    return render
+
+
+def plan_prompt(segments, cache_key=None, mode=None, prerank=None, top_k=None, report=None):
+    """
+    Decides what is put in front of the LLM. Quotes are always matched against
+    the whole transcript.
+
+    The chunking decision (should_chunk) is made on the whole transcript: one
+    too long for a single prompt goes through map-reduce over every segment,
+    where each window is bounded and the map step does the ranking. Otherwise
+    only the pre-ranked windows are sent, in one prompt. Pre-ranking therefore
+    applies to the single-prompt path only.
+
+    Returns:
+        tuple: (chunked, prompt_segments, segment_tokens, render), render as in prompt_renderer.
+    """
+    segment_tokens = count_tokens(seg["text"] for seg in segments)
+    if should_chunk(segment_tokens, mode):
+        return True, segments, segment_tokens, prompt_renderer(segments)
+
+    prompt_segments = segments
+    spans = None
+    if PRERANK_ENABLED if prerank is None else prerank:
+        prompt_segments, segment_tokens, prerank_report = prerank_segments(
+            segments, segment_tokens, cache_key=cache_key, top_k=top_k or PRERANK_TOP_K
+        )
+        spans = prerank_report["spans"]
+        if report is not None:
+            report.update(prerank_report)
+    return False, prompt_segments, segment_tokens, prompt_renderer(prompt_segments, spans)
+
+
+# 🔹 Step 4: Main pipeline function
+def run_pipeline_and_return_highlights(segments, top_n=3, min_duration=60.0, cache_key=None, mode=None, llm=None,
+                                       bypass_cache=False, prerank=None, top_k=None, report=None):
+    """
+    mode: "single", "chunked" or "auto" (default HIGHLIGHT_MODE). Chunked mode
+    maps the LLM over token-bounded windows concurrently, then reduces to top_n.
+    llm: optional callable(prompt, max_tokens=..., temperature=...) -> str
+    replacing the OpenAI call, e.g. a local fake.
+    bypass_cache: skip cached LLM answers ("regenerate").
+    prerank / top_k: send only the top_k locally ranked windows to the LLM
+    (defaults PRERANK_ENABLED / PRERANK_TOP_K); single-prompt path only, see plan_prompt.
+    report: optional dict, filled with the token counts before and after pre-ranking.
+    """
+    if llm is None:
+        llm = lambda prompt, **kwargs: complete_prompt(prompt, bypass_cache=bypass_cache, **kwargs)
+    match_index = get_match_index(segments, cache_key)
+    timeline = get_timeline(segments, cache_key)
+
+    chunked, prompt_segments, segment_tokens, render = plan_prompt(segments, cache_key, mode, prerank, top_k, report)
+
+    if chunked:
+        candidates = select_highlight_spans(
+            prompt_segments, top_n, llm, match_index, segment_tokens=segment_tokens, render=render
+        )
+        return expand_quote_spans(
+            [cand["quote"] for cand in candidates],
+            [(cand["start_idx"], cand["end_idx"]) for cand in candidates],
+            segments, min_duration=min_duration, top_n=top_n, timeline=timeline
+        )
+
+    full_transcript = render()
     print("\n🔍 Asking LLM to find top emotional/viral/story moments...\n")
-    llm_output = generate_highlights_from_full_transcript(full_transcript, top_n)
+    llm_output = generate_highlights_from_full_transcript(full_transcript, top_n, llm=llm)
     print("🧠 LLM Response:\n", llm_output)
 
-    highlights = process_llm_highlights(llm_output, segments, min_duration=min_duration, top_n=top_n)
+    highlights = process_llm_highlights(
+        llm_output, segments, min_duration=min_duration, top_n=top_n,
+        match_index=match_index, timeline=timeline
+    )
     return highlights
 
 
+def stream_highlights(segments, top_n=3, min_duration=60.0, cache_key=None, mode=None, bypass_cache=False,
+                      prerank=None, top_k=None, report=None):
+    """
+    Generator version of run_pipeline_and_return_highlights for the streaming
+    endpoint: the completion is streamed and each highlight is yielded as soon
+    as its JSON object is complete and matched, so its clip can start rendering
+    while the model is still writing the next one. Random fill-ins, if needed,
+    come last. A cached answer (unless bypass_cache) is replayed instantly.
+    Transcripts too long for one prompt (see should_chunk) go through the
+    map-reduce path instead and are yielded once it finishes.
+    """
+    match_index = get_match_index(segments, cache_key)
+    timeline = get_timeline(segments, cache_key)
+
+    chunked, prompt_segments, segment_tokens, render = plan_prompt(segments, cache_key, mode, prerank, top_k, report)
+
+    if chunked:
+        llm = lambda prompt, **kwargs: complete_prompt(prompt, bypass_cache=bypass_cache, **kwargs)
+        candidates = select_highlight_spans(
+            prompt_segments, top_n, llm, match_index, segment_tokens=segment_tokens, render=render
+        )
+        yield from expand_quote_spans(
+            [cand["quote"] for cand in candidates],
+            [(cand["start_idx"], cand["end_idx"]) for cand in candidates],
+            segments, min_duration=min_duration, top_n=top_n, timeline=timeline
+        )
+        return
+
+    prompt = stream_prompt(render(), top_n)
+    params = {"max_tokens": 1000, "temperature": 0.9}
+    cached = None if bypass_cache else cache_lookup(HIGHLIGHT_MODEL, prompt, **params)
+    chunks = [cached] if cached is not None else get_llm_gateway().stream_chat(prompt, HIGHLIGHT_MODEL, **params)
+
+    parser = JsonObjectStream("quote")
+    highlights = []
+    used = []
+    print("\n🔍 Streaming LLM highlights...\n")
+    for chunk in chunks:
+        for moment in parser.feed(chunk):
+            if len(highlights) >= top_n:
+                continue
+            span = match_index.match(str(moment["quote"]))
+            if not span or any(span[0] <= e and s <= span[1] for s, e in used):
+                continue
+            used.append((span[0], span[1]))
+            highlight = timeline.windows([(span[0], span[1])], min_duration)[0]
+            highlight["quote"] = moment["quote"]
+            highlight["description"] = moment.get("description", "")
+            highlights.append(highlight)
+            print(f"✨ Highlight {len(highlights)}/{top_n}: {highlight['start']:.1f}s-{highlight['end']:.1f}s")
+            yield highlight
+
+    if cached is None:
+        cache_store(HIGHLIGHT_MODEL, prompt, parser.text(), **params)
+
+    # If fewer than top_n, select random segments
+    while len(highlights) < top_n:
+        random_idx = random.randrange(len(segments))
+        highlight = timeline.windows([(random_idx, random_idx)], min_duration)[0]
+        if highlight and highlight not in highlights:
+            highlight["quote"] = "Randomly selected engaging moment"
+            highlights.append(highlight)
+            yield highlight
+
+
 
 
 
@@ -0,0 +1,247 @@
+import re
+import json
+import base64
+import hashlib
+from sqlalchemy.orm import Session
+from services.database import SessionLocal, MediaArtifact, Video, Clip
+from services.storage import s3_client, AWS_S3_BUCKET, UPLOAD_PART_SIZE
+
+# Content hash of a video: SHA-256 over the SHA-256 of each UPLOAD_PART_SIZE part,
+# hex encoded. This is the composite ChecksumSHA256 S3 computes for a multipart
+# upload, so direct-to-S3 uploads get their hash without the API reading the bytes.
+
+
+def multipart_content_hash(part_digests: list) -> str:
+    return hashlib.sha256(b"".join(part_digests)).hexdigest()
+
+
+def content_hash_from_checksum(checksum: str, size: int = None):
+    """
+    Content hash from an S3 ChecksumSHA256 value, or None if there is none.
+    Composite checksums ("<base64>-<parts>") are used as is; a full-object
+    checksum only matches the scheme when the object fits in one part.
+    """
+    if not checksum:
+        return None
+    digest, _, parts = checksum.partition("-")
+    digest = base64.b64decode(digest)
+    if parts:
+        return digest.hex()
+    if size is not None and size <= UPLOAD_PART_SIZE:
+        return multipart_content_hash([digest])
+    return None
+
+
+def s3_content_hash(key: str):
+    """Reads the content hash from the object's stored checksum (no download); None if it has none."""
+    attributes = s3_client.get_object_attributes(
+        Bucket=AWS_S3_BUCKET, Key=key, ObjectAttributes=["Checksum", "ObjectSize"]
+    )
+    checksum = (attributes.get("Checksum") or {}).get("ChecksumSHA256")
+    return content_hash_from_checksum(checksum, attributes.get("ObjectSize"))
+
+
+class HashingReader:
+    """
+    Wraps a file object and hashes every byte read through it,
+    so the content hash is computed while the upload streams to S3.
+    """
+
+    def __init__(self, fileobj, part_size: int = UPLOAD_PART_SIZE):
+        self.fileobj = fileobj
+        self.part_size = part_size
+        self.part_digests = []
+        self._part = hashlib.sha256()
+        self._part_bytes = 0
+
+    def read(self, size=-1):
+        chunk = self.fileobj.read(size)
+        view = memoryview(chunk)
+        while view:
+            take = min(len(view), self.part_size - self._part_bytes)
+            self._part.update(view[:take])
+            self._part_bytes += take
+            view = view[take:]
+            if self._part_bytes == self.part_size:
+                self.part_digests.append(self._part.digest())
+                self._part = hashlib.sha256()
+                self._part_bytes = 0
+        return chunk
+
+    def hexdigest(self) -> str:
+        digests = list(self.part_digests)
+        if self._part_bytes or not digests:
+            digests.append(self._part.digest())
+        return multipart_content_hash(digests)
+
+
+# --------------------------
+# Artifact keys
+# --------------------------
+def artifact_prefix(content_hash: str) -> str:
+    return f"artifacts/{content_hash}"
+
+
+def segments_digest(segments: list) -> str:
+    """Short hash of the transcript segments, so edited transcripts get their own artifacts."""
+    material = json.dumps([[seg["start"], seg["end"], seg["text"]] for seg in segments])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()[:16]
+
+
+def highlights_variant(top_n: int, min_duration: float, segments: list, settings: str = "") -> str:
+    """settings: the selection mode, model and pre-ranking in effect (see ai_clip_selector.selection_settings)."""
+    return f"top{top_n}:min{min_duration:g}:{settings}:{segments_digest(segments)}"
+
+
+def clip_variant(start: float, end: float, profile: str = "default") -> str:
+    return f"{float(start):.3f}-{float(end):.3f}:{profile}"
+
+
+def clip_artifact_key(content_hash: str, start: float, end: float, profile: str = "default") -> str:
+    return f"{artifact_prefix(content_hash)}/clips/{float(start):.3f}-{float(end):.3f}_{profile}.mp4"
+
+
+# artifacts/<hash>/clips/<start>-<end>_default.mp4 and its renditions (..._default_<profile>.<ext>)
+CLIP_ARTIFACT_KEY = re.compile(r"^artifacts/([0-9a-f]+)/clips/([0-9.]+)-([0-9.]+)_default(?:_([a-z]+))?\.[a-z0-9]+$")
+
+
+def parse_clip_artifact_key(key: str):
+    """Returns (content_hash, start, end, profile) for a content-addressed clip key, else None."""
+    match = CLIP_ARTIFACT_KEY.match(key)
+    if not match:
+        return None
+    content_hash, start, end, profile = match.groups()
+    return content_hash, float(start), float(end), profile or "default"
+
+
+def record_rendered_clip(db: Session, key: str) -> bool:
+    """Records a clip rendition once its object is in S3; False for non content-addressed keys."""
+    parsed = parse_clip_artifact_key(key)
+    if not parsed:
+        return False
+    content_hash, start, end, profile = parsed
+    put_artifact(db, content_hash, "clip", clip_variant(start, end, profile), s3_key=key)
+    return True
+
+
+# File extension of each worker render profile (cloud-processing/renditions.py)
+RENDITION_EXTENSIONS = {"default": ".mp4", "tiktok": ".mp4", "preview": ".mp4", "poster": ".jpg", "thumbnail": ".webp"}
+
+
+def rendition_key(output_key: str, profile: str) -> str:
+    """Same rule as the worker: "default" is output_key, others get a suffix and their extension."""
+    if profile == "default":
+        return output_key
+    root = output_key.rsplit(".", 1)[0]
+    return f"{root}_{profile}{RENDITION_EXTENSIONS[profile]}"
+
+
+# --------------------------
+# Lookup / store
+# --------------------------
+def get_artifact(db: Session, content_hash: str, kind: str, variant: str = ""):
+    if not content_hash:
+        return None
+    return db.query(MediaArtifact).filter(
+        MediaArtifact.content_hash == content_hash,
+        MediaArtifact.kind == kind,
+        MediaArtifact.variant == variant
+    ).first()
+
+
+def get_json_artifact(db: Session, content_hash: str, kind: str, variant: str = ""):
+    """Returns the decoded payload of an inline artifact, or None."""
+    artifact = get_artifact(db, content_hash, kind, variant)
+    if not artifact or artifact.payload is None:
+        return None
+    return json.loads(artifact.payload)
+
+
+def get_artifact_keys(db: Session, content_hash: str, kind: str, variants) -> dict:
+    """
+    S3 keys of several object artifacts of one kind, {variant: s3_key}, in one
+    query. The table is trusted: rows are added once the object is written and
+    removed (forget_artifact_objects) when it is deleted, so S3 is not consulted.
+    """
+    if not content_hash:
+        return {}
+    rows = db.query(MediaArtifact.variant, MediaArtifact.s3_key).filter(
+        MediaArtifact.content_hash == content_hash,
+        MediaArtifact.kind == kind,
+        MediaArtifact.variant.in_(list(variants)),
+        MediaArtifact.s3_key.isnot(None)
+    ).all()
+    return dict(rows)
+
+
+def forget_artifact_objects(db: Session, s3_keys: list):
+    """Drops the artifact rows of deleted S3 objects (committed by the caller)."""
+    if s3_keys:
+        db.query(MediaArtifact).filter(MediaArtifact.s3_key.in_(list(s3_keys))).delete(synchronize_session=False)
+
+
+def s3_object_exists(key: str) -> bool:
+    try:
+        s3_client.head_object(Bucket=AWS_S3_BUCKET, Key=key)
+        return True
+    except s3_client.exceptions.ClientError:
+        return False
+
+
+def get_s3_artifact(db: Session, content_hash: str, kind: str, variant: str = ""):
+    """Returns the S3 key of an object artifact if the object still exists, or None."""
+    artifact = get_artifact(db, content_hash, kind, variant)
+    if not artifact or not artifact.s3_key:
+        return None
+    if s3_object_exists(artifact.s3_key):
+        return artifact.s3_key
+
+    print(f"⚠️ Artifact {kind}/{variant} for {content_hash[:12]} is gone from S3, discarding it.")
+    # Deleted in a session of its own: a lookup must not commit the caller's pending work
+    db.expunge(artifact)
+    cleanup = SessionLocal()
+    try:
+        cleanup.query(MediaArtifact).filter(
+            MediaArtifact.content_hash == content_hash,
+            MediaArtifact.kind == kind,
+            MediaArtifact.variant == variant
+        ).delete()
+        cleanup.commit()
+    finally:
+        cleanup.close()
+    return None
+
+
+def put_artifact(db: Session, content_hash: str, kind: str, variant: str = "", s3_key: str = None, payload=None):
+    """Records (or replaces) an artifact. Dict/list payloads are stored as JSON."""
+    if not content_hash:
+        return
+    if payload is not None and not isinstance(payload, str):
+        payload = json.dumps(payload)
+    db.merge(MediaArtifact(
+        content_hash=content_hash,
+        kind=kind,
+        variant=variant,
+        s3_key=s3_key,
+        payload=payload
+    ))
+    db.commit()
+
+
+# --------------------------
+# Shared object bookkeeping
+# --------------------------
+def video_object_in_use(db: Session, s3_url: str, exclude_filename: str) -> bool:
+    """True if another video row points at the same (deduplicated) S3 object."""
+    return db.query(Video).filter(
+        Video.s3_url == s3_url,
+        Video.filename != exclude_filename
+    ).first() is not None
+
+
+def clip_object_in_use(db: Session, clip_url: str, exclude_clip_id: str) -> bool:
+    """True if another clip row reuses the same rendered S3 object."""
+    return db.query(Clip).filter(
+        Clip.clip_url == clip_url,
+        Clip.id != exclude_clip_id
+    ).first() is not None
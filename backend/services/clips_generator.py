@@ -1,19 +1,30 @@
 import os
 import subprocess
+from urllib.parse import urlparse
+from dotenv import load_dotenv
+from services.smart_cut import smart_cut
+
+load_dotenv()
+
+# "smart" stream-copies whole GOPs and re-encodes only the edges; "full" always re-encodes
+CLIP_RENDER_MODE = os.getenv("CLIP_RENDER_MODE", "smart")
 
 # Define folder for clips
 CLIP_FOLDER = "clips"
 os.makedirs(CLIP_FOLDER, exist_ok=True)
 
-def generate_clip(video_path: str, start: float, end: float, clip_index: int = 0) -> str:
+def generate_clip(video_path: str, start: float, end: float, clip_index: int = 0, mode: str = None) -> str:
     """
     Generates a video clip using FFmpeg and saves it locally.
     
     Args:
-        video_path (str): Local path to the video file.
+        video_path (str): Local path to the video file, or an HTTP(S) URL
+            (e.g. a presigned S3 URL); seeking happens on the input, so only
+            the byte ranges around the clip are read.
         start (float): Start time of the clip in seconds.
         end (float): End time of the clip in seconds.
         clip_index (int): Index for unique clip naming.
+        mode (str): "smart" or "full" (default CLIP_RENDER_MODE).
 
     Returns:
         str: Local path to the generated clip.
@@ -21,16 +32,30 @@ def generate_clip(video_path: str, start: float, end: float, clip_index: int = 0
     if start >= end:
         raise ValueError("Start time must be less than end time.")
 
-    base_name = os.path.splitext(os.path.basename(video_path))[0]
+    base_name = os.path.splitext(os.path.basename(urlparse(video_path).path))[0]
     output_filename = f"{base_name}_clip_{clip_index}.mp4"
     output_path = os.path.join(CLIP_FOLDER, output_filename)
 
+    input_options = []
+    if video_path.startswith(("http://", "https://")):
+        input_options = ["-reconnect", "1", "-reconnect_streamed", "1", "-reconnect_delay_max", "5"]
+
+    if (mode or CLIP_RENDER_MODE) == "smart":
+        try:
+            result = smart_cut(video_path, start, end, output_path, input_options)
+            print(f"✅ Clip generated ({result['mode']} cut): {output_path}")
+            return output_path
+        except subprocess.CalledProcessError as e:
+            print(f"❌ FFmpeg error: {e.stderr.decode()}")
+            raise RuntimeError(f"Failed to generate clip from {video_path}")
+
     command = [
         "ffmpeg",
         "-y",
-        "-i", video_path,
         "-ss", str(start),
         "-t", str(end - start),
+        *input_options,
+        "-i", video_path,
         "-c:v", "libx264",
         "-c:a", "aac",
         "-strict", "experimental",
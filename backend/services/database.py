@@ -84,9 +84,13 @@
 #     Base.metadata.drop_all(bind=engine)  # Drop all tables (for development/testing)
 #     Base.metadata.create_all(bind=engine)
 
-from sqlalchemy import create_engine, Column, String, Float, ForeignKey, Table
+from sqlalchemy import (
+    create_engine, Column, String, Float, ForeignKey, Table, Integer, BigInteger, Text, DateTime,
+    Index, UniqueConstraint, text
+)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
+from datetime import datetime
 import os
 from dotenv import load_dotenv
 
@@ -122,14 +126,16 @@ video_hashtags = Table(
     'video_hashtags',
     Base.metadata,
     Column('video_filename', String, ForeignKey('videos.filename')),
-    Column('hashtag_name', String, ForeignKey('hashtags.name'))
+    Column('hashtag_name', String, ForeignKey('hashtags.name')),
+    UniqueConstraint('video_filename', 'hashtag_name', name='uq_video_hashtags')
 )
 
 clip_hashtags = Table(
     'clip_hashtags',
     Base.metadata,
     Column('clip_id', String, ForeignKey('clips.id')),
-    Column('hashtag_name', String, ForeignKey('hashtags.name'))
+    Column('hashtag_name', String, ForeignKey('hashtags.name')),
+    UniqueConstraint('clip_id', 'hashtag_name', name='uq_clip_hashtags')
 )
 
 
@@ -142,6 +148,7 @@ class Video(Base):
     filename = Column(String, primary_key=True)
     s3_url = Column(String, nullable=False)
     user_id = Column(String, ForeignKey("users.id"), nullable=False)
+    content_hash = Column(String, index=True)  # SHA-256 of the uploaded bytes
 
     # Relationships
     user = relationship("User", back_populates="videos")
@@ -161,6 +168,9 @@ class Clip(Base):
     end_time = Column(Float, nullable=False)
     clip_url = Column(String, nullable=False)
     user_id = Column(String, ForeignKey("users.id"), nullable=False)
+    renditions = Column(Text)  # JSON: render profile -> URL, "default" included
+    poster_url = Column(String)
+    preview_url = Column(String)
 
     # Relationships
     video = relationship("Video", back_populates="clips")
@@ -188,12 +198,177 @@ class Transcription(Base):
     
     filename = Column(String, ForeignKey("videos.filename"), primary_key=True)
     transcript = Column(String)
+    max_segment_duration = Column(Float)  # Bounds time-range lookups on transcript_segments
+    revision = Column(Integer, nullable=False, default=0)  # Bumped on every change; used for ETags
 
     video = relationship("Video")
 
 
+# --------------------------
+# Transcript Segment Model
+# --------------------------
+class TranscriptSegment(Base):
+    __tablename__ = "transcript_segments"
+    __table_args__ = (
+        Index("ix_transcript_segments_video_start", "filename", "start"),
+        UniqueConstraint("filename", "idx", name="uq_transcript_segments_video_idx"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    filename = Column(String, ForeignKey("videos.filename"), nullable=False)
+    idx = Column(Integer, nullable=False)  # Position in the transcript, 0-based
+    start = Column(Float, nullable=False)
+    end = Column(Float, nullable=False)
+    text = Column(Text, nullable=False)
+
+
+# --------------------------
+# Content-Addressed Artifacts
+# --------------------------
+class MediaArtifact(Base):
+    __tablename__ = "media_artifacts"
+
+    content_hash = Column(String, primary_key=True)  # Video.content_hash of the source media
+    kind = Column(String, primary_key=True)  # audio | transcript | highlights | clip
+    variant = Column(String, primary_key=True, default="")  # Parameters, e.g. "12.000-75.500:default"
+    s3_key = Column(String)  # For artifacts stored as S3 objects
+    payload = Column(Text)  # For artifacts stored inline as JSON
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+# --------------------------
+# Media Index (summary of the S3 sidecar written at ingest)
+# --------------------------
+class MediaIndex(Base):
+    __tablename__ = "media_indexes"
+
+    content_hash = Column(String, primary_key=True)  # Video.content_hash of the indexed media
+    s3_key = Column(String, nullable=False)  # Full index JSON: keyframes, byte offsets, streams
+    duration = Column(Float)
+    size = Column(BigInteger)
+    container = Column(String)
+    video_codec = Column(String)
+    width = Column(Integer)
+    height = Column(Integer)
+    fps = Column(Float)
+    audio_codec = Column(String)
+    audio_channels = Column(Integer)
+    sample_rate = Column(Integer)
+    keyframe_count = Column(Integer)
+    max_keyframe_interval = Column(Float)  # Longest GOP in seconds; bounds smart-cut re-encodes
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+# --------------------------
+# Direct-to-S3 Multipart Upload Sessions
+# --------------------------
+class UploadSession(Base):
+    __tablename__ = "upload_sessions"
+
+    upload_id = Column(String, primary_key=True)  # S3 multipart UploadId
+    s3_key = Column(String, nullable=False)
+    filename = Column(String, nullable=False)
+    user_id = Column(String, ForeignKey("users.id"), nullable=False)
+    total_size = Column(BigInteger, nullable=False)
+    part_size = Column(BigInteger, nullable=False)
+    content_type = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+# --------------------------
+# Background Job Models
+# --------------------------
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(String, primary_key=True)
+    kind = Column(String, nullable=False)  # Pipeline name, e.g. "ingest"
+    filename = Column(String, ForeignKey("videos.filename"), nullable=False, index=True)
+    user_id = Column(String, ForeignKey("users.id"), nullable=False)
+    status = Column(String, nullable=False, default="queued")  # queued | running | succeeded | failed
+    error = Column(Text)
+    context = Column(Text, default="{}")  # JSON state handed from one stage to the next
+    owner = Column(String)  # Worker holding the lease while the job runs
+    lease_expires_at = Column(DateTime, index=True)  # Renewed by the owner's heartbeat
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    stages = relationship(
+        "JobStage",
+        back_populates="job",
+        order_by="JobStage.position",
+        cascade="all, delete-orphan"
+    )
+
+
+class JobStage(Base):
+    __tablename__ = "job_stages"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    job_id = Column(String, ForeignKey("jobs.id"), nullable=False, index=True)
+    position = Column(Integer, nullable=False)
+    name = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="queued")  # queued | running | succeeded | failed
+    error = Column(Text)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    job = relationship("Job", back_populates="stages")
+
+
+# --------------------------
+# LLM Response Cache
+# --------------------------
+class LLMCacheEntry(Base):
+    __tablename__ = "llm_cache"
+
+    key = Column(String, primary_key=True)  # SHA-256 of model + prompt hash + parameters
+    model = Column(String, nullable=False)
+    response = Column(Text, nullable=False)
+    hits = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    last_used_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
 # --------------------------
 # Create Tables
 # --------------------------
+# Columns added after the first release; create_all() does not alter existing tables
+SCHEMA_UPGRADES = [
+    "ALTER TABLE videos ADD COLUMN IF NOT EXISTS content_hash VARCHAR",
+    "CREATE INDEX IF NOT EXISTS ix_videos_content_hash ON videos (content_hash)",
+    "ALTER TABLE transcriptions ADD COLUMN IF NOT EXISTS max_segment_duration FLOAT",
+    "ALTER TABLE transcriptions ADD COLUMN IF NOT EXISTS revision INTEGER NOT NULL DEFAULT 0",
+    "ALTER TABLE clips ADD COLUMN IF NOT EXISTS renditions TEXT",
+    "ALTER TABLE clips ADD COLUMN IF NOT EXISTS poster_url VARCHAR",
+    "ALTER TABLE clips ADD COLUMN IF NOT EXISTS preview_url VARCHAR",
+    "ALTER TABLE jobs ADD COLUMN IF NOT EXISTS owner VARCHAR",
+    "ALTER TABLE jobs ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP",
+    "CREATE INDEX IF NOT EXISTS ix_jobs_lease_expires_at ON jobs (lease_expires_at)",
+    # Association tables predate their unique constraints: drop duplicate links once, then add them
+    """
+    DO $$ BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_indexes WHERE indexname = 'uq_video_hashtags') THEN
+            DELETE FROM video_hashtags a USING video_hashtags b
+            WHERE a.ctid < b.ctid AND a.video_filename = b.video_filename AND a.hashtag_name = b.hashtag_name;
+            CREATE UNIQUE INDEX uq_video_hashtags ON video_hashtags (video_filename, hashtag_name);
+        END IF;
+    END $$
+    """,
+    """
+    DO $$ BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_indexes WHERE indexname = 'uq_clip_hashtags') THEN
+            DELETE FROM clip_hashtags a USING clip_hashtags b
+            WHERE a.ctid < b.ctid AND a.clip_id = b.clip_id AND a.hashtag_name = b.hashtag_name;
+            CREATE UNIQUE INDEX uq_clip_hashtags ON clip_hashtags (clip_id, hashtag_name);
+        END IF;
+    END $$
+    """,
+]
+
+
 def init_db():
     Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for statement in SCHEMA_UPGRADES:
+            conn.execute(text(statement))
@@ -0,0 +1,109 @@
+import os
+import time
+import threading
+from dotenv import load_dotenv
+from services.storage import s3_client
+
+load_dotenv()
+
+# Shared secret the ECS worker sends back with its completion callback
+ECS_CALLBACK_TOKEN = os.getenv("ECS_CALLBACK_TOKEN")
+
+# Fallback S3 polling schedule (seconds) used when no callback arrives,
+# e.g. when the callback lands on another API process.
+POLL_INITIAL_INTERVAL = float(os.getenv("ECS_POLL_INITIAL_INTERVAL", "2"))
+POLL_MAX_INTERVAL = float(os.getenv("ECS_POLL_MAX_INTERVAL", "30"))
+POLL_BACKOFF = 2.0
+
+# output_key -> {"status": None | "succeeded" | "failed", "error": str}
+_outputs = {}
+_condition = threading.Condition()
+
+
+def expect_output(key: str):
+    """Registers an output key before its ECS task is launched."""
+    with _condition:
+        _outputs.setdefault(key, {"status": None, "error": None})
+
+
+def notify_output(key: str, status: str = "succeeded", error: str = None) -> bool:
+    """
+    Marks an output as finished and wakes up every waiter.
+    Called by the ECS callback endpoint, or directly as a local stand-in in tests.
+    Returns False if nobody in this process is waiting for the key.
+    """
+    with _condition:
+        if key not in _outputs:
+            return False
+        _outputs[key] = {"status": status, "error": error}
+        _condition.notify_all()
+    print(f"📬 Completion received for {key}: {status}")
+    return True
+
+
+def _output_exists(bucket: str, key: str) -> bool:
+    try:
+        s3_client.head_object(Bucket=bucket, Key=key)
+        return True
+    except s3_client.exceptions.ClientError:
+        return False
+
+
+def wait_for_outputs(bucket: str, keys: list, timeout: float = 1800) -> dict:
+    """
+    Blocks until every key is reported finished or found in S3.
+
+    Callbacks wake the waiter immediately. Between callbacks, still-pending keys
+    are checked in S3 on an exponentially growing interval, so a missed callback
+    costs a few HEAD requests instead of one per second.
+
+    Returns:
+        dict: key -> "succeeded". Raises if a task reported failure or on timeout.
+    """
+    for key in keys:
+        expect_output(key)
+
+    deadline = time.monotonic() + timeout
+    interval = POLL_INITIAL_INTERVAL
+    next_poll = time.monotonic() + interval
+    results = {}
+
+    try:
+        while True:
+            with _condition:
+                for key in keys:
+                    state = _outputs[key]
+                    if state["status"] == "failed":
+                        raise Exception(f"❌ ECS task failed for {key}: {state['error']}")
+                    if state["status"] == "succeeded":
+                        results[key] = "succeeded"
+
+                pending = [key for key in keys if key not in results]
+                if not pending:
+                    return results
+
+                now = time.monotonic()
+                if now >= deadline:
+                    raise Exception(f"⏰ Timeout waiting for {', '.join(pending)} in S3.")
+
+                if now < next_poll:
+                    _condition.wait(timeout=min(next_poll, deadline) - now)
+                    continue
+
+            # ⏳ No callback within the interval: fall back to checking S3 directly
+            for key in pending:
+                if _output_exists(bucket, key):
+                    print(f"✅ Found {key} in S3.")
+                    results[key] = "succeeded"
+            interval = min(interval * POLL_BACKOFF, POLL_MAX_INTERVAL)
+            next_poll = time.monotonic() + interval
+    finally:
+        with _condition:
+            for key in keys:
+                _outputs.pop(key, None)
+
+
+def wait_for_output(bucket: str, key: str, timeout: float = 1800) -> bool:
+    """Single-key convenience wrapper around wait_for_outputs."""
+    wait_for_outputs(bucket, [key], timeout=timeout)
+    return True
@@ -1,6 +1,9 @@
 import boto3
 import os
+import json
+from uuid import uuid4
 from dotenv import load_dotenv
+from services.storage import s3_client
 load_dotenv()
 
 ECS_CLUSTER = os.getenv("ECS_CLUSTER", "clipfusion-cluster1")
@@ -16,9 +19,23 @@ REGION = os.getenv("AWS_REGION", "us-east-2")
 SUBNET_ID = os.getenv("AWS_SUBNET_ID")
 SECURITY_GROUP_ID = os.getenv("AWS_SECURITY_GROUP_ID")
 
+# Public URL of POST /ecs/callback; the worker calls it when its output is ready
+ECS_CALLBACK_URL = os.getenv("ECS_CALLBACK_URL")
+ECS_CALLBACK_TOKEN = os.getenv("ECS_CALLBACK_TOKEN")
+
+# Render profiles produced for every clip in one decode (see cloud-processing/renditions.py);
+# "default" is always rendered since it is the clip's clip_url
+CLIP_RENDER_PROFILES = ["default"] + [
+    p.strip() for p in os.getenv("CLIP_RENDER_PROFILES", "preview,poster").split(",")
+    if p.strip() and p.strip() != "default"
+]
+
+# ECS caps container overrides at 8 KiB; larger batch manifests go through S3
+MANIFEST_INLINE_LIMIT = int(os.getenv("ECS_MANIFEST_INLINE_LIMIT", "6000"))
+
 ecs_client = boto3.client("ecs", region_name=REGION)
 
-def launch_ecs_task(mode, bucket, input_key, output_key, start=None, end=None):
+def launch_ecs_task(mode, bucket, input_key, output_key, start=None, end=None, media_index_key=None, profiles=None):
     env_vars = [
         {"name": "MODE", "value": mode},
         {"name": "BUCKET", "value": bucket},
@@ -30,6 +47,59 @@ def launch_ecs_task(mode, bucket, input_key, output_key, start=None, end=None):
         env_vars += [
             {"name": "START", "value": str(start)},
             {"name": "END", "value": str(end)},
+            {"name": "PROFILES", "value": ",".join(profiles or CLIP_RENDER_PROFILES)},
+        ]
+
+    if media_index_key:
+        # extract_audio writes the index there; clip modes read it instead of probing
+        env_vars.append({"name": "MEDIA_INDEX_KEY", "value": media_index_key})
+
+    return _run_task(env_vars)
+
+
+def launch_ecs_batch_task(bucket, input_key, clips, media_index_key=None):
+    """
+    Launches one "generate_clips" task that downloads input_key once and
+    renders every clip in it.
+
+    Args:
+        clips (list): dicts with start, end, output_key and optional profiles
+            (default CLIP_RENDER_PROFILES).
+        media_index_key: S3 key of the input's media index, if it has one.
+    """
+    manifest = json.dumps([
+        {
+            "start": clip["start"],
+            "end": clip["end"],
+            "output_key": clip["output_key"],
+            "profiles": clip.get("profiles") or CLIP_RENDER_PROFILES,
+        }
+        for clip in clips
+    ])
+    env_vars = [
+        {"name": "MODE", "value": "generate_clips"},
+        {"name": "BUCKET", "value": bucket},
+        {"name": "INPUT_KEY", "value": input_key},
+    ]
+
+    if len(manifest) <= MANIFEST_INLINE_LIMIT:
+        env_vars.append({"name": "MANIFEST", "value": manifest})
+    else:
+        manifest_key = f"manifests/{uuid4()}.json"
+        s3_client.put_object(Bucket=bucket, Key=manifest_key, Body=manifest, ContentType="application/json")
+        env_vars.append({"name": "MANIFEST_KEY", "value": manifest_key})
+
+    if media_index_key:
+        env_vars.append({"name": "MEDIA_INDEX_KEY", "value": media_index_key})
+
+    return _run_task(env_vars)
+
+
+def _run_task(env_vars):
+    if ECS_CALLBACK_URL:
+        env_vars += [
+            {"name": "CALLBACK_URL", "value": ECS_CALLBACK_URL},
+            {"name": "CALLBACK_TOKEN", "value": ECS_CALLBACK_TOKEN or ""},
         ]
 
     response = ecs_client.run_task(
@@ -1,21 +1,59 @@
-from openai import OpenAI
 import os
 from dotenv import load_dotenv
 import json
+from concurrent.futures import ThreadPoolExecutor
+from services.llm_cache import cached_completion
+from services.llm_gateway import get_llm_gateway
+from services.keyword_extractor import extract_hashtags, HASHTAG_LOCAL_MIN_CONFIDENCE
 
 # Load environment variables
 load_dotenv()
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv("OPEN_AI_API_KEY"))
+HASHTAG_MODEL = "gpt-3.5-turbo"
 
-def generate_hashtags_from_transcript(transcript_json, num_hashtags=5):
+# "llm" always asks the model, "local" only uses keyword extraction,
+# "auto" uses keyword extraction and asks the model when its confidence is low
+HASHTAG_MODE = os.getenv("HASHTAG_MODE", "auto")
+
+# Per-clip calls in flight when a batch reply leaves clips out. The batch itself
+# usually runs on a shared executor, so this pool is kept small and bounded
+# rather than queued onto that executor (which could wait on itself)
+HASHTAG_FALLBACK_WORKERS = int(os.getenv("HASHTAG_FALLBACK_WORKERS", "2"))
+
+
+def uses_local_hashtags(mode=None, regenerate=False):
+    """
+    Whether keyword extraction runs at all for this mode, so callers load a corpus only when it does.
+    In "auto" mode a regenerate request goes to the LLM, since local tags never change.
+    """
+    mode = mode or HASHTAG_MODE
+    return not (mode == "llm" or (mode == "auto" and regenerate))
+
+
+def local_hashtags(text, num_hashtags, mode=None, corpus=None, regenerate=False):
+    """Returns locally extracted tags if `mode` allows them for this text, else None."""
+    mode = mode or HASHTAG_MODE
+    if not uses_local_hashtags(mode, regenerate):
+        return None
+    tags, confidence = extract_hashtags(text, num_hashtags, corpus)
+    if mode == "local":
+        return tags
+    if len(tags) >= num_hashtags and confidence >= HASHTAG_LOCAL_MIN_CONFIDENCE:
+        print(f"🏷️ Local hashtags (confidence {confidence:.2f}): {tags}")
+        return tags
+    return None
+
+
+def generate_hashtags_from_transcript(transcript_json, num_hashtags=5, bypass_cache=False, mode=None, corpus=None):
     """
     Generates relevant hashtags based on video transcript content.
     
     Args:
         transcript_json (str): JSON string containing transcript data
         num_hashtags (int): Number of hashtags to generate
+        bypass_cache (bool): Ignore a cached answer for the same prompt ("regenerate")
+        mode (str): "llm", "local" or "auto" (default HASHTAG_MODE)
+        corpus (CorpusStats): Document frequencies for local extraction, e.g. the user's transcripts
         
     Returns:
         list: List of hashtag strings (without the # symbol)
@@ -37,6 +75,11 @@ def generate_hashtags_from_transcript(transcript_json, num_hashtags=5):
             full_text = " ".join(seg.get("text", "") for seg in segments)
         else:
             return ["video", "content", "trending", "viral", "fyp"]  # Default hashtags
+
+        # Fast path: statistical keyword extraction, no LLM round trip
+        tags = local_hashtags(full_text, num_hashtags, mode, corpus, regenerate=bypass_cache)
+        if tags:
+            return tags
         
         # Prepare prompt for OpenAI
         prompt = f"""
@@ -56,16 +99,16 @@ def generate_hashtags_from_transcript(transcript_json, num_hashtags=5):
         ```
         """
         
-        # Call OpenAI API
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7,
-            max_tokens=200
+        # Call OpenAI API (answers are cached per prompt and parameters)
+        def call():
+            return get_llm_gateway().chat(prompt, HASHTAG_MODEL, max_tokens=200, temperature=0.7)
+
+        content = cached_completion(
+            HASHTAG_MODEL, prompt, call, bypass=bypass_cache, temperature=0.7, max_tokens=200
         )
         
         # Parse response
-        content = response.choices[0].message.content.strip()
+        content = content.strip()
         
         # Try to parse as JSON first
         try:
@@ -86,4 +129,103 @@ def generate_hashtags_from_transcript(transcript_json, num_hashtags=5):
         
     except Exception as e:
         print(f"Error generating hashtags: {e}")
-        return ["video", "content", "trending", "viral", "fyp"]  # Default hashtags in case of error
\ No newline at end of file
+        return ["video", "content", "trending", "viral", "fyp"]  # Default hashtags in case of error
+
+def _clean_tags(tags, num_hashtags):
+    """Lowercases, strips '#' and spaces, drops duplicates; None if `tags` isn't a usable list."""
+    if not isinstance(tags, list):
+        return None
+    cleaned = []
+    for tag in tags:
+        if not isinstance(tag, str):
+            continue
+        tag = tag.strip().lstrip("#").replace(" ", "").lower()
+        if tag and tag not in cleaned:
+            cleaned.append(tag)
+    return cleaned[:num_hashtags] or None
+
+
+def generate_hashtags_batch(texts, num_hashtags=3, bypass_cache=False, mode=None, corpus=None):
+    """
+    Generates hashtags for several clips with one JSON-mode LLM call.
+    Clips whose local extraction is confident enough (see HASHTAG_MODE) skip the LLM.
+
+    Args:
+        texts (list): Clip transcript texts
+        num_hashtags (int): Number of hashtags per clip
+        bypass_cache (bool): Ignore a cached answer for the same prompt ("regenerate")
+        mode (str): "llm", "local" or "auto" (default HASHTAG_MODE)
+        corpus (CorpusStats): Document frequencies for local extraction
+
+    Returns:
+        list: One list of hashtag strings per text, in the same order. Clips missing
+        from the reply or with an unusable entry fall back to a single-clip call.
+    """
+    results = [[] for _ in texts]
+    pending = []
+    for i, text in enumerate(texts):
+        if not text or not text.strip():
+            continue
+        tags = local_hashtags(text, num_hashtags, mode, corpus, regenerate=bypass_cache)
+        if tags is None:
+            pending.append(i)
+        else:
+            results[i] = tags
+    if not pending:
+        return results
+
+    clips = "\n\n".join(f"Clip {i}:\n```\n{texts[i][:1500]}\n```" for i in pending)
+    prompt = f"""
+        Below are transcripts of {len(pending)} short clips from the same video.
+        For each clip, generate {num_hashtags} relevant hashtags.
+        These hashtags should be:
+        1. Relevant to the content and themes discussed in that clip
+        2. Popular or trending on social media platforms
+        3. A mix of specific and general tags
+        4. Without the # symbol
+        5. Short, catchy, and all lowercase
+
+        Reply with a JSON object mapping each clip number to its array of hashtags,
+        e.g. {{"clips": {{"0": ["tag", "tag"], "1": ["tag", "tag"]}}}}
+
+        {clips}
+        """
+
+    parsed = {}
+    max_tokens = 60 + 30 * len(pending) * num_hashtags
+    try:
+        def call():
+            return get_llm_gateway().chat(
+                prompt, HASHTAG_MODEL, max_tokens=max_tokens, temperature=0.7,
+                response_format={"type": "json_object"}
+            )
+
+        content = cached_completion(
+            HASHTAG_MODEL, prompt, call, bypass=bypass_cache, temperature=0.7,
+            max_tokens=max_tokens, response_format="json_object"
+        )
+        data = json.loads(content)
+        parsed = data.get("clips", data) if isinstance(data, dict) else {}
+    except Exception as e:
+        print(f"⚠️ Batched hashtag generation failed, falling back per clip: {e}")
+
+    missing = []
+    for i in pending:
+        tags = _clean_tags(parsed.get(str(i)) if isinstance(parsed, dict) else None, num_hashtags)
+        if tags:
+            results[i] = tags
+        else:
+            missing.append(i)
+
+    if missing:
+        print(f"⚠️ No usable hashtags for clip(s) {missing} in the batch reply, asking one by one")
+        with ThreadPoolExecutor(max_workers=max(1, min(len(missing), HASHTAG_FALLBACK_WORKERS))) as pool:
+            fallbacks = pool.map(
+                lambda i: generate_hashtags_from_transcript(
+                    {"text": texts[i]}, num_hashtags=num_hashtags, bypass_cache=bypass_cache, mode="llm"
+                ),
+                missing
+            )
+            for i, tags in zip(missing, fallbacks):
+                results[i] = tags
+    return results
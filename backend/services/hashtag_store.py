@@ -0,0 +1,81 @@
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from services.database import Hashtag, video_hashtags, clip_hashtags
+
+# Set-based hashtag writes: every function issues a fixed number of statements
+# regardless of how many tags or clips it handles, and none of them commits,
+# so a request can tag everything in one transaction.
+
+
+def normalize_tags(names) -> list:
+    """Strips '#', lowercases and drops empty/duplicate names, keeping order."""
+    tags = []
+    for name in names:
+        tag = (name or "").strip().lstrip("#").lower()
+        if tag and tag not in tags:
+            tags.append(tag)
+    return tags
+
+
+def ensure_hashtags(db: Session, names: list):
+    """INSERT ... ON CONFLICT DO NOTHING for all names in one statement."""
+    if names:
+        db.execute(
+            insert(Hashtag.__table__).values([{"name": name} for name in names]).on_conflict_do_nothing(
+                index_elements=["name"]
+            )
+        )
+
+
+def link_video_hashtags(db: Session, filename: str, names: list) -> int:
+    """Adds the tags to a video; returns how many links are new."""
+    names = normalize_tags(names)
+    if not names:
+        return 0
+    ensure_hashtags(db, names)
+    result = db.execute(
+        insert(video_hashtags).values([
+            {"video_filename": filename, "hashtag_name": name} for name in names
+        ]).on_conflict_do_nothing(index_elements=["video_filename", "hashtag_name"])
+    )
+    return result.rowcount or 0
+
+
+def link_clip_hashtags(db: Session, clip_tags: dict) -> int:
+    """
+    Adds tags to many clips at once.
+
+    Args:
+        clip_tags (dict): clip id -> list of tag names.
+
+    Returns:
+        int: how many clip links are new.
+    """
+    rows = []
+    for clip_id, names in clip_tags.items():
+        rows += [{"clip_id": clip_id, "hashtag_name": name} for name in normalize_tags(names)]
+    if not rows:
+        return 0
+    ensure_hashtags(db, normalize_tags(row["hashtag_name"] for row in rows))
+    result = db.execute(
+        insert(clip_hashtags).values(rows).on_conflict_do_nothing(index_elements=["clip_id", "hashtag_name"])
+    )
+    return result.rowcount or 0
+
+
+def tag_clips(db: Session, filename: str, clip_tags: dict):
+    """Tags every clip of a video and adds the union of their tags to the video."""
+    link_clip_hashtags(db, clip_tags)
+    link_video_hashtags(db, filename, [name for names in clip_tags.values() for name in names])
+
+
+def unlink_video_hashtag(db: Session, filename: str, name: str) -> bool:
+    """Removes one tag from a video; returns False if it wasn't linked."""
+    result = db.execute(
+        delete(video_hashtags).where(
+            video_hashtags.c.video_filename == filename,
+            video_hashtags.c.hashtag_name == name
+        )
+    )
+    return bool(result.rowcount)
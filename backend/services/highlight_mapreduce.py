@@ -0,0 +1,289 @@
+import os
+import re
+import json
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from services import llm_gateway
+
+load_dotenv()
+
+HIGHLIGHT_MODEL = os.getenv("HIGHLIGHT_MODEL", "gpt-3.5-turbo")
+
+# "single" sends the whole transcript in one prompt, "chunked" always maps over
+# token-bounded windows, "auto" switches to chunked once the transcript is too long
+HIGHLIGHT_MODE = os.getenv("HIGHLIGHT_MODE", "auto")
+
+# Map step: transcript tokens per window, tokens shared with the previous window,
+# concurrent window calls and candidates requested from each window
+HIGHLIGHT_WINDOW_TOKENS = int(os.getenv("HIGHLIGHT_WINDOW_TOKENS", "3000"))
+HIGHLIGHT_WINDOW_OVERLAP = int(os.getenv("HIGHLIGHT_WINDOW_OVERLAP", "200"))
+HIGHLIGHT_MAP_WORKERS = int(os.getenv("HIGHLIGHT_MAP_WORKERS", "4"))
+HIGHLIGHT_CANDIDATES_PER_WINDOW = int(os.getenv("HIGHLIGHT_CANDIDATES_PER_WINDOW", "3"))
+
+# "auto" mode: transcripts above this many tokens go through map-reduce
+HIGHLIGHT_SINGLE_MAX_TOKENS = int(os.getenv("HIGHLIGHT_SINGLE_MAX_TOKENS", "12000"))
+
+REDUCE_QUOTE_CHARS = 300  # quote excerpt shown per candidate in the reduce prompt
+
+
+def count_tokens(texts: list, model: str = HIGHLIGHT_MODEL) -> list:
+    return llm_gateway.count_tokens(texts, model)
+
+
+def should_chunk(segment_tokens: list, mode: str = None) -> bool:
+    mode = mode or HIGHLIGHT_MODE
+    if mode not in ("single", "chunked", "auto"):
+        raise ValueError(f"Unknown highlight mode: {mode}")
+    if mode == "auto":
+        return sum(segment_tokens) > HIGHLIGHT_SINGLE_MAX_TOKENS
+    return mode == "chunked"
+
+
+def plan_windows(segment_tokens: list, max_tokens: int = HIGHLIGHT_WINDOW_TOKENS,
+                 overlap_tokens: int = HIGHLIGHT_WINDOW_OVERLAP) -> list:
+    """
+    Groups consecutive segments into windows of at most max_tokens tokens.
+
+    Each window after the first starts with the trailing segments of the previous
+    one (up to overlap_tokens) so moments on a boundary are seen whole at least once.
+    A single segment longer than max_tokens gets a window of its own.
+
+    Returns:
+        list: (first_idx, last_idx) inclusive segment index pairs.
+    """
+    windows = []
+    start = 0
+    n = len(segment_tokens)
+    while start < n:
+        end = start
+        total = segment_tokens[start]
+        while end + 1 < n and total + segment_tokens[end + 1] <= max_tokens:
+            end += 1
+            total += segment_tokens[end]
+        windows.append((start, end))
+        if end == n - 1:
+            break
+
+        # Step back over the overlap, always advancing by at least one segment
+        next_start = end + 1
+        shared = 0
+        while next_start - 1 > start and shared + segment_tokens[next_start - 1] <= overlap_tokens:
+            next_start -= 1
+            shared += segment_tokens[next_start]
+        start = next_start
+    return windows
+
+
+# --------------------------
+# Prompts
+# --------------------------
+def map_prompt(window_text: str, count: int) -> str:
+    return f"""
+You are a content analyst assistant helping a creator make short, engaging TikTok videos from a podcast or interview.
+Below is one excerpt of a longer transcript.
+
+Find up to {count} moments in this excerpt that meet one or more of these criteria:
+- A powerful or emotional story is being shared
+- A personal or vulnerable moment is being explained
+- A clear explanation or insight into an interesting topic is being given
+- A moment that feels shocking, funny, relatable, or likely to go viral on social media
+
+Reply with JSON only, in this shape:
+{{"moments": [{{"quote": "exact wording from the excerpt (1-5 sentences)", "description": "what is happening", "category": "story|vulnerable|insight|funny|shocking|relatable", "score": 1-10}}]}}
+
+Only include quotes that exactly exist in the excerpt. Return an empty list if nothing stands out.
+
+Excerpt:
+\"\"\"
+{window_text}
+\"\"\"
+"""
+
+
+def reduce_prompt(candidates: list, top_n: int) -> str:
+    lines = []
+    for i, cand in enumerate(candidates):
+        quote = cand["quote"][:REDUCE_QUOTE_CHARS]
+        lines.append(f'{i}. [{cand.get("category", "other")}, score {cand["score"]:g}] {cand.get("description", "")} — "{quote}"')
+    listing = "\n".join(lines)
+    return f"""
+You are picking the final clips for short, engaging TikTok videos from a podcast or interview.
+These candidate moments were found in different parts of the episode:
+
+{listing}
+
+Choose the {top_n} best candidates. Prefer strong moments, but ensure different styles of moments are chosen for variety
+and avoid picking two candidates about the same thing.
+
+Reply with JSON only: {{"selected": [candidate numbers, best first]}}
+"""
+
+
+# --------------------------
+# Parsing
+# --------------------------
+def _parse_json_object(text: str):
+    match = re.search(r"\{.*\}", text or "", re.DOTALL)
+    if not match:
+        return None
+    try:
+        return json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return None
+
+
+def parse_moments(llm_output: str) -> list:
+    """
+    Reads the map step's JSON reply. Falls back to the quoted strings in the
+    text when the model ignored the format.
+    """
+    data = _parse_json_object(llm_output)
+    moments = []
+    if isinstance(data, dict) and isinstance(data.get("moments"), list):
+        for item in data["moments"]:
+            if not isinstance(item, dict) or not item.get("quote"):
+                continue
+            try:
+                score = float(item.get("score", 5))
+            except (TypeError, ValueError):
+                score = 5.0
+            moments.append({
+                "quote": str(item["quote"]),
+                "description": str(item.get("description", "")),
+                "category": str(item.get("category", "other")).lower(),
+                "score": score,
+            })
+        return moments
+
+    return [
+        {"quote": quote, "description": "", "category": "other", "score": 5.0}
+        for quote in re.findall(r'"([^"]+)"', llm_output or "")
+    ]
+
+
+def parse_selection(llm_output: str, count: int) -> list:
+    data = _parse_json_object(llm_output)
+    if not isinstance(data, dict) or not isinstance(data.get("selected"), list):
+        return []
+    selected = []
+    for item in data["selected"]:
+        try:
+            i = int(item)
+        except (TypeError, ValueError):
+            continue
+        if 0 <= i < count and i not in selected:
+            selected.append(i)
+    return selected
+
+
+# --------------------------
+# Map / reduce
+# --------------------------
+def _overlaps(a: dict, b: dict) -> bool:
+    return a["start_idx"] <= b["end_idx"] and b["start_idx"] <= a["end_idx"]
+
+
+def dedupe_candidates(candidates: list) -> list:
+    """Keeps the best-scoring candidate among those pointing at overlapping spans."""
+    kept = []
+    for cand in sorted(candidates, key=lambda c: -c["score"]):
+        if not any(_overlaps(cand, other) for other in kept):
+            kept.append(cand)
+    return kept
+
+
+def diversify(candidates: list, top_n: int, selected: list = None) -> list:
+    """
+    Picks top_n candidates greedily by score, discounting categories that were
+    already picked so the final set mixes styles. Indexes in `selected` (e.g.
+    from the reduce call) are taken first, in order.
+    """
+    picked = [candidates[i] for i in (selected or [])][:top_n]
+    remaining = [cand for cand in candidates if cand not in picked]
+    while len(picked) < top_n and remaining:
+        seen = [cand["category"] for cand in picked]
+        best = max(remaining, key=lambda c: c["score"] * (0.7 ** seen.count(c["category"])))
+        picked.append(best)
+        remaining.remove(best)
+    return picked
+
+
+def _join_text(segments: list, first: int, last: int) -> str:
+    return " ".join(seg["text"] for seg in segments[first:last + 1])
+
+
+def map_windows(segments: list, windows: list, llm, match_index,
+                per_window: int = HIGHLIGHT_CANDIDATES_PER_WINDOW, max_workers: int = HIGHLIGHT_MAP_WORKERS,
+                render=None) -> list:
+    """
+    Scores every window with the LLM concurrently (at most max_workers calls in
+    flight) and maps the returned quotes back to segment spans.
+    A failed window is logged and skipped rather than failing the whole run.
+    render: optional callable(first, last) -> prompt text of segments[first:last + 1].
+    """
+    render = render or (lambda first, last: _join_text(segments, first, last))
+
+    def score_window(window):
+        first, last = window
+        text = render(first, last)
+        try:
+            return parse_moments(llm(map_prompt(text, per_window), max_tokens=800, temperature=0.7))
+        except Exception as e:
+            print(f"⚠️ Highlight window {first}-{last} failed: {e}")
+            return []
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        results = list(pool.map(score_window, windows))
+
+    candidates = []
+    for window, moments in zip(windows, results):
+        for moment in moments:
+            span = match_index.match(moment["quote"])
+            if not span:
+                continue
+            candidates.append({**moment, "start_idx": span[0], "end_idx": span[1], "window": window})
+    return candidates
+
+
+def reduce_candidates(candidates: list, top_n: int, llm) -> list:
+    """
+    Merges candidates from all windows into top_n: overlapping spans are
+    deduplicated, then one LLM call ranks the rest for quality and variety.
+    Falls back to a local score/category ranking if that call fails.
+    """
+    candidates = dedupe_candidates(candidates)
+    if len(candidates) <= top_n:
+        return candidates
+
+    selected = []
+    try:
+        selected = parse_selection(llm(reduce_prompt(candidates, top_n), max_tokens=200, temperature=0.3), len(candidates))
+    except Exception as e:
+        print(f"⚠️ Highlight reduce step failed, ranking locally: {e}")
+    return diversify(candidates, top_n, selected)
+
+
+def select_highlight_spans(segments: list, top_n: int, llm, match_index, segment_tokens: list = None,
+                           window_tokens: int = HIGHLIGHT_WINDOW_TOKENS, overlap_tokens: int = HIGHLIGHT_WINDOW_OVERLAP,
+                           max_workers: int = HIGHLIGHT_MAP_WORKERS, render=None) -> list:
+    """
+    Map-reduce highlight selection for transcripts too long for one prompt.
+
+    Args:
+        llm: callable(prompt, max_tokens=..., temperature=...) -> str. Any function
+            with this signature works, so a local fake can stand in for OpenAI.
+        match_index: TranscriptMatchIndex over `segments`.
+        render: optional callable(first, last) -> prompt text of segments[first:last + 1].
+
+    Returns:
+        list: candidate dicts with "quote", "description", "category", "score",
+            "start_idx" and "end_idx", best first (possibly fewer than top_n).
+    """
+    if segment_tokens is None:
+        segment_tokens = count_tokens(seg["text"] for seg in segments)
+    windows = plan_windows(segment_tokens, window_tokens, overlap_tokens)
+    print(f"🧩 Map-reduce highlights: {sum(segment_tokens)} tokens in {len(windows)} window(s)")
+
+    candidates = map_windows(segments, windows, llm, match_index, max_workers=max_workers, render=render)
+    print(f"🧠 {len(candidates)} candidate moment(s) matched across windows")
+    return reduce_candidates(candidates, top_n, llm)
@@ -0,0 +1,69 @@
+import json
+
+
+class JsonObjectStream:
+    """
+    Incremental parser that pulls complete JSON objects out of streamed text.
+
+    Feed it deltas as they arrive; every object that closes and contains
+    `required_key` is returned as soon as its closing brace is seen, whether
+    the model wraps them in an array, an outer object or writes one per line.
+    """
+
+    def __init__(self, required_key: str = "quote"):
+        self.required_key = required_key
+        self.buffer = []
+        self.starts = []  # buffer positions of the currently open '{'
+        self.in_string = False
+        self.escaped = False
+
+    def feed(self, text: str) -> list:
+        objects = []
+        for char in text:
+            self.buffer.append(char)
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char == "{":
+                self.starts.append(len(self.buffer) - 1)
+            elif char == "}" and self.starts:
+                start = self.starts.pop()
+                try:
+                    obj = json.loads("".join(self.buffer[start:]))
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(obj, dict) and obj.get(self.required_key):
+                    objects.append(obj)
+        return objects
+
+    def text(self) -> str:
+        return "".join(self.buffer)
+
+
+def stream_prompt(full_text: str, top_n: int) -> str:
+    return f"""
+You are a content analyst assistant helping a creator make short, engaging TikTok videos from a podcast or interview.
+
+Your task is to identify the top {top_n} most compelling moments that meet one or more of these criteria:
+- A powerful or emotional story is being shared
+- A personal or vulnerable moment is being explained
+- A clear explanation or insight into an interesting topic is being given
+- A moment that feels shocking, funny, relatable, or likely to go viral on social media
+
+Ensure different styles of moments are chosen for variety, and list the strongest moment first.
+Reply with one JSON object per moment, one per line, and nothing else:
+{{"quote": "the exact wording from the transcript (1-5 sentences)", "description": "what is happening"}}
+
+Only include quotes that exactly exist in the transcript.
+
+Transcript:
+\"\"\"
+{full_text}
+\"\"\"
+"""
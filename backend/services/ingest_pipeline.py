@@ -0,0 +1,205 @@
+import os
+import json
+from uuid import uuid4
+from sqlalchemy.orm import Session
+from services.database import Video, Transcription
+from services.ecs_launcher import launch_ecs_task
+from services.transcription_engines import get_transcription_engine
+from services.job_queue import register_pipeline
+from services.transcript_store import store_segments
+from services.ecs_completion import expect_output, wait_for_output
+from services.storage import s3_client, AWS_S3_BUCKET, s3_url_for_key, s3_key_from_url, presigned_get_url
+from services.artifact_store import (
+    s3_content_hash, artifact_prefix, get_artifact, get_s3_artifact, get_json_artifact, put_artifact
+)
+from services.media_index import media_index_key, get_media_index_summary, save_media_index, fetch_media_index
+
+
+# "ecs": extract audio to S3 with the ECS worker, then transcribe it.
+# "stream": pipe FFmpeg's audio output straight into the transcription engine.
+AUDIO_EXTRACTION_MODE = os.getenv("AUDIO_EXTRACTION_MODE", "ecs")
+
+
+def _get_video(db: Session, filename: str) -> Video:
+    video_record = db.query(Video).filter(Video.filename == filename).first()
+    if not video_record:
+        raise Exception("❌ Video not found in DB")
+    return video_record
+
+
+# --------------------------
+# Ingest stages
+# --------------------------
+def hash_stage(context: dict, db: Session):
+    """
+    Makes sure the video has a content hash and points identical uploads
+    at a single S3 object.
+    """
+    video_record = _get_video(db, context["filename"])
+
+    if not video_record.content_hash:
+        # Read from the checksum S3 stored with the object; never re-download it here
+        video_record.content_hash = s3_content_hash(s3_key_from_url(video_record.s3_url))
+        db.commit()
+    context["content_hash"] = video_record.content_hash
+    if not video_record.content_hash:
+        print(f"⚠️ No SHA-256 checksum stored for {video_record.filename}, skipping deduplication.")
+        return
+
+    original = db.query(Video).filter(
+        Video.content_hash == video_record.content_hash,
+        Video.filename != video_record.filename
+    ).first()
+    if original and original.s3_url != video_record.s3_url:
+        duplicate_key = s3_key_from_url(video_record.s3_url)
+        video_record.s3_url = original.s3_url
+        db.commit()
+        try:
+            s3_client.delete_object(Bucket=AWS_S3_BUCKET, Key=duplicate_key)
+            print(f"♻️ '{video_record.filename}' is identical to '{original.filename}', dropped duplicate object.")
+        except Exception as e:
+            print(f"⚠️ Could not delete duplicate video from S3: {e}")
+
+
+def extract_audio_stage(context: dict, db: Session):
+    """Launches the ECS audio extraction task and waits for its output."""
+    filename = context["filename"]
+    content_hash = context.get("content_hash")
+
+    # ♻️ Identical media was transcribed before: no audio needed at all
+    if get_artifact(db, content_hash, "transcript"):
+        print(f"♻️ Transcript already known for {content_hash[:12]}, skipping audio extraction.")
+        context["audio_key"] = None
+        return
+
+    if AUDIO_EXTRACTION_MODE == "stream":
+        # Audio is decoded on the fly in the transcribe stage; nothing to extract
+        context["audio_key"] = None
+        context["stream_audio"] = True
+        return
+
+    audio_key = get_s3_artifact(db, content_hash, "audio")
+    if audio_key:
+        print(f"♻️ Reusing extracted audio: {audio_key}")
+        context["audio_key"] = audio_key
+        return
+
+    video_record = _get_video(db, filename)
+    video_s3_key = s3_key_from_url(video_record.s3_url)
+    if content_hash:
+        audio_key = f"{artifact_prefix(content_hash)}/audio.mp3"
+    else:
+        audio_key = f"audios/{uuid4()}_{filename.rsplit('.', 1)[0]}.mp3"
+
+    # Register before launching so an early callback is not lost
+    expect_output(audio_key)
+
+    print("🚀 Launching ECS task to extract audio...")
+    launch_ecs_task(
+        mode="extract_audio",
+        bucket=AWS_S3_BUCKET,
+        input_key=video_s3_key,
+        output_key=audio_key,
+        # The worker has the whole file locally; it writes the media index on the way
+        media_index_key=media_index_key(content_hash) if content_hash else None
+    )
+
+    # ⏳ Wait for the worker's completion callback (falls back to polling S3)
+    wait_for_output(AWS_S3_BUCKET, audio_key)
+    put_artifact(db, content_hash, "audio", s3_key=audio_key)
+    context["audio_key"] = audio_key
+
+
+def transcribe_stage(context: dict, db: Session):
+    """Transcribes the extracted audio from its S3 URL, or reuses a stored transcript."""
+    content_hash = context.get("content_hash")
+
+    transcript = get_json_artifact(db, content_hash, "transcript")
+    if transcript is not None:
+        print(f"♻️ Reusing transcript for {content_hash[:12]}")
+    else:
+        engine = get_transcription_engine()
+        print(f"🎙️ Transcribing with engine '{engine.name}'")
+        if context.get("stream_audio"):
+            video_record = _get_video(db, context["filename"])
+            video_url = presigned_get_url(s3_key_from_url(video_record.s3_url))
+            transcript = engine.transcribe_video_stream(video_url)
+        else:
+            transcript = engine.transcribe(s3_url_for_key(context["audio_key"]))
+        put_artifact(db, content_hash, "transcript", payload=transcript)
+
+    context["_transcript"] = transcript
+
+
+def store_stage(context: dict, db: Session):
+    """Saves the transcript and removes temporary (non content-addressed) audio from S3."""
+    filename = context["filename"]
+    transcript = context["_transcript"]
+
+    record = db.query(Transcription).filter(Transcription.filename == filename).first()
+    if record:
+        record.transcript = json.dumps(transcript)
+    else:
+        db.add(Transcription(filename=filename, transcript=json.dumps(transcript)))
+    db.flush()
+    store_segments(db, filename, transcript)
+    db.commit()
+
+    # ✅ Clean up audio that is not kept as an artifact
+    audio_key = context.get("audio_key")
+    if not audio_key or context.get("content_hash"):
+        return
+    try:
+        s3_client.delete_object(Bucket=AWS_S3_BUCKET, Key=audio_key)
+        print(f"🗑️ Deleted temp audio from S3: {audio_key}")
+    except Exception as e:
+        print(f"⚠️ Could not delete audio file from S3: {e}")
+
+
+def index_stage(context: dict, db: Session):
+    """
+    Records the video's media index (keyframes, byte offsets, streams). Usually
+    the audio extraction task already wrote it; otherwise an index-only ECS
+    task probes the video once.
+    """
+    content_hash = context.get("content_hash")
+    if not content_hash or get_media_index_summary(db, content_hash):
+        return
+
+    index_key = media_index_key(content_hash)
+    try:
+        try:
+            index = fetch_media_index(index_key)
+        except s3_client.exceptions.NoSuchKey:
+            video_record = _get_video(db, context["filename"])
+            expect_output(index_key)
+            print("🚀 Launching ECS task to index the video...")
+            launch_ecs_task(
+                mode="index_media",
+                bucket=AWS_S3_BUCKET,
+                input_key=s3_key_from_url(video_record.s3_url),
+                output_key=index_key
+            )
+            wait_for_output(AWS_S3_BUCKET, index_key)
+            index = fetch_media_index(index_key)
+    except Exception as e:
+        # Clip renders probe the source themselves without an index; don't fail the ingest
+        print(f"⚠️ Media indexing failed for {content_hash[:12]}: {e}")
+        return
+
+    try:
+        summary = save_media_index(db, content_hash, index_key, index)
+    except Exception as e:
+        db.rollback()
+        print(f"⚠️ Could not record media index for {content_hash[:12]}: {e}")
+        return
+    print(f"🗂️ Media index: {summary.keyframe_count} keyframes, max GOP {summary.max_keyframe_interval}s")
+
+
+register_pipeline("ingest", [
+    ("hash", hash_stage),
+    ("extract_audio", extract_audio_stage),
+    ("transcribe", transcribe_stage),
+    ("store", store_stage),
+    ("index", index_stage),
+])
@@ -0,0 +1,241 @@
+import os
+import json
+import time
+import socket
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from uuid import uuid4
+from dotenv import load_dotenv
+from sqlalchemy import or_, and_
+from sqlalchemy.orm import Session
+from services.database import SessionLocal, Job, JobStage
+
+load_dotenv()
+
+# Number of background workers running pipeline stages
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+
+# A running job is leased to one API process; the lease is renewed every
+# JOB_LEASE_SECONDS / 3 and another process may only take it over once it expires.
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "120"))
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+
+# Pipeline name -> ordered list of (stage name, stage function)
+PIPELINES = {}
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job-worker")
+
+# Jobs queued or running in this process
+_local = set()
+_local_lock = threading.Lock()
+_heartbeat_started = False
+
+
+def register_pipeline(kind: str, stages: list):
+    """
+    Registers a named pipeline.
+
+    Args:
+        kind (str): Pipeline name stored on each job.
+        stages (list): Ordered (name, fn) tuples. Each fn is called as
+            fn(context, db) and may read/update the shared context dict.
+            Keys starting with "_" stay in memory and are not persisted.
+    """
+    PIPELINES[kind] = list(stages)
+
+
+def create_job(db: Session, kind: str, filename: str, user_id: str, context: dict = None) -> Job:
+    """Creates a queued job with one queued stage record per pipeline stage."""
+    if kind not in PIPELINES:
+        raise ValueError(f"Unknown pipeline: {kind}")
+
+    job = Job(
+        id=str(uuid4()),
+        kind=kind,
+        filename=filename,
+        user_id=user_id,
+        status="queued",
+        context=json.dumps(context or {})
+    )
+    for position, (name, _) in enumerate(PIPELINES[kind]):
+        job.stages.append(JobStage(position=position, name=name, status="queued"))
+
+    db.add(job)
+    db.commit()
+    return job
+
+
+def enqueue_job(job_id: str):
+    """Hands a job to the worker pool. Returns immediately."""
+    print(f"📥 Queued job {job_id}")
+    with _local_lock:
+        _local.add(job_id)
+    return _executor.submit(run_job, job_id)
+
+
+def _persistable(context: dict) -> dict:
+    return {k: v for k, v in context.items() if not k.startswith("_")}
+
+
+def _claimable():
+    """Queued jobs, and running jobs whose owner stopped renewing the lease."""
+    return or_(
+        Job.status == "queued",
+        and_(Job.status == "running", or_(Job.lease_expires_at.is_(None), Job.lease_expires_at < datetime.utcnow()))
+    )
+
+
+def _claim(db: Session, job_id: str) -> bool:
+    """Atomically takes the job's lease; False if another process holds it or it is finished."""
+    claimed = db.query(Job).filter(Job.id == job_id, _claimable()).update({
+        Job.status: "running",
+        Job.error: None,
+        Job.owner: WORKER_ID,
+        Job.lease_expires_at: datetime.utcnow() + timedelta(seconds=JOB_LEASE_SECONDS),
+    }, synchronize_session=False)
+    db.commit()
+    return claimed == 1
+
+
+def run_job(job_id: str):
+    """Runs every stage of a job in order, recording status as it goes."""
+    db = SessionLocal()
+    try:
+        if not _claim(db, job_id):
+            print(f"⏭️ Job {job_id} is finished or leased by another worker, skipping.")
+            return
+
+        job = db.query(Job).filter(Job.id == job_id).first()
+        stages = dict(PIPELINES[job.kind])
+        context = json.loads(job.context or "{}")
+        context.setdefault("filename", job.filename)
+        context.setdefault("user_id", job.user_id)
+
+        # Stages are idempotent, so a reclaimed job restarts from the first stage
+        for stage in job.stages:
+            stage.status = "queued"
+            stage.error = None
+            stage.started_at = None
+            stage.finished_at = None
+        db.commit()
+
+        for stage in job.stages:
+            owner = db.query(Job.owner).filter(Job.id == job_id).scalar()
+            if owner != WORKER_ID:
+                print(f"⚠️ Job {job_id}: lease lost to {owner}, stopping.")
+                return
+            stage.status = "running"
+            stage.error = None
+            stage.started_at = datetime.utcnow()
+            stage.finished_at = None
+            db.commit()
+            print(f"⚙️ Job {job_id}: running stage '{stage.name}'")
+
+            try:
+                stages[stage.name](context, db)
+            except Exception as e:
+                db.rollback()
+                print(f"❌ Job {job_id}: stage '{stage.name}' failed: {e}")
+                traceback.print_exc()
+                detail = getattr(e, "detail", None) or str(e)
+                stage.status = "failed"
+                stage.error = detail
+                stage.finished_at = datetime.utcnow()
+                job.status = "failed"
+                job.error = f"{stage.name}: {detail}"
+                job.context = json.dumps(_persistable(context))
+                db.commit()
+                return
+
+            stage.status = "succeeded"
+            stage.finished_at = datetime.utcnow()
+            job.context = json.dumps(_persistable(context))
+            db.commit()
+
+        job.status = "succeeded"
+        db.commit()
+        print(f"✅ Job {job_id} finished")
+    finally:
+        with _local_lock:
+            _local.discard(job_id)
+        db.close()
+
+
+def _renew_leases():
+    with _local_lock:
+        job_ids = list(_local)
+    if not job_ids:
+        return
+    db = SessionLocal()
+    try:
+        db.query(Job).filter(Job.id.in_(job_ids), Job.owner == WORKER_ID).update(
+            {Job.lease_expires_at: datetime.utcnow() + timedelta(seconds=JOB_LEASE_SECONDS)},
+            synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def _heartbeat():
+    while True:
+        time.sleep(JOB_LEASE_SECONDS / 3)
+        try:
+            _renew_leases()
+            resume_pending_jobs()
+        except Exception as e:
+            print(f"⚠️ Job heartbeat failed: {e}")
+
+
+def resume_pending_jobs():
+    """
+    Queues jobs nobody is working on: queued jobs and running jobs whose lease
+    expired (their process stopped). Jobs leased by a live sibling process are
+    left alone; run_job() claims each job atomically, so a job queued by two
+    processes still runs once. The first call also starts the lease heartbeat,
+    which renews this process's leases and picks up expired ones.
+    """
+    global _heartbeat_started
+    if not _heartbeat_started:
+        _heartbeat_started = True
+        threading.Thread(target=_heartbeat, name="job-heartbeat", daemon=True).start()
+
+    db = SessionLocal()
+    try:
+        job_ids = [job_id for job_id, in db.query(Job.id).filter(_claimable()).all()]
+    finally:
+        db.close()
+
+    with _local_lock:
+        job_ids = [job_id for job_id in job_ids if job_id not in _local]
+    for job_id in job_ids:
+        enqueue_job(job_id)
+    if job_ids:
+        print(f"🔁 Resumed {len(job_ids)} pending job(s)")
+
+
+def job_to_dict(job: Job) -> dict:
+    """Serializes a job and its stages for the progress endpoint."""
+    completed = sum(1 for stage in job.stages if stage.status == "succeeded")
+    return {
+        "job_id": job.id,
+        "kind": job.kind,
+        "filename": job.filename,
+        "status": job.status,
+        "error": job.error,
+        "progress": {"completed": completed, "total": len(job.stages)},
+        "stages": [
+            {
+                "name": stage.name,
+                "status": stage.status,
+                "error": stage.error,
+                "started_at": stage.started_at.isoformat() if stage.started_at else None,
+                "finished_at": stage.finished_at.isoformat() if stage.finished_at else None,
+            }
+            for stage in job.stages
+        ],
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "updated_at": job.updated_at.isoformat() if job.updated_at else None,
+    }
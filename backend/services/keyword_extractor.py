@@ -0,0 +1,200 @@
+import os
+import re
+import math
+import threading
+from collections import Counter, OrderedDict
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+from services.database import Transcription, Video
+from services.quote_matcher import normalize_tokens
+from services.transcript_store import transcript_text
+
+load_dotenv()
+
+# Below this confidence the LLM is asked instead (HASHTAG_MODE=auto)
+HASHTAG_LOCAL_MIN_CONFIDENCE = float(os.getenv("HASHTAG_LOCAL_MIN_CONFIDENCE", "0.6"))
+CORPUS_DOC_CHARS = 20000  # characters of each of the user's transcripts used for document frequencies
+MAX_PHRASE_WORDS = 3
+MIN_TAG_CHARS = 3
+
+STOPWORDS = set("""
+a about above after again against all also am an and any are aren't as at be because been before being below
+between both but by can can't cannot could couldn't did didn't do does doesn't doing don't down during each
+few for from further had hadn't has hasn't have haven't having he he'd he'll he's her here here's hers herself
+him himself his how how's i i'd i'll i'm i've if in into is isn't it it's its itself let's me more most
+mustn't my myself no nor not of off on once only or other ought our ours ourselves out over own same shan't
+she she'd she'll she's should shouldn't so some such than that that's the their theirs them themselves then
+there there's these they they'd they'll they're they've this those through to too under until up very was
+wasn't we we'd we'll we're we've were weren't what what's when when's where where's which while who who's
+whom why why's with won't would wouldn't you you'd you'll you're you've your yours yourself yourselves
+um uh uhm hmm yeah yes ok okay oh like just really actually basically literally gonna wanna gotta kinda sorta
+know think mean get got go going went come thing things stuff lot lots way right well sure guess say said
+one two also even still much many something anything everything nothing someone anyone everyone people
+time times now then today kind sort little big good great bad pretty probably maybe thank thanks
+back first last every never always ever else another around away honestly able made make makes
+""".split())
+
+_SPLIT_RE = re.compile(r"[.,!?;:()\"\[\]\n]+")
+
+
+class CorpusStats:
+    """Document frequencies of words over a set of transcripts (one user's videos)."""
+
+    def __init__(self, documents: list):
+        self.size = len(documents)
+        self.df = Counter()
+        for text in documents:
+            self.df.update(set(normalize_tokens(text)))
+
+    def idf(self, word: str) -> float:
+        # Smoothed, so words unseen in the corpus score highest and a corpus of one still works
+        return math.log((self.size + 1) / (self.df.get(word, 0) + 1)) + 1.0
+
+
+EMPTY_CORPUS = CorpusStats([])
+
+
+def _content_words(tokens: list) -> list:
+    return [t for t in tokens if t not in STOPWORDS and len(t) >= MIN_TAG_CHARS and not t.isdigit()]
+
+
+def rake_phrases(text: str) -> Counter:
+    """
+    RAKE: candidate phrases are runs of non-stopwords between stopwords and
+    punctuation; a phrase scores the sum of its words' degree / frequency.
+    Returns phrase (tuple of words) -> score, summed over occurrences.
+    """
+    phrases = []
+    for chunk in _SPLIT_RE.split(text.lower()):
+        run = []
+        for token in normalize_tokens(chunk):
+            if token in STOPWORDS or token.isdigit():
+                if run:
+                    phrases.append(tuple(run))
+                run = []
+            else:
+                run.append(token)
+        if run:
+            phrases.append(tuple(run))
+    phrases = [p for p in phrases if len(p) <= MAX_PHRASE_WORDS]
+
+    freq, degree = Counter(), Counter()
+    for phrase in phrases:
+        for word in phrase:
+            freq[word] += 1
+            degree[word] += len(phrase)
+
+    scores = Counter()
+    for phrase in phrases:
+        scores[phrase] += sum(degree[w] / freq[w] for w in phrase)
+    return scores
+
+
+_noun_phrases_available = True
+
+
+def noun_phrases(text: str) -> list:
+    """TextBlob noun phrases, or [] when the NLTK corpora it needs aren't installed."""
+    global _noun_phrases_available
+    if not _noun_phrases_available:
+        return []
+    try:
+        from textblob import TextBlob
+        return [tuple(normalize_tokens(np)) for np in TextBlob(text).noun_phrases]
+    except Exception as e:
+        _noun_phrases_available = False
+        print(f"⚠️ Noun phrase extraction unavailable, using RAKE only: {e}")
+        return []
+
+
+def extract_hashtags(text: str, num_hashtags: int = 5, corpus: CorpusStats = None):
+    """
+    Local hashtag extraction: TF-IDF over the corpus for single words, RAKE and
+    noun phrases (weighted by the IDF of their words) for multi-word tags.
+
+    Returns:
+        tuple: (tags, confidence). Tags are lowercase, without '#' or spaces.
+            Confidence (0-1) grows with the amount of text and with how many of
+            the tags are repeated in it; short clips score low.
+    """
+    corpus = corpus or EMPTY_CORPUS
+    tokens = normalize_tokens(text)
+    words = _content_words(tokens)
+    if not words:
+        return [], 0.0
+
+    tf = Counter(words)
+    candidates = Counter()
+    occurrences = {}
+    for word, count in tf.items():
+        candidates[(word,)] = (1 + math.log(count)) * corpus.idf(word)
+        occurrences[(word,)] = count
+
+    ngrams = Counter(
+        tuple(tokens[i:i + n]) for n in range(2, MAX_PHRASE_WORDS + 1) for i in range(len(tokens) - n + 1)
+    )
+    rake = rake_phrases(text)
+    top_rake = max(rake.values(), default=1.0)
+    noun_phrase_counts = Counter(p for p in noun_phrases(text) if 1 < len(p) <= MAX_PHRASE_WORDS)
+    for phrase in set(rake) | set(noun_phrase_counts):
+        phrase = tuple(w for w in phrase if w not in STOPWORDS)
+        if len(phrase) < 2:
+            continue
+        count = max(ngrams.get(phrase, 0), 1)
+        weight = rake.get(phrase, 0.0) / top_rake + (0.5 if phrase in noun_phrase_counts else 0.0)
+        idf = sum(corpus.idf(w) for w in phrase) / len(phrase)
+        candidates[phrase] = max(candidates[phrase], (1 + math.log(count)) * idf * (0.5 + weight))
+        occurrences[phrase] = count
+
+    tags, picked_words = [], set()
+    for phrase, _ in candidates.most_common():
+        tag = "".join(phrase)
+        # Skip words already covered by a picked phrase (and vice versa)
+        if tag in tags or (len(phrase) == 1 and phrase[0] in picked_words):
+            continue
+        if len(phrase) > 1 and any(w in picked_words for w in phrase):
+            continue
+        tags.append(tag)
+        picked_words.update(phrase)
+        if len(tags) >= num_hashtags:
+            break
+
+    picked = [p for p in candidates if "".join(p) in tags]
+    repeated = sum(1 for p in picked if occurrences.get(p, 1) >= 2) / max(len(picked), 1)
+    length = min(1.0, len(words) / 100)
+    return tags, round(repeated * length, 3)
+
+
+# --------------------------
+# Per-user corpus cache
+# --------------------------
+MAX_CACHED_CORPORA = 32
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def get_user_corpus(db: Session, user_id: str) -> CorpusStats:
+    """
+    Document frequencies over the user's transcripts. Rebuilt only when one of
+    them is added, removed or edited (their revisions change).
+    """
+    if not user_id:
+        return EMPTY_CORPUS
+
+    versions = db.query(Transcription.filename, Transcription.revision).join(
+        Video, Video.filename == Transcription.filename
+    ).filter(Video.user_id == user_id).order_by(Transcription.filename).all()
+    key = (user_id, tuple((filename, revision) for filename, revision in versions))
+
+    with _cache_lock:
+        corpus = _cache.get(key)
+        if corpus is not None:
+            _cache.move_to_end(key)
+            return corpus
+
+    corpus = CorpusStats([transcript_text(db, filename, max_chars=CORPUS_DOC_CHARS) for filename, _ in versions])
+    with _cache_lock:
+        _cache[key] = corpus
+        while len(_cache) > MAX_CACHED_CORPORA:
+            _cache.popitem(last=False)
+    return corpus
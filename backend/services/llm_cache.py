@@ -0,0 +1,150 @@
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from sqlalchemy import delete, func, select
+from services.database import SessionLocal, LLMCacheEntry
+
+load_dotenv()
+
+# Identical prompts with identical parameters are answered from the llm_cache
+# table instead of calling the model again
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_TTL_HOURS = float(os.getenv("LLM_CACHE_TTL_HOURS", str(7 * 24)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+
+_stats = {"hits": 0, "misses": 0, "bypassed": 0, "stores": 0, "evictions": 0, "errors": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name: str, n: int = 1):
+    with _stats_lock:
+        _stats[name] += n
+
+
+def cache_stats() -> dict:
+    """Hit/miss counters of this process since startup."""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else None
+    return stats
+
+
+def cache_key(model: str, prompt: str, **params) -> str:
+    """SHA-256 over the model, the prompt's hash and the sorted call parameters."""
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    material = json.dumps({"model": model, "prompt": prompt_hash, "params": params}, sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def _evict(db):
+    """Drops entries past the TTL, then the least recently used ones above the size limit."""
+    evicted = db.execute(
+        delete(LLMCacheEntry).where(
+            LLMCacheEntry.created_at < datetime.utcnow() - timedelta(hours=LLM_CACHE_TTL_HOURS)
+        )
+    ).rowcount or 0
+
+    overflow = db.execute(select(func.count()).select_from(LLMCacheEntry)).scalar() - LLM_CACHE_MAX_ENTRIES
+    if overflow > 0:
+        oldest = select(LLMCacheEntry.key).order_by(LLMCacheEntry.last_used_at).limit(overflow)
+        evicted += db.execute(
+            delete(LLMCacheEntry).where(LLMCacheEntry.key.in_(oldest))
+        ).rowcount or 0
+
+    if evicted:
+        _count("evictions", evicted)
+
+
+def cache_lookup(model: str, prompt: str, **params):
+    """Returns the cached response for (model, prompt, params), or None on a miss."""
+    if not LLM_CACHE_ENABLED:
+        return None
+
+    key = cache_key(model, prompt, **params)
+    db = SessionLocal()
+    try:
+        entry = db.get(LLMCacheEntry, key)
+        expired = entry is not None and entry.created_at < datetime.utcnow() - timedelta(hours=LLM_CACHE_TTL_HOURS)
+        if entry is not None and not expired:
+            entry.hits += 1
+            entry.last_used_at = datetime.utcnow()
+            db.commit()
+            _count("hits")
+            print(f"♻️ LLM cache hit ({model}, {key[:12]})")
+            return entry.response
+    except Exception as e:
+        # The cache must never break the request; fall through to the model
+        db.rollback()
+        _count("errors")
+        print(f"⚠️ LLM cache lookup failed: {e}")
+    finally:
+        db.close()
+    _count("misses")
+    return None
+
+
+def cache_store(model: str, prompt: str, response: str, **params):
+    """Stores (or replaces) the response for (model, prompt, params) and evicts old entries."""
+    if not LLM_CACHE_ENABLED:
+        return
+
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        db.merge(LLMCacheEntry(
+            key=cache_key(model, prompt, **params), model=model, response=response,
+            hits=0, created_at=now, last_used_at=now
+        ))
+        db.flush()
+        _evict(db)
+        db.commit()
+        _count("stores")
+    except Exception as e:
+        db.rollback()
+        _count("errors")
+        print(f"⚠️ LLM cache store failed: {e}")
+    finally:
+        db.close()
+
+
+def cached_completion(model: str, prompt: str, compute, bypass: bool = False, **params) -> str:
+    """
+    Returns the cached response for (model, prompt, params), or calls compute()
+    and stores its result.
+
+    Args:
+        compute: zero-argument callable making the real LLM call.
+        bypass (bool): skip the lookup ("regenerate") but still store the fresh
+            response, so later calls see the newest answer.
+    """
+    if not LLM_CACHE_ENABLED:
+        return compute()
+
+    if bypass:
+        _count("bypassed")
+    else:
+        response = cache_lookup(model, prompt, **params)
+        if response is not None:
+            return response
+
+    response = compute()
+    cache_store(model, prompt, response, **params)
+    return response
+
+
+def clear_cache(model: str = None) -> int:
+    """Deletes all entries (or those of one model); returns how many were removed."""
+    db = SessionLocal()
+    try:
+        statement = delete(LLMCacheEntry)
+        if model:
+            statement = statement.where(LLMCacheEntry.model == model)
+        removed = db.execute(statement).rowcount or 0
+        db.commit()
+        return removed
+    finally:
+        db.close()
@@ -0,0 +1,344 @@
+import os
+import time
+import random
+import queue
+import asyncio
+import threading
+from collections import defaultdict, deque
+from email.utils import parsedate_to_datetime
+from dotenv import load_dotenv
+
+load_dotenv()
+
+OPEN_AI_API_KEY = os.getenv("OPEN_AI_API_KEY")
+# Point at a local mock server (e.g. benchmarks/mock_llm_server.py) for testing
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+
+# Shared budget of every LLM call made by this process
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "500"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "90000"))
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "8"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_BACKOFF_BASE = 1.0  # seconds, doubled per attempt
+LLM_BACKOFF_MAX = 30.0
+
+LATENCY_SAMPLES = 500  # recent calls kept per model for percentiles
+
+_encoders = {}
+
+
+def _encoder(model: str):
+    import tiktoken
+
+    if model not in _encoders:
+        try:
+            try:
+                _encoders[model] = tiktoken.encoding_for_model(model)
+            except KeyError:
+                _encoders[model] = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            # The BPE file is downloaded on first use; without it, estimate instead
+            print(f"⚠️ tiktoken encoding unavailable, estimating tokens from length: {e}")
+            _encoders[model] = None
+    return _encoders[model]
+
+
+def count_tokens(texts: list, model: str) -> list:
+    """Token count of each text under the model's tokenizer (~4 chars per token if it can't load)."""
+    texts = list(texts)
+    encoder = _encoder(model)
+    if encoder is None:
+        return [len(text) // 4 + 1 for text in texts]
+    return [len(tokens) for tokens in encoder.encode_ordinary_batch(texts)]
+
+
+class TokenBucket:
+    """Async token bucket refilled continuously at `per_minute` units per minute."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float):
+        # A request larger than the whole bucket waits for a full bucket instead of forever
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def refund(self, amount: float):
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+def _retry_after(error) -> float:
+    """Seconds the server asked us to wait, from Retry-After(-Ms) headers, or None."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+class LLMGateway:
+    """
+    Process-wide gateway for chat completions.
+
+    All calls share one AsyncOpenAI client running on a background event loop,
+    a requests-per-minute and a tokens-per-minute budget, and a cap on calls in
+    flight. Rate limits, timeouts and 5xx errors are retried with jittered
+    exponential backoff, honouring Retry-After; a 429 also pauses every other
+    call until the server's wait is over.
+
+    Sync code calls chat(); coroutines on any event loop await achat().
+    """
+
+    def __init__(self, api_key=OPEN_AI_API_KEY, base_url=OPENAI_BASE_URL,
+                 requests_per_minute=LLM_REQUESTS_PER_MINUTE, tokens_per_minute=LLM_TOKENS_PER_MINUTE,
+                 max_in_flight=LLM_MAX_IN_FLIGHT, max_retries=LLM_MAX_RETRIES, timeout=LLM_TIMEOUT):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.timeout = timeout
+
+        self._loop = None
+        self._start_lock = threading.Lock()
+        self._pause_until = 0.0
+
+        self._metrics_lock = threading.Lock()
+        self._metrics = defaultdict(lambda: {
+            "calls": 0, "errors": 0, "retries": 0, "rate_limited": 0,
+            "prompt_tokens": 0, "completion_tokens": 0,
+            "latencies": deque(maxlen=LATENCY_SAMPLES),
+        })
+        self._in_flight = 0
+
+    # --------------------------
+    # Event loop
+    # --------------------------
+    def _ensure_loop(self):
+        if self._loop is not None:
+            return self._loop
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="llm-gateway", daemon=True).start()
+                # Client, buckets and semaphore live on the gateway loop
+                asyncio.run_coroutine_threadsafe(self._setup(), loop).result()
+                self._loop = loop
+        return self._loop
+
+    async def _setup(self):
+        from openai import AsyncOpenAI
+
+        # Retries are done here so they share the budget and honour the pause
+        self._client = AsyncOpenAI(
+            api_key=self.api_key, base_url=self.base_url, max_retries=0, timeout=self.timeout
+        )
+        self._requests = TokenBucket(self.requests_per_minute)
+        self._tokens = TokenBucket(self.tokens_per_minute)
+        self._semaphore = asyncio.Semaphore(self.max_in_flight)
+
+    # --------------------------
+    # Calls
+    # --------------------------
+    def chat(self, prompt: str, model: str, max_tokens: int = 1000, temperature: float = 0.7,
+             response_format: dict = None) -> str:
+        """
+        Blocking chat completion; returns the reply text. Don't call from the gateway loop.
+        response_format is passed through, e.g. {"type": "json_object"} for JSON mode.
+        """
+        future = asyncio.run_coroutine_threadsafe(
+            self._chat(prompt, model, max_tokens, temperature, response_format), self._ensure_loop()
+        )
+        return future.result()
+
+    async def achat(self, prompt: str, model: str, max_tokens: int = 1000, temperature: float = 0.7,
+                    response_format: dict = None) -> str:
+        """Awaitable chat completion usable from any event loop."""
+        future = asyncio.run_coroutine_threadsafe(
+            self._chat(prompt, model, max_tokens, temperature, response_format), self._ensure_loop()
+        )
+        return await asyncio.wrap_future(future)
+
+    def stream_chat(self, prompt: str, model: str, max_tokens: int = 1000, temperature: float = 0.7):
+        """
+        Blocking generator over the reply's text deltas as the model produces them.
+        Same budget, limits and retries as chat(); a call is only retried before
+        its first delta. Closing the generator early cancels the request.
+        """
+        deltas = queue.Queue()
+        done = object()
+        future = asyncio.run_coroutine_threadsafe(
+            self._chat(prompt, model, max_tokens, temperature, on_delta=deltas.put), self._ensure_loop()
+        )
+        future.add_done_callback(lambda _: deltas.put(done))
+        try:
+            while True:
+                delta = deltas.get()
+                if delta is done:
+                    future.result()  # re-raises the call's error, if any
+                    return
+                yield delta
+        finally:
+            if not future.done():
+                future.cancel()
+
+    async def _chat(self, prompt, model, max_tokens, temperature, response_format=None, on_delta=None) -> str:
+        from openai import APIConnectionError, APITimeoutError, APIStatusError, RateLimitError
+
+        estimate = count_tokens([prompt], model)[0] + max_tokens
+        extra = {"response_format": response_format} if response_format else {}
+        if on_delta:
+            extra.update(stream=True, stream_options={"include_usage": True})
+        streamed = False
+        attempt = 0
+        while True:
+            delay = self._pause_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self._requests.acquire(1)
+            await self._tokens.acquire(estimate)
+
+            wait = None
+            async with self._semaphore:
+                self._in_flight += 1
+                started = time.monotonic()
+                try:
+                    response = await self._client.chat.completions.create(
+                        model=model,
+                        messages=[{"role": "user", "content": prompt}],
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        **extra
+                    )
+                    if on_delta:
+                        parts, usage = [], None
+                        async for chunk in response:
+                            if chunk.usage is not None:
+                                usage = chunk.usage
+                            if chunk.choices and chunk.choices[0].delta.content:
+                                streamed = True
+                                parts.append(chunk.choices[0].delta.content)
+                                on_delta(chunk.choices[0].delta.content)
+                        content = "".join(parts)
+                    else:
+                        usage = response.usage
+                        content = response.choices[0].message.content
+                except (RateLimitError, APITimeoutError, APIConnectionError, APIStatusError) as e:
+                    status = getattr(e, "status_code", None)
+                    # Once text has reached the caller a retry would repeat it
+                    retryable = not streamed and (status is None or status == 429 or status >= 500)
+                    if not retryable or attempt >= self.max_retries:
+                        self._record(model, time.monotonic() - started, error=True)
+                        raise
+
+                    wait = _retry_after(e)
+                    if status == 429:
+                        self._record(model, None, rate_limited=True)
+                    if wait is None:
+                        # Full jitter keeps a burst of callers from retrying in lockstep
+                        wait = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+                    else:
+                        wait += random.uniform(0, min(1.0, wait * 0.1) or 0.1)
+                        if status == 429:
+                            self._pause_until = max(self._pause_until, time.monotonic() + wait)
+                    self._record(model, None, retry=True)
+                    print(f"⏳ LLM call failed ({status or type(e).__name__}), retry {attempt + 1} in {wait:.1f}s")
+                    attempt += 1
+                finally:
+                    self._in_flight -= 1
+
+            if wait is not None:
+                # Back off outside the semaphore so the slot serves other calls meanwhile
+                await asyncio.sleep(wait)
+                continue
+
+            if usage is not None:
+                # Give back what the estimate over-reserved
+                self._tokens.refund(max(0, estimate - usage.total_tokens))
+            self._record(model, time.monotonic() - started, usage=usage)
+            return content
+
+    # --------------------------
+    # Metrics
+    # --------------------------
+    def _record(self, model, latency, usage=None, error=False, retry=False, rate_limited=False):
+        with self._metrics_lock:
+            stats = self._metrics[model]
+            if latency is not None:
+                stats["calls"] += 1
+                stats["latencies"].append(latency)
+            stats["errors"] += int(error)
+            stats["retries"] += int(retry)
+            stats["rate_limited"] += int(rate_limited)
+            if usage is not None:
+                stats["prompt_tokens"] += usage.prompt_tokens or 0
+                stats["completion_tokens"] += usage.completion_tokens or 0
+
+    def metrics(self) -> dict:
+        """Per-model call counts, token usage and latency percentiles of this process."""
+        with self._metrics_lock:
+            models = {}
+            for model, stats in self._metrics.items():
+                latencies = sorted(stats["latencies"])
+                models[model] = {
+                    key: value for key, value in stats.items() if key != "latencies"
+                }
+                models[model]["latency_ms"] = {
+                    "p50": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+                    "p95": round(latencies[int(len(latencies) * 0.95)] * 1000, 1) if latencies else None,
+                    "max": round(latencies[-1] * 1000, 1) if latencies else None,
+                }
+        return {
+            "in_flight": self._in_flight,
+            "limits": {
+                "requests_per_minute": self.requests_per_minute,
+                "tokens_per_minute": self.tokens_per_minute,
+                "max_in_flight": self.max_in_flight,
+            },
+            "models": models,
+        }
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_llm_gateway() -> LLMGateway:
+    """Returns the process-wide gateway, created on first use."""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = LLMGateway()
+    return _gateway
@@ -0,0 +1,122 @@
+import json
+import bisect
+import threading
+from collections import OrderedDict
+from sqlalchemy.orm import Session
+from services.database import MediaIndex
+from services.storage import s3_client, AWS_S3_BUCKET
+from services.artifact_store import artifact_prefix
+from services.smart_cut import copy_reason
+
+# The ECS worker probes each video once at ingest (cloud-processing/media_index.py)
+# and writes a JSON sidecar with its keyframes, byte offsets and stream layout.
+# The media_indexes row summarises it; the full index is loaded from S3 on demand.
+
+
+def media_index_key(content_hash: str) -> str:
+    return f"{artifact_prefix(content_hash)}/media_index.json"
+
+
+def get_media_index_summary(db: Session, content_hash: str):
+    if not content_hash:
+        return None
+    return db.get(MediaIndex, content_hash)
+
+
+def media_index_key_for(db: Session, content_hash: str):
+    """S3 key of the video's index if it was built, else None (the worker then probes)."""
+    summary = get_media_index_summary(db, content_hash)
+    return summary.s3_key if summary else None
+
+
+def save_media_index(db: Session, content_hash: str, s3_key: str, index: dict) -> MediaIndex:
+    """Records (or replaces) the summary row for an index stored at s3_key."""
+    keyframes = index.get("keyframes") or []
+    video = index.get("video") or {}
+    audio = index.get("audio") or {}
+    gaps = [b - a for a, b in zip(keyframes, keyframes[1:])]
+    if keyframes and index.get("duration"):
+        gaps.append(index["duration"] - keyframes[-1])
+
+    summary = db.merge(MediaIndex(
+        content_hash=content_hash,
+        s3_key=s3_key,
+        duration=index.get("duration"),
+        size=index.get("size"),
+        container=index.get("format"),
+        video_codec=video.get("codec_name"),
+        width=video.get("width"),
+        height=video.get("height"),
+        fps=video.get("fps"),
+        audio_codec=audio.get("codec_name"),
+        audio_channels=audio.get("channels"),
+        sample_rate=audio.get("sample_rate"),
+        keyframe_count=len(keyframes),
+        max_keyframe_interval=round(max(gaps), 3) if gaps else None,
+    ))
+    db.commit()
+    return summary
+
+
+def fetch_media_index(s3_key: str) -> dict:
+    body = s3_client.get_object(Bucket=AWS_S3_BUCKET, Key=s3_key)["Body"].read()
+    return json.loads(body)
+
+
+# --------------------------
+# Per-video cache of full indexes
+# --------------------------
+MAX_CACHED_INDEXES = 32
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def load_media_index(db: Session, content_hash: str):
+    """
+    Returns the full index dict for a video, or None if it has none.
+    Indexes are immutable per content hash, so they are cached in-process.
+    """
+    with _cache_lock:
+        index = _cache.get(content_hash)
+        if index is not None:
+            _cache.move_to_end(content_hash)
+            return index
+
+    s3_key = media_index_key_for(db, content_hash)
+    if not s3_key:
+        return None
+    try:
+        index = fetch_media_index(s3_key)
+    except Exception as e:
+        print(f"⚠️ Could not load media index {s3_key}: {e}")
+        return None
+
+    with _cache_lock:
+        _cache[content_hash] = index
+        while len(_cache) > MAX_CACHED_INDEXES:
+            _cache.popitem(last=False)
+    return index
+
+
+# --------------------------
+# Lookups
+# --------------------------
+def keyframes_between(index: dict, start: float, end: float) -> list:
+    """Keyframe pts within clip times [start, end] (relative to the container start)."""
+    keyframes = index.get("keyframes") or []
+    offset = index.get("start_time") or 0.0
+    return keyframes[bisect.bisect_left(keyframes, start + offset):bisect.bisect_right(keyframes, end + offset)]
+
+
+def cut_plan(index: dict, start: float, end: float) -> dict:
+    """
+    How a smart cut of [start, end] splits up, from the index alone:
+    seconds stream-copied between the first and last inner keyframe,
+    and seconds re-encoded at the edges. Streams smart_cut can't copy
+    (see smart_cut.copy_reason) are re-encoded whole.
+    """
+    if copy_reason(index.get("video")) is not None:
+        return {"copied": 0.0, "reencoded": round(end - start, 3)}
+    inner = keyframes_between(index, start, end)
+    copied = inner[-1] - inner[0] if len(inner) >= 2 else 0.0
+    return {"copied": round(copied, 3), "reencoded": round((end - start) - copied, 3)}
@@ -0,0 +1,243 @@
+import os
+import math
+import threading
+from collections import Counter, OrderedDict
+import numpy as np
+from dotenv import load_dotenv
+from services.quote_matcher import normalize_tokens
+
+load_dotenv()
+
+# Local pre-ranking: only the top K windows of the transcript are sent to the LLM
+PRERANK_ENABLED = os.getenv("PRERANK_ENABLED", "true").lower() == "true"
+PRERANK_TOP_K = int(os.getenv("PRERANK_TOP_K", "8"))
+PRERANK_WINDOW_SECONDS = float(os.getenv("PRERANK_WINDOW_SECONDS", "90"))
+# Transcripts under this many tokens are cheap enough to send whole
+PRERANK_MIN_TOKENS = int(os.getenv("PRERANK_MIN_TOKENS", "2500"))
+
+# Weights of the standardized window features in the final score
+FEATURE_WEIGHTS = {
+    "emotion": 1.0,       # mean |polarity|
+    "subjectivity": 0.8,  # mean subjectivity
+    "punctuation": 0.6,   # ? and ! per word
+    "speech_rate": 0.4,   # words per second
+    "novelty": 0.8,       # mean rarity (IDF-style) of the words within the episode
+}
+
+
+class SegmentFeatures:
+    """
+    Per-segment signals, computed once per transcript and kept as prefix sums
+    so any window's totals are two array lookups.
+    """
+
+    def __init__(self, segments: list):
+        from textblob import TextBlob
+
+        n = len(segments)
+        words = np.zeros(n)
+        polarity = np.zeros(n)
+        subjectivity = np.zeros(n)
+        punctuation = np.zeros(n)
+        novel = np.zeros(n)
+
+        segment_tokens = [normalize_tokens(seg.get("text", "")) for seg in segments]
+        counts = Counter(token for tokens in segment_tokens for token in tokens)
+        total = max(sum(counts.values()), 1)
+        # Words repeated all episode long (filler, the show's topic) score near zero
+        rarity = {token: math.log(total / count) for token, count in counts.items()}
+
+        for i, seg in enumerate(segments):
+            text = seg.get("text", "")
+            tokens = segment_tokens[i]
+            sentiment = TextBlob(text).sentiment
+            words[i] = len(tokens)
+            # Weighted by word count so long segments count for more in a window mean
+            polarity[i] = abs(sentiment.polarity) * len(tokens)
+            subjectivity[i] = sentiment.subjectivity * len(tokens)
+            punctuation[i] = text.count("?") + text.count("!")
+            novel[i] = sum(rarity[token] for token in tokens)
+
+        self.starts = np.fromiter((float(seg["start"]) for seg in segments), dtype=np.float64, count=n)
+        self.ends = np.fromiter((float(seg["end"]) for seg in segments), dtype=np.float64, count=n)
+        self._search_ends = np.maximum.accumulate(self.ends) if n else self.ends
+
+        def prefix(values):
+            return np.concatenate(([0.0], np.cumsum(values)))
+
+        self.words = prefix(words)
+        self.polarity = prefix(polarity)
+        self.subjectivity = prefix(subjectivity)
+        self.punctuation = prefix(punctuation)
+        self.novel = prefix(novel)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def window_ends(self, window_seconds: float) -> np.ndarray:
+        """Index of the last segment of the window starting at each segment."""
+        last = len(self) - 1
+        ends = np.searchsorted(self._search_ends, self.starts + window_seconds, side="left")
+        return np.clip(ends, np.arange(len(self)), last)
+
+    def score_windows(self, window_seconds: float = PRERANK_WINDOW_SECONDS, weights: dict = None):
+        """
+        Scores the window starting at every segment.
+
+        Returns:
+            tuple: (end_idx, score) arrays, one entry per start segment.
+        """
+        weights = weights or FEATURE_WEIGHTS
+        s = np.arange(len(self))
+        e = self.window_ends(window_seconds)
+
+        def total(prefix):
+            return prefix[e + 1] - prefix[s]
+
+        words = np.maximum(total(self.words), 1.0)
+        duration = np.maximum(self.ends[e] - self.starts[s], 1.0)
+        features = {
+            "emotion": total(self.polarity) / words,
+            "subjectivity": total(self.subjectivity) / words,
+            "punctuation": total(self.punctuation) / words,
+            "speech_rate": words / duration,
+            "novelty": total(self.novel) / words,
+        }
+
+        score = np.zeros(len(self))
+        for name, values in features.items():
+            std = values.std()
+            if std > 0:
+                score += weights.get(name, 0.0) * (values - values.mean()) / std
+        return e, score
+
+
+def select_windows(end_idx: np.ndarray, score: np.ndarray, top_k: int = PRERANK_TOP_K) -> list:
+    """
+    Picks the top_k highest-scoring windows that don't share segments.
+
+    Returns:
+        list: (first_idx, last_idx) pairs in transcript order.
+    """
+    taken = np.zeros(len(score), dtype=bool)
+    picked = []
+    for start in np.argsort(-score, kind="stable"):
+        end = end_idx[start]
+        if taken[start:end + 1].any():
+            continue
+        taken[start:end + 1] = True
+        picked.append((int(start), int(end)))
+        if len(picked) >= top_k:
+            break
+    return sorted(picked)
+
+
+def prerank_segments(segments: list, segment_tokens: list, cache_key=None,
+                     top_k: int = PRERANK_TOP_K, window_seconds: float = PRERANK_WINDOW_SECONDS):
+    """
+    Keeps only the segments of the top_k most promising windows.
+
+    Returns:
+        tuple: (kept_segments, kept_tokens, report). kept_segments is in transcript
+            order and reuses the original dicts; report holds the token counts
+            before and after, and "spans": each window's (first, last) index in
+            kept_segments (None when nothing was dropped).
+    """
+    total_tokens = int(sum(segment_tokens))
+    report = {
+        "windows": None, "spans": None,
+        "tokens_total": total_tokens, "tokens_sent": total_tokens, "tokens_saved": 0
+    }
+    if not segments or total_tokens <= PRERANK_MIN_TOKENS:
+        return segments, segment_tokens, report
+
+    features = get_segment_features(segments, cache_key)
+    end_idx, score = features.score_windows(window_seconds)
+    windows = select_windows(end_idx, score, top_k)
+
+    keep = np.zeros(len(segments), dtype=bool)
+    for start, end in windows:
+        keep[start:end + 1] = True
+    kept = [seg for seg, flag in zip(segments, keep) if flag]
+    kept_tokens = [tokens for tokens, flag in zip(segment_tokens, keep) if flag]
+    sent = int(sum(kept_tokens))
+
+    # Each window's (first, last) index within kept_segments
+    spans = []
+    for start, end in windows:
+        first = spans[-1][1] + 1 if spans else 0
+        spans.append((first, first + end - start))
+
+    report.update({
+        "windows": [[float(features.starts[s]), float(features.ends[e])] for s, e in windows],
+        "spans": spans,
+        "tokens_sent": sent,
+        "tokens_saved": total_tokens - sent,
+    })
+    print(
+        f"📉 Pre-ranking kept {len(windows)} window(s): {sent}/{total_tokens} tokens sent to the LLM "
+        f"({total_tokens - sent} saved)"
+    )
+    return kept, kept_tokens, report
+
+
+def _clock(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes // 60}:{minutes % 60:02d}:{seconds:02d}" if minutes >= 60 else f"{minutes}:{seconds:02d}"
+
+
+def excerpt_text(segments: list, spans: list, first: int = 0, last: int = None) -> str:
+    """
+    Prompt text of pre-ranked windows: segments[first:last + 1] joined, with a
+    header giving each window's number and time range, since the windows are
+    not contiguous in the episode.
+    """
+    last = len(segments) - 1 if last is None else last
+    parts = []
+    for number, (start, end) in enumerate(spans, 1):
+        lo, hi = max(start, first), min(end, last)
+        if lo > hi:
+            continue
+        header = (
+            f"[Excerpt {number} of {len(spans)}, "
+            f"{_clock(float(segments[start]['start']))}-{_clock(float(segments[end]['end']))}]"
+        )
+        parts.append(header + "\n" + " ".join(seg["text"] for seg in segments[lo:hi + 1]))
+    return "\n\n".join(parts)
+
+
+def prerank_settings(prerank: bool = None, top_k: int = None) -> str:
+    """Short description of the pre-ranking settings in effect, for cache keys."""
+    if not (PRERANK_ENABLED if prerank is None else prerank):
+        return "noprerank"
+    return f"prerank{top_k or PRERANK_TOP_K}x{PRERANK_WINDOW_SECONDS:g}s>{PRERANK_MIN_TOKENS}"
+
+
+# --------------------------
+# Per-transcript cache
+# --------------------------
+MAX_CACHED_FEATURES = 16
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def get_segment_features(segments: list, cache_key=None) -> SegmentFeatures:
+    """
+    Returns segment features, reusing cached ones when cache_key
+    (e.g. (filename, revision)) was seen before.
+    """
+    if cache_key is None:
+        return SegmentFeatures(segments)
+
+    with _cache_lock:
+        features = _cache.get(cache_key)
+        if features is not None:
+            _cache.move_to_end(cache_key)
+            return features
+
+    features = SegmentFeatures(segments)
+    with _cache_lock:
+        _cache[cache_key] = features
+        while len(_cache) > MAX_CACHED_FEATURES:
+            _cache.popitem(last=False)
+    return features
@@ -0,0 +1,132 @@
+import re
+import difflib
+import threading
+from collections import Counter, OrderedDict, defaultdict
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+
+def normalize_tokens(text: str) -> list:
+    """Lowercases, strips punctuation and splits into word tokens."""
+    return _TOKEN_RE.findall(text.lower().replace("’", "'"))
+
+
+class TranscriptMatchIndex:
+    """
+    Inverted index of token n-grams over a transcript, used to map LLM quotes
+    back to segment spans.
+
+    Build once per transcript, then call match() for every quote:
+      1. n-grams of the quote are looked up to count hits per segment,
+      2. the best few segments are shortlisted,
+      3. windows of up to `max_window` consecutive segments around each
+         candidate are scored exactly against the quote.
+    N-grams are taken over the whole token stream, so those that cross a
+    segment boundary point at both segments and quotes spanning two
+    segments still find both.
+    """
+
+    def __init__(self, segments: list, ngram: int = 3, max_window: int = 3):
+        self.segments = segments
+        self.ngram = ngram
+        self.max_window = max_window
+
+        self.segment_tokens = [normalize_tokens(seg.get("text", "")) for seg in segments]
+
+        flat_tokens = []
+        token_segment = []
+        for idx, tokens in enumerate(self.segment_tokens):
+            flat_tokens += tokens
+            token_segment += [idx] * len(tokens)
+
+        self.postings = defaultdict(set)
+        self.unigram_postings = defaultdict(set)
+        for pos, token in enumerate(flat_tokens):
+            self.unigram_postings[token].add(token_segment[pos])
+            if pos + ngram <= len(flat_tokens):
+                gram = tuple(flat_tokens[pos:pos + ngram])
+                self.postings[gram].add(token_segment[pos])
+                self.postings[gram].add(token_segment[pos + ngram - 1])
+
+    def _candidates(self, quote_tokens: list, shortlist: int) -> list:
+        hits = Counter()
+        if len(quote_tokens) >= self.ngram:
+            grams = {tuple(quote_tokens[i:i + self.ngram]) for i in range(len(quote_tokens) - self.ngram + 1)}
+            for gram in grams:
+                for idx in self.postings.get(gram, ()):
+                    hits[idx] += 1
+        if not hits:
+            # Short or heavily paraphrased quote: fall back to single words
+            for token in set(quote_tokens):
+                for idx in self.unigram_postings.get(token, ()):
+                    hits[idx] += 1
+        return [idx for idx, _ in hits.most_common(shortlist)]
+
+    @staticmethod
+    def _score(quote_tokens: list, window_tokens: list) -> float:
+        """Share of the quote's tokens found, in order, inside the window."""
+        matcher = difflib.SequenceMatcher(None, quote_tokens, window_tokens, autojunk=False)
+        matched = sum(block.size for block in matcher.get_matching_blocks())
+        return matched / len(quote_tokens)
+
+    def match(self, quote: str, min_score: float = 0.6, shortlist: int = 8):
+        """
+        Returns (start_idx, end_idx, score) for the best-matching segment span,
+        or None if nothing scores at least `min_score`.
+        """
+        quote_tokens = normalize_tokens(quote)
+        if not quote_tokens or not self.segments:
+            return None
+
+        best = None
+        seen = set()
+        last = len(self.segments) - 1
+        for candidate in self._candidates(quote_tokens, shortlist):
+            for start in range(max(candidate - self.max_window + 1, 0), candidate + 1):
+                for end in range(candidate, min(start + self.max_window - 1, last) + 1):
+                    if (start, end) in seen:
+                        continue
+                    seen.add((start, end))
+
+                    window_tokens = [t for tokens in self.segment_tokens[start:end + 1] for t in tokens]
+                    if not window_tokens:
+                        continue
+                    score = self._score(quote_tokens, window_tokens)
+                    # Prefer higher scores, then tighter spans
+                    key = (score, -(end - start))
+                    if best is None or key > best[0]:
+                        best = (key, start, end, score)
+
+        if best is None or best[3] < min_score:
+            return None
+        return best[1], best[2], best[3]
+
+
+# --------------------------
+# Per-transcript cache
+# --------------------------
+MAX_CACHED_INDEXES = 16
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def get_match_index(segments: list, cache_key=None) -> TranscriptMatchIndex:
+    """
+    Returns a match index for the segments, reusing a cached one when
+    cache_key (e.g. (filename, revision)) was seen before.
+    """
+    if cache_key is None:
+        return TranscriptMatchIndex(segments)
+
+    with _cache_lock:
+        index = _cache.get(cache_key)
+        if index is not None:
+            _cache.move_to_end(cache_key)
+            return index
+
+    index = TranscriptMatchIndex(segments)
+    with _cache_lock:
+        _cache[cache_key] = index
+        while len(_cache) > MAX_CACHED_INDEXES:
+            _cache.popitem(last=False)
+    return index
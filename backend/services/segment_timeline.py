@@ -0,0 +1,114 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+class SegmentTimeline:
+    """
+    NumPy view of a transcript's segment times, built once per transcript.
+
+    Clip windows for many anchor spans are computed in one batched call with
+    searchsorted instead of growing each window one segment at a time.
+    """
+
+    def __init__(self, segments: list):
+        self.segments = segments
+        self.starts = np.fromiter((float(seg["start"]) for seg in segments), dtype=np.float64, count=len(segments))
+        self.ends = np.fromiter((float(seg["end"]) for seg in segments), dtype=np.float64, count=len(segments))
+        # searchsorted needs monotone keys; running maxima guard against slightly unordered timestamps
+        self._search_starts = np.maximum.accumulate(self.starts) if len(segments) else self.starts
+        self._search_ends = np.maximum.accumulate(self.ends) if len(segments) else self.ends
+
+    def __len__(self):
+        return len(self.segments)
+
+    def expand_windows(self, start_idx, end_idx, min_duration: float = 60.0, max_duration: float = None):
+        """
+        Grows every anchor span [start_idx[i], end_idx[i]] to at least min_duration.
+
+        Like the original loop, preceding segments are added first and following
+        segments only once the transcript start is reached. With max_duration,
+        the window is then trimmed back from the front (never into the anchor).
+
+        Returns:
+            tuple: (start_idx, end_idx, start_time, end_time) NumPy arrays.
+        """
+        s = np.asarray(start_idx, dtype=np.int64)
+        e = np.asarray(end_idx, dtype=np.int64)
+        last = len(self.segments) - 1
+
+        # Latest start that still reaches min_duration: starts[j] <= ends[e] - min
+        j = np.searchsorted(self._search_starts, self.ends[e] - min_duration, side="right") - 1
+        new_s = np.clip(np.minimum(j, s), 0, None)
+
+        # Windows that hit the beginning while still too short grow forward instead
+        short = self.ends[e] - self.starts[new_s] < min_duration
+        if short.any():
+            k = np.searchsorted(self._search_ends, self.starts[new_s] + min_duration, side="left")
+            new_e = np.where(short, np.clip(np.maximum(k, e), None, last), e)
+        else:
+            new_e = e
+
+        if max_duration is not None:
+            too_long = self.ends[new_e] - self.starts[new_s] > max_duration
+            if too_long.any():
+                k = np.searchsorted(self._search_starts, self.ends[new_e] - max_duration, side="left")
+                trimmed_s = np.maximum(new_s, np.minimum(k, s))
+                new_s = np.where(too_long, trimmed_s, new_s)
+
+                still_long = self.ends[new_e] - self.starts[new_s] > max_duration
+                k = np.searchsorted(self._search_ends, self.starts[new_s] + max_duration, side="right") - 1
+                trimmed_e = np.maximum(np.minimum(new_e, k), e)
+                new_e = np.where(still_long, trimmed_e, new_e)
+
+        return new_s, new_e, self.starts[new_s], self.ends[new_e]
+
+    def windows(self, spans: list, min_duration: float = 60.0, max_duration: float = None) -> list:
+        """
+        Batched helper returning highlight dicts ({start, end, matched_segment})
+        for a list of (start_idx, end_idx) anchor spans.
+        """
+        if not spans:
+            return []
+        anchors = np.asarray(spans, dtype=np.int64)
+        new_s, new_e, start_times, end_times = self.expand_windows(
+            anchors[:, 0], anchors[:, 1], min_duration, max_duration
+        )
+        return [
+            {
+                "start": float(start_times[i]),
+                "end": float(end_times[i]),
+                "matched_segment": " ".join(seg["text"] for seg in self.segments[new_s[i]:new_e[i] + 1]),
+            }
+            for i in range(len(anchors))
+        ]
+
+
+# --------------------------
+# Per-transcript cache
+# --------------------------
+MAX_CACHED_TIMELINES = 16
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def get_timeline(segments: list, cache_key=None) -> SegmentTimeline:
+    """
+    Returns a timeline for the segments, reusing a cached one when
+    cache_key (e.g. (filename, revision)) was seen before.
+    """
+    if cache_key is None:
+        return SegmentTimeline(segments)
+
+    with _cache_lock:
+        timeline = _cache.get(cache_key)
+        if timeline is not None:
+            _cache.move_to_end(cache_key)
+            return timeline
+
+    timeline = SegmentTimeline(segments)
+    with _cache_lock:
+        _cache[cache_key] = timeline
+        while len(_cache) > MAX_CACHED_TIMELINES:
+            _cache.popitem(last=False)
+    return timeline
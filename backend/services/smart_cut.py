@@ -0,0 +1,256 @@
+"""
+Smart-cut rendering: stream-copy the GOPs that lie fully inside the clip and
+re-encode only the partial GOPs at its head and tail.
+
+The copied interior and the re-encoded edges are written as MPEG-TS pieces
+(Annex B, parameter sets in-band before every keyframe), joined with the
+concat demuxer and muxed with the clip's audio, which is always re-encoded
+(AAC priming makes audio stream-copy cuts click). The edges are encoded with
+the source's profile and level, but their SPS/PPS still differ from the
+copied interior's, so the MP4 uses the avc3 sample entry: parameter sets stay
+in-band at each piece's first keyframe and decoders must use those rather than
+a single avcC. Every smart-cut output is decoded once before it is accepted.
+Anything that can't be copied or fails that check falls back to a full re-encode.
+
+Times passed in (start, end) are relative to the container start, as ffmpeg's
+input -ss counts them; keyframe pts are shifted by the container start_time.
+
+Used by clips_generator here and by the ECS worker, whose image copies this
+file in at build time (see cloud-processing/Dockerfile).
+"""
+import os
+import json
+import shutil
+import tempfile
+import subprocess
+
+# Codecs whose edges we can re-encode with a matching encoder
+COPYABLE_VIDEO = {"h264": "libx264"}
+COPYABLE_PIX_FMTS = {"yuv420p", "yuvj420p"}
+X264_PROFILES = {"baseline": "baseline", "constrained baseline": "baseline", "main": "main", "high": "high"}
+
+# Edges shorter than this are dropped instead of re-encoded (less than a frame)
+MIN_EDGE_SECONDS = 0.04
+
+# How far outside the clip to read packets when looking for keyframes
+KEYFRAME_SCAN_MARGIN = 15.0
+
+# Pieces meet this far off a keyframe's pts (well under a frame), so rounded
+# keyframe times can't put the keyframe in both pieces or in neither
+BOUNDARY_EPSILON = 0.001
+
+FULL_ENCODE_ARGS = ["-c:v", "libx264", "-c:a", "aac", "-strict", "experimental"]
+
+
+def _run(cmd):
+    return subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+def probe_streams(source, input_options=()):
+    """Returns (video stream, audio stream or None) as ffprobe dicts."""
+    result = _run([
+        "ffprobe", "-v", "error", *input_options,
+        "-show_entries", "stream=index,codec_type,codec_name,pix_fmt,profile,level,width,height",
+        "-of", "json", source
+    ])
+    streams = json.loads(result.stdout).get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"), None)
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+    return video, audio
+
+
+def probe_start_time(source, input_options=()):
+    """Container start time in seconds (what ffmpeg's input -ss is relative to), 0 if unknown."""
+    result = _run([
+        "ffprobe", "-v", "error", *input_options,
+        "-show_entries", "format=start_time", "-of", "csv=p=0", source
+    ])
+    try:
+        return float(result.stdout.decode().strip())
+    except ValueError:
+        return 0.0
+
+
+def probe_keyframes(source, start=None, end=None, input_options=(), start_time=0.0):
+    """
+    Keyframe times of the first video stream, read from packet flags, relative
+    to start_time (so they line up with -ss). start/end are relative too.
+    """
+    cmd = ["ffprobe", "-v", "error", *input_options, "-select_streams", "v:0"]
+    if start is not None and end is not None:
+        # -read_intervals takes absolute timestamps
+        scan_from = max(0.0, start - KEYFRAME_SCAN_MARGIN) + start_time
+        cmd += ["-read_intervals", f"{scan_from}%{end + KEYFRAME_SCAN_MARGIN + start_time}"]
+    cmd += ["-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", source]
+
+    keyframes = []
+    for line in _run(cmd).stdout.decode().splitlines():
+        parts = line.strip().split(",")
+        if len(parts) >= 2 and "K" in parts[1] and parts[0] not in ("", "N/A"):
+            keyframes.append(round(float(parts[0]) - start_time, 6))
+    return sorted(set(keyframes))
+
+
+def count_frames(source, start, end, input_options=(), start_time=0.0):
+    """Number of video packets whose pts lies in [start, end) (relative times)."""
+    cmd = [
+        "ffprobe", "-v", "error", *input_options, "-select_streams", "v:0",
+        "-read_intervals", f"{start + start_time}%{end + start_time + KEYFRAME_SCAN_MARGIN}",
+        "-show_entries", "packet=pts_time", "-of", "csv=p=0", source
+    ]
+    count = 0
+    for line in _run(cmd).stdout.decode().splitlines():
+        value = line.strip().rstrip(",")
+        if value and value != "N/A" and start - BOUNDARY_EPSILON <= float(value) - start_time < end - BOUNDARY_EPSILON:
+            count += 1
+    return count
+
+
+def plan_cut(keyframes, start, end):
+    """
+    Returns (k1, k2): the first keyframe at/after start and the last one at/before
+    end, or None if no whole GOP lies inside [start, end].
+    """
+    inside = [k for k in keyframes if start - 1e-3 <= k <= end + 1e-3]
+    if len(inside) < 2:
+        return None
+    return inside[0], inside[-1]
+
+
+def copy_reason(video):
+    """Returns why the video can't be smart-cut, or None if it can."""
+    if video is None:
+        return "no video stream"
+    if video.get("codec_name") not in COPYABLE_VIDEO:
+        return f"codec {video.get('codec_name')}"
+    if video.get("pix_fmt") not in COPYABLE_PIX_FMTS:
+        return f"pixel format {video.get('pix_fmt')}"
+    if str(video.get("profile", "")).lower() not in X264_PROFILES:
+        return f"profile {video.get('profile')}"
+    return None
+
+
+def full_reencode(source, start, end, output_path, input_options=(), threads=None, encode_args=None):
+    cmd = [
+        "ffmpeg", "-y", "-ss", str(start), "-t", str(end - start),
+        *input_options, "-i", source,
+        *(encode_args or FULL_ENCODE_ARGS),
+    ]
+    if threads:
+        cmd += ["-threads", str(threads)]
+    _run(cmd + [output_path])
+
+
+def _encode_edge(source, start, end, path, video, input_options, threads, frames=None):
+    cmd = [
+        "ffmpeg", "-y", "-ss", str(start), "-t", str(end - start),
+        *input_options, "-i", source,
+        "-map", "0:v:0", "-an",
+        "-c:v", COPYABLE_VIDEO[video["codec_name"]],
+        "-pix_fmt", video["pix_fmt"],
+        "-profile:v", X264_PROFILES[str(video["profile"]).lower()],
+        "-crf", "18", "-preset", "veryfast",
+    ]
+    if isinstance(video.get("level"), int) and video["level"] > 0:
+        # ffprobe reports H.264 level_idc, e.g. 41 for level 4.1
+        cmd += ["-level:v", f"{video['level'] / 10:g}"]
+    if frames:
+        # -t alone can repeat the last frame to fill the duration at a junction
+        cmd += ["-frames:v", str(frames)]
+    if threads:
+        cmd += ["-threads", str(threads)]
+    _run(cmd + ["-f", "mpegts", path])
+
+
+def _copy_interior(source, start, frames, path, input_options):
+    # Stream copy stops by dts with -t, which keeps the next GOP's first packets;
+    # counting packets (decode order) from the keyframe ends exactly before it
+    _run([
+        "ffmpeg", "-y", "-ss", str(start + BOUNDARY_EPSILON),
+        *input_options, "-i", source,
+        "-map", "0:v:0", "-an", "-c:v", "copy", "-frames:v", str(frames),
+        "-avoid_negative_ts", "make_zero",
+        "-f", "mpegts", path
+    ])
+
+
+def verify_decodable(path):
+    """Decodes the video of path once; raises CalledProcessError on any decode error."""
+    result = _run(["ffmpeg", "-v", "error", "-xerror", "-i", path, "-map", "0:v:0", "-f", "null", "-"])
+    if result.stderr.strip():
+        raise subprocess.CalledProcessError(1, result.args, result.stdout, result.stderr)
+
+
+def smart_cut(source, start, end, output_path, input_options=(), threads=None, keyframes=None, streams=None,
+              start_time=None):
+    """
+    Cuts [start, end) from source into output_path (MP4).
+
+    Args:
+        input_options: ffmpeg/ffprobe options placed before the input (e.g. HTTP reconnects).
+        keyframes: known keyframe pts (absolute, as in the media index), to skip the ffprobe scan.
+        streams: known (video, audio) probe result.
+        start_time: known container start time; probed when None.
+
+    Returns:
+        dict: {"mode": "smart" | "full", "copied": seconds, "reencoded": seconds, "reason": str}
+    """
+    input_options = list(input_options)
+    duration = end - start
+    try:
+        video, _ = streams or probe_streams(source, input_options)
+        reason = copy_reason(video)
+        cut = None
+        if reason is None:
+            if start_time is None:
+                start_time = probe_start_time(source, input_options)
+            if keyframes is None:
+                keyframes = probe_keyframes(source, start, end, input_options, start_time)
+            else:
+                keyframes = [k - start_time for k in keyframes]
+            cut = plan_cut(keyframes, start, end)
+            reason = None if cut else "no whole GOP inside the clip"
+    except (subprocess.CalledProcessError, ValueError, KeyError) as e:
+        reason = f"probe failed: {e}"
+
+    if reason is None:
+        k1, k2 = cut
+        workdir = tempfile.mkdtemp(prefix="smartcut_")
+        try:
+            pieces = []
+            if k1 - start >= MIN_EDGE_SECONDS:
+                pieces.append(os.path.join(workdir, "head.ts"))
+                frames = count_frames(source, start, k1, input_options, start_time)
+                _encode_edge(source, start, k1 - BOUNDARY_EPSILON, pieces[-1], video, input_options, threads, frames)
+            pieces.append(os.path.join(workdir, "interior.ts"))
+            frames = count_frames(source, k1, k2, input_options, start_time)
+            _copy_interior(source, k1, frames, pieces[-1], input_options)
+            if end - k2 >= MIN_EDGE_SECONDS:
+                pieces.append(os.path.join(workdir, "tail.ts"))
+                _encode_edge(source, k2 - BOUNDARY_EPSILON, end, pieces[-1], video, input_options, threads)
+
+            concat_list = os.path.join(workdir, "pieces.txt")
+            with open(concat_list, "w") as f:
+                f.writelines(f"file '{piece}'\n" for piece in pieces)
+
+            # Joined video + the clip's audio re-encoded in one pass. avc3 keeps each
+            # piece's in-band SPS/PPS authoritative instead of the first piece's avcC.
+            _run([
+                "ffmpeg", "-y",
+                "-f", "concat", "-safe", "0", "-i", concat_list,
+                "-ss", str(start), "-t", str(duration), *input_options, "-i", source,
+                "-map", "0:v:0", "-map", "1:a:0?",
+                "-c:v", "copy", "-tag:v", "avc3", "-c:a", "aac",
+                "-t", str(duration), "-movflags", "+faststart",
+                output_path
+            ])
+            verify_decodable(output_path)
+            return {"mode": "smart", "copied": k2 - k1, "reencoded": duration - (k2 - k1), "reason": None}
+        except subprocess.CalledProcessError as e:
+            reason = f"smart cut failed: {e.stderr.decode(errors='replace')[-300:] if e.stderr else e}"
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"↩️ Full re-encode for {start:.2f}-{end:.2f}s ({reason})")
+    full_reencode(source, start, end, output_path, input_options, threads)
+    return {"mode": "full", "copied": 0.0, "reencoded": duration, "reason": reason}
@@ -0,0 +1,46 @@
+import os
+import boto3
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# AWS S3 Configuration
+AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
+AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
+AWS_REGION = os.getenv("AWS_REGION")
+AWS_S3_BUCKET = os.getenv("AWS_S3_BUCKET")
+
+# Shared S3 client for the API process and the background job workers
+s3_client = boto3.client(
+    "s3",
+    aws_access_key_id=AWS_ACCESS_KEY_ID,
+    aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+    region_name=AWS_REGION,
+)
+
+S3_URL_PREFIX = f"https://{AWS_S3_BUCKET}.s3.{AWS_REGION}.amazonaws.com/"
+
+# S3 multipart limits: parts are >= 5 MiB (except the last) and at most 10,000 per upload.
+# Content hashes are computed per UPLOAD_PART_SIZE part (services/artifact_store.py).
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+UPLOAD_PART_SIZE = max(int(os.getenv("UPLOAD_PART_SIZE", str(16 * 1024 * 1024))), MIN_PART_SIZE)
+
+
+def s3_url_for_key(key: str) -> str:
+    """Returns the public S3 URL for an object key in the app bucket."""
+    return f"{S3_URL_PREFIX}{key}"
+
+
+def s3_key_from_url(s3_url: str) -> str:
+    """Extracts the object key from a public S3 URL in the app bucket."""
+    return s3_url.split(S3_URL_PREFIX)[-1]
+
+
+def presigned_get_url(key: str, expires_in: int = 3600) -> str:
+    """Returns a time-limited GET URL that ffmpeg/HTTP clients can read directly."""
+    return s3_client.generate_presigned_url(
+        "get_object",
+        Params={"Bucket": AWS_S3_BUCKET, "Key": key},
+        ExpiresIn=expires_in,
+    )
@@ -0,0 +1,216 @@
+import json
+from sqlalchemy import insert, delete
+from sqlalchemy.orm import Session
+from services.database import Transcription, TranscriptSegment
+
+
+def _segment_rows(filename: str, segments: list) -> list:
+    rows = []
+    for idx, seg in enumerate(segments):
+        rows.append({
+            "filename": filename,
+            "idx": idx,
+            "start": float(seg.get("start", 0)),
+            "end": float(seg.get("end", 0)),
+            "text": seg.get("text", ""),
+        })
+    return rows
+
+
+def store_segments(db: Session, filename: str, transcript: dict):
+    """
+    Replaces the stored segments of a transcript with one bulk INSERT.
+    Does not commit, so it runs in the caller's transaction.
+    """
+    rows = _segment_rows(filename, transcript.get("segments", []))
+
+    db.execute(delete(TranscriptSegment).where(TranscriptSegment.filename == filename))
+    if rows:
+        db.execute(insert(TranscriptSegment), rows)
+
+    record = db.query(Transcription).filter(Transcription.filename == filename).first()
+    if record:
+        record.max_segment_duration = max((row["end"] - row["start"] for row in rows), default=0.0)
+        record.revision = (record.revision or 0) + 1
+    print(f"🧾 Stored {len(rows)} transcript segments for {filename}")
+
+
+def delete_segments(db: Session, filename: str):
+    db.execute(delete(TranscriptSegment).where(TranscriptSegment.filename == filename))
+
+
+def ensure_segments(db: Session, filename: str) -> Transcription:
+    """
+    Returns the transcript record, backfilling the segment table from the
+    JSON column for transcripts stored before segments were normalized.
+    Returns None if the video has no transcript.
+    """
+    record = db.query(Transcription).filter(Transcription.filename == filename).first()
+    if not record:
+        return None
+
+    if record.max_segment_duration is None:
+        try:
+            transcript = json.loads(record.transcript or "{}")
+        except json.JSONDecodeError:
+            transcript = {}
+        store_segments(db, filename, transcript if isinstance(transcript, dict) else {})
+        db.commit()
+    return record
+
+
+def _to_dicts(rows) -> list:
+    return [{"id": r.idx, "start": r.start, "end": r.end, "text": r.text} for r in rows]
+
+
+def all_segments(db: Session, filename: str) -> list:
+    """Returns every segment of a transcript in order, as API-style dicts."""
+    rows = db.query(
+        TranscriptSegment.idx, TranscriptSegment.start, TranscriptSegment.end, TranscriptSegment.text
+    ).filter(
+        TranscriptSegment.filename == filename
+    ).order_by(TranscriptSegment.idx).all()
+    return _to_dicts(rows)
+
+
+def segments_in_range(db: Session, filename: str, start: float, end: float, record: Transcription = None) -> list:
+    """
+    Returns the segments overlapping [start, end] using the (filename, start) index.
+
+    A segment overlaps when seg.start <= end and seg.end >= start. Since no segment
+    is longer than max_segment_duration, seg.start >= start - max_segment_duration
+    also holds, which turns the lookup into a bounded index range scan.
+    """
+    record = record or ensure_segments(db, filename)
+    if not record:
+        return []
+    max_duration = record.max_segment_duration or 0.0
+
+    rows = db.query(
+        TranscriptSegment.idx, TranscriptSegment.start, TranscriptSegment.end, TranscriptSegment.text
+    ).filter(
+        TranscriptSegment.filename == filename,
+        TranscriptSegment.start >= start - max_duration,
+        TranscriptSegment.start <= end,
+        TranscriptSegment.end >= start
+    ).order_by(TranscriptSegment.start).all()
+    return _to_dicts(rows)
+
+
+def page_segments(db: Session, record: Transcription, start: float = None, end: float = None,
+                  cursor: int = None, limit: int = 500):
+    """
+    Returns one page of segments, optionally restricted to those overlapping
+    [start, end], as (segments, next_cursor). The cursor is the idx to resume
+    from; next_cursor is None on the last page.
+    """
+    filename = record.filename
+    max_duration = record.max_segment_duration or 0.0
+
+    query = db.query(
+        TranscriptSegment.idx, TranscriptSegment.start, TranscriptSegment.end, TranscriptSegment.text
+    ).filter(TranscriptSegment.filename == filename)
+
+    if start is not None:
+        query = query.filter(
+            TranscriptSegment.start >= start - max_duration,
+            TranscriptSegment.end >= start
+        )
+    if end is not None:
+        query = query.filter(TranscriptSegment.start <= end)
+    if cursor is not None:
+        query = query.filter(TranscriptSegment.idx >= cursor)
+
+    rows = query.order_by(TranscriptSegment.idx).limit(limit + 1).all()
+    next_cursor = rows[limit].idx if len(rows) > limit else None
+    return _to_dicts(rows[:limit]), next_cursor
+
+
+class SegmentEditError(ValueError):
+    pass
+
+
+def apply_segment_edits(db: Session, filename: str, edits: list, expected_revision: int = None) -> Transcription:
+    """
+    Applies a batch of segment edits in one transaction, touching only the edited rows.
+
+    Args:
+        edits (list): dicts with "id" (segment idx) and any of "text", "start", "end".
+        expected_revision (int): if given, the edit is rejected when the transcript
+            changed since the client read it.
+
+    Raises:
+        LookupError: transcript or a segment id does not exist.
+        SegmentEditError: stale revision or invalid timing.
+    """
+    record = db.query(Transcription).filter(
+        Transcription.filename == filename
+    ).with_for_update().first()
+    if not record:
+        raise LookupError("Transcript not found")
+    if expected_revision is not None and record.revision != expected_revision:
+        raise SegmentEditError(
+            f"Transcript changed (revision {record.revision}, expected {expected_revision})"
+        )
+
+    ids = {edit["id"] for edit in edits}
+    rows = db.query(TranscriptSegment).filter(
+        TranscriptSegment.filename == filename,
+        TranscriptSegment.idx.in_(ids)
+    ).all()
+    by_idx = {row.idx: row for row in rows}
+    missing = ids - by_idx.keys()
+    if missing:
+        raise LookupError(f"Segment(s) not found: {sorted(missing)}")
+
+    max_duration = record.max_segment_duration or 0.0
+    for edit in edits:
+        row = by_idx[edit["id"]]
+        if edit.get("text") is not None:
+            row.text = edit["text"]
+        if edit.get("start") is not None:
+            row.start = float(edit["start"])
+        if edit.get("end") is not None:
+            row.end = float(edit["end"])
+        if row.start > row.end:
+            raise SegmentEditError(f"Segment {row.idx}: start must not be after end")
+        max_duration = max(max_duration, row.end - row.start)
+
+    # Only grows, so range lookups stay correct after a retime
+    record.max_segment_duration = max_duration
+    record.revision = (record.revision or 0) + 1
+    _sync_transcript_json(record, by_idx.values())
+    return record
+
+
+def _sync_transcript_json(record: Transcription, rows):
+    """Copies edited segment rows into the Transcription.transcript JSON, in the same transaction."""
+    try:
+        transcript = json.loads(record.transcript or "{}")
+    except json.JSONDecodeError:
+        return
+    segments = transcript.get("segments") if isinstance(transcript, dict) else None
+    if not isinstance(segments, list):
+        return
+
+    for row in rows:
+        if row.idx < len(segments) and isinstance(segments[row.idx], dict):
+            segments[row.idx].update(text=row.text, start=row.start, end=row.end)
+    transcript["text"] = " ".join(seg.get("text", "").strip() for seg in segments if isinstance(seg, dict))
+    record.transcript = json.dumps(transcript)
+
+
+def transcript_text(db: Session, filename: str, max_chars: int = None) -> str:
+    """Joins segment text in order, reading only as many rows as `max_chars` needs."""
+    query = db.query(TranscriptSegment.text).filter(
+        TranscriptSegment.filename == filename
+    ).order_by(TranscriptSegment.idx)
+
+    parts = []
+    length = 0
+    for (text,) in query.yield_per(500):
+        parts.append(text)
+        length += len(text) + 1
+        if max_chars is not None and length >= max_chars:
+            break
+    return " ".join(parts)
@@ -1,20 +1,42 @@
 import requests
 import os
+import re
+import shutil
+import tempfile
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
 from fastapi import HTTPException
 from dotenv import load_dotenv
 
 # Load API key from .env file
 load_dotenv()
 LEMONFOX_API_KEY = os.getenv("LEMONFOX_API_KEY")
+LEMONFOX_API_URL = os.getenv("LEMONFOX_API_URL", "https://api.lemonfox.ai/v1/audio/transcriptions")
 
-if not LEMONFOX_API_KEY:
-    raise RuntimeError("❌ API key missing. Set LEMONFOX_API_KEY in .env.")
+# "single" sends the whole file in one request, "chunked" splits it first
+TRANSCRIPTION_MODE = os.getenv("TRANSCRIPTION_MODE", "single")
+
+# Chunked mode: cut audio near every N minutes (at a silence when possible)
+# and transcribe the pieces concurrently
+TRANSCRIPTION_CHUNK_MINUTES = float(os.getenv("TRANSCRIPTION_CHUNK_MINUTES", "10"))
+TRANSCRIPTION_WORKERS = int(os.getenv("TRANSCRIPTION_WORKERS", "4"))
+SILENCE_SEARCH_WINDOW = 30.0  # seconds either side of the nominal cut to look for silence
+CHUNK_OVERLAP = 1.5  # seconds of audio shared by neighbouring chunks when no silence is found
+CHUNK_RETRIES = 3
+
+def _require_api_key():
+    # Checked per call so deployments using only the local engine start without a key
+    if not LEMONFOX_API_KEY:
+        raise RuntimeError("❌ API key missing. Set LEMONFOX_API_KEY in .env.")
 
 def transcribe_audio(audio_s3_url: str) -> dict:
     """
     Transcribes an audio file from an S3 URL using the LemonFox API.
     """
-    API_URL = "https://api.lemonfox.ai/v1/audio/transcriptions"
+    _require_api_key()
+    API_URL = LEMONFOX_API_URL
     headers = {"Authorization": f"Bearer {LEMONFOX_API_KEY}"}
 
     # ✅ Download audio from S3 (streaming)
@@ -40,6 +62,230 @@ def transcribe_audio(audio_s3_url: str) -> dict:
     return response.json()
 
 
+def _multipart_body(fields: dict, filename: str, content_type: str, stream, boundary: str):
+    """Yields a multipart/form-data body whose file part is read lazily from `stream`."""
+    for name, value in fields.items():
+        yield (
+            f"--{boundary}\r\n"
+            f"Content-Disposition: form-data; name=\"{name}\"\r\n\r\n"
+            f"{value}\r\n"
+        ).encode()
+    yield (
+        f"--{boundary}\r\n"
+        f"Content-Disposition: form-data; name=\"file\"; filename=\"{filename}\"\r\n"
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode()
+    while True:
+        chunk = stream.read(64 * 1024)
+        if not chunk:
+            break
+        yield chunk
+    yield f"\r\n--{boundary}--\r\n".encode()
+
+
+def transcribe_audio_stream(audio_stream, filename: str = "audio.mp3", content_type: str = "audio/mpeg") -> dict:
+    """
+    Transcribes audio read from a file-like stream (e.g. FFmpeg's stdout),
+    uploading it to LemonFox with chunked transfer encoding as it is produced.
+    """
+    _require_api_key()
+    boundary = uuid4().hex
+    headers = {
+        "Authorization": f"Bearer {LEMONFOX_API_KEY}",
+        "Content-Type": f"multipart/form-data; boundary={boundary}"
+    }
+    data = {
+        "language": "english",
+        "response_format": "verbose_json"
+    }
+
+    body = _multipart_body(data, filename, content_type, audio_stream, boundary)
+    response = requests.post(LEMONFOX_API_URL, headers=headers, data=body)
+
+    if response.status_code != 200:
+        raise HTTPException(status_code=500, detail=f"❌ Transcription failed: {response.text}")
+    return response.json()
+
+
+# --------------------------
+# Chunked transcription
+# --------------------------
+def _transcribe_file(audio_path: str) -> dict:
+    headers = {"Authorization": f"Bearer {LEMONFOX_API_KEY}"}
+    data = {
+        "language": "english",
+        "response_format": "verbose_json"
+    }
+    with open(audio_path, "rb") as audio_file:
+        response = requests.post(LEMONFOX_API_URL, headers=headers, files={"file": audio_file}, data=data)
+
+    if response.status_code != 200:
+        raise HTTPException(status_code=500, detail=f"❌ Transcription failed: {response.text}")
+    return response.json()
+
+
+def _transcribe_chunk(audio_path: str) -> dict:
+    # A failed chunk is retried on its own instead of losing the whole episode
+    for attempt in range(1, CHUNK_RETRIES + 1):
+        try:
+            return _transcribe_file(audio_path)
+        except (HTTPException, requests.RequestException) as e:
+            if attempt == CHUNK_RETRIES:
+                raise
+            print(f"⚠️ Chunk {os.path.basename(audio_path)} failed (attempt {attempt}): {e}")
+            time.sleep(2 ** attempt)
+
+
+def _probe_duration(audio_path: str) -> float:
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", audio_path],
+        check=True, capture_output=True, text=True
+    )
+    return float(result.stdout.strip())
+
+
+def detect_silences(audio_path: str, noise_db: int = -30, min_silence: float = 0.4) -> list:
+    """Returns the midpoints (seconds) of every silence ffmpeg's silencedetect finds."""
+    result = subprocess.run(
+        [
+            "ffmpeg", "-hide_banner", "-nostats", "-i", audio_path,
+            "-af", f"silencedetect=noise={noise_db}dB:d={min_silence}",
+            "-f", "null", "-"
+        ],
+        capture_output=True, text=True
+    )
+    starts = [float(x) for x in re.findall(r"silence_start: (-?[\d.]+)", result.stderr)]
+    ends = [float(x) for x in re.findall(r"silence_end: ([\d.]+)", result.stderr)]
+    return [(max(start, 0.0) + end) / 2 for start, end in zip(starts, ends)]
+
+
+def plan_chunks(duration: float, silences: list, chunk_seconds: float) -> list:
+    """
+    Splits [0, duration] into roughly chunk_seconds pieces.
+
+    Returns:
+        list: (cut_start, cut_end, pad_before, pad_after) tuples. Cuts land on the
+        silence closest to each nominal boundary and are not padded; where none is
+        close enough the cut is made at the boundary and the audio on both sides of
+        that cut only is padded by CHUNK_OVERLAP seconds.
+    """
+    cuts = [(0.0, 0.0)]
+    target = chunk_seconds
+    while target < duration - chunk_seconds / 4:
+        nearby = [t for t in silences if abs(t - target) <= SILENCE_SEARCH_WINDOW and t > cuts[-1][0]]
+        if nearby:
+            cuts.append((min(nearby, key=lambda t: abs(t - target)), 0.0))
+        else:
+            cuts.append((target, CHUNK_OVERLAP))
+        target = cuts[-1][0] + chunk_seconds
+    cuts.append((duration, 0.0))
+
+    return [
+        (cuts[i][0], cuts[i + 1][0], cuts[i][1], cuts[i + 1][1])
+        for i in range(len(cuts) - 1)
+    ]
+
+
+def stitch_transcripts(chunks: list) -> dict:
+    """
+    Merges per-chunk verbose_json transcripts into one transcript.
+
+    Args:
+        chunks (list): (cut_start, cut_end, audio_offset, transcript) tuples in order.
+            audio_offset is where the chunk's audio actually starts (cut_start minus
+            any padding); segment times are shifted by it.
+
+    Each chunk keeps the segments that start inside its own [cut_start, cut_end).
+    Speech straddling a padded cut is kept whole from the earlier chunk, which
+    heard its end in the padding; the later chunk's copy starts before the cut
+    and is dropped.
+    """
+    segments = []
+    language = None
+    for cut_start, cut_end, audio_offset, transcript in chunks:
+        language = language or transcript.get("language")
+
+        for seg in transcript.get("segments", []):
+            start = float(seg.get("start", 0)) + audio_offset
+            end = float(seg.get("end", 0)) + audio_offset
+            if start < cut_start or start >= cut_end:
+                continue
+
+            stitched = dict(seg)
+            stitched["start"] = round(start, 3)
+            stitched["end"] = round(end, 3)
+            if "words" in seg:
+                stitched["words"] = [
+                    {**w, "start": round(float(w["start"]) + audio_offset, 3), "end": round(float(w["end"]) + audio_offset, 3)}
+                    for w in seg["words"]
+                ]
+            segments.append(stitched)
+
+    for idx, seg in enumerate(segments):
+        seg["id"] = idx
+
+    return {
+        "text": " ".join(seg.get("text", "").strip() for seg in segments),
+        "language": language,
+        "duration": chunks[-1][1] if chunks else 0.0,
+        "segments": segments
+    }
+
+
+def transcribe_audio_chunked(
+    audio_s3_url: str,
+    chunk_minutes: float = TRANSCRIPTION_CHUNK_MINUTES,
+    max_workers: int = TRANSCRIPTION_WORKERS
+) -> dict:
+    """
+    Transcribes long audio in parallel chunks cut at silences, then stitches
+    the results back together with corrected timestamps.
+    """
+    _require_api_key()
+    workdir = tempfile.mkdtemp(prefix="transcribe_")
+    try:
+        # ✅ Download audio from S3 (streaming)
+        audio_path = os.path.join(workdir, "audio.mp3")
+        try:
+            with requests.get(audio_s3_url, stream=True) as response:
+                response.raise_for_status()
+                with open(audio_path, "wb") as audio_file:
+                    for chunk in response.iter_content(chunk_size=1024 * 1024):
+                        audio_file.write(chunk)
+        except requests.RequestException as e:
+            raise HTTPException(status_code=500, detail=f"❌ Failed to download audio from S3: {e}")
+
+        duration = _probe_duration(audio_path)
+        plan = plan_chunks(duration, detect_silences(audio_path), chunk_minutes * 60)
+        print(f"✂️ Transcribing {duration:.0f}s of audio in {len(plan)} chunk(s)")
+
+        if len(plan) == 1:
+            return _transcribe_file(audio_path)
+
+        chunk_files = []
+        for i, (cut_start, cut_end, pad_before, pad_after) in enumerate(plan):
+            audio_offset = max(cut_start - pad_before, 0.0)
+            chunk_path = os.path.join(workdir, f"chunk_{i:04d}.mp3")
+            subprocess.run(
+                [
+                    "ffmpeg", "-y", "-v", "error",
+                    "-ss", str(audio_offset), "-t", str(min(cut_end + pad_after, duration) - audio_offset),
+                    "-i", audio_path, "-c", "copy", chunk_path
+                ],
+                check=True
+            )
+            chunk_files.append((cut_start, cut_end, audio_offset, chunk_path))
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            transcripts = list(pool.map(_transcribe_chunk, [path for *_, path in chunk_files]))
+
+        return stitch_transcripts([
+            (cut_start, cut_end, audio_offset, transcript)
+            for (cut_start, cut_end, audio_offset, _), transcript in zip(chunk_files, transcripts)
+        ])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
 # import os
 # import requests
 # from dotenv import load_dotenv
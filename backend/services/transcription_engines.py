@@ -0,0 +1,271 @@
+import os
+import threading
+import tempfile
+from dotenv import load_dotenv
+from services.transcription import (
+    transcribe_audio, transcribe_audio_chunked, transcribe_audio_stream, TRANSCRIPTION_MODE
+)
+from services.video_processing import open_audio_stream
+
+load_dotenv()
+
+# "lemonfox" (remote API) or "whisper" (local CPU inference)
+TRANSCRIPTION_ENGINE = os.getenv("TRANSCRIPTION_ENGINE", "lemonfox")
+
+# Local Whisper settings
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "base")
+WHISPER_THREADS = int(os.getenv("WHISPER_THREADS", str(os.cpu_count() or 1)))
+WHISPER_BATCH_SIZE = int(os.getenv("WHISPER_BATCH_SIZE", "8"))
+WHISPER_QUANTIZE = os.getenv("WHISPER_QUANTIZE", "int8")  # "int8" or "none"
+WHISPER_LANGUAGE = os.getenv("WHISPER_LANGUAGE", "en")
+# Seconds shared by neighbouring 30s windows, so speech cut off at a window's end
+# is transcribed whole by the next one
+WHISPER_WINDOW_OVERLAP = float(os.getenv("WHISPER_WINDOW_OVERLAP", "5"))
+
+
+class TranscriptionEngine:
+    """
+    Turns an audio source (URL or local path) into a verbose_json-style dict:
+    {"text", "language", "duration", "segments": [{"id", "start", "end", "text"}]}.
+    """
+    name = "base"
+
+    def transcribe(self, audio_source: str) -> dict:
+        raise NotImplementedError
+
+    def transcribe_video_stream(self, video_url: str) -> dict:
+        """Transcribes the audio track of a video URL without an intermediate audio file."""
+        raise NotImplementedError
+
+
+class LemonFoxEngine(TranscriptionEngine):
+    """Remote LemonFox API, whole-file or chunked depending on TRANSCRIPTION_MODE."""
+    name = "lemonfox"
+
+    def transcribe(self, audio_source: str) -> dict:
+        if TRANSCRIPTION_MODE == "chunked":
+            return transcribe_audio_chunked(audio_source)
+        return transcribe_audio(audio_source)
+
+    def transcribe_video_stream(self, video_url: str) -> dict:
+        # FFmpeg's stdout is piped into the upload body as it is encoded
+        with tempfile.TemporaryFile() as stderr_file:
+            proc = open_audio_stream(video_url, stderr_file)
+            try:
+                transcript = transcribe_audio_stream(proc.stdout)
+            except Exception:
+                proc.kill()
+                raise
+            finally:
+                proc.stdout.close()
+                proc.wait()
+            if proc.returncode != 0:
+                stderr_file.seek(0)
+                stderr = stderr_file.read().decode(errors="replace")[-1000:]
+                raise RuntimeError(f"❌ FFmpeg audio stream failed (exit code {proc.returncode}): {stderr}")
+        return transcript
+
+
+class LocalWhisperEngine(TranscriptionEngine):
+    """
+    openai-whisper on CPU. The model is loaded once per process, optionally
+    int8 dynamically quantized, and audio is decoded in batches of overlapping
+    30 second windows whose segments are merged by timestamp.
+    """
+    name = "whisper"
+
+    _model = None
+    _tokenizer = None
+    _load_lock = threading.Lock()
+    # Decoding installs KV-cache hooks on the shared model, so one batch runs at a time
+    _inference_lock = threading.Lock()
+
+    def __init__(self, model_name=WHISPER_MODEL, threads=WHISPER_THREADS,
+                 batch_size=WHISPER_BATCH_SIZE, quantize=WHISPER_QUANTIZE, language=WHISPER_LANGUAGE,
+                 overlap=WHISPER_WINDOW_OVERLAP):
+        self.model_name = model_name
+        self.threads = threads
+        self.batch_size = batch_size
+        self.quantize = quantize
+        self.language = language
+        self.overlap = overlap
+
+    def _load(self):
+        cls = LocalWhisperEngine
+        if cls._model is not None:
+            return cls._model, cls._tokenizer
+
+        with cls._load_lock:
+            if cls._model is None:
+                import torch
+                import whisper
+                from whisper.tokenizer import get_tokenizer
+
+                torch.set_num_threads(self.threads)
+                print(f"🧠 Loading Whisper '{self.model_name}' on CPU ({self.threads} threads)...")
+                model = whisper.load_model(self.model_name, device="cpu")
+
+                if self.quantize == "int8":
+                    # whisper.model.Linear subclasses nn.Linear only to cast its weights to
+                    # the input dtype (fp16 on GPU), which is a no-op on CPU fp32. Listing it
+                    # in quantize_dynamic's spec set isn't enough: the swap to the int8
+                    # kernel (quantized.dynamic.Linear.from_float) requires type(mod) to be
+                    # exactly nn.Linear. The subclass adds no state, so its instances are
+                    # retyped to nn.Linear first; any other Linear subclass is left alone.
+                    for module in model.modules():
+                        if type(module) is whisper.model.Linear:
+                            module.__class__ = torch.nn.Linear
+                    model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+                    print("✅ Applied int8 dynamic quantization")
+
+                model.eval()
+                cls._tokenizer = get_tokenizer(
+                    model.is_multilingual,
+                    num_languages=model.num_languages,
+                    language=self.language,
+                    task="transcribe"
+                )
+                cls._model = model
+
+        return cls._model, cls._tokenizer
+
+    @staticmethod
+    def _tokens_to_segments(tokens, tokenizer, offset: float, window_end: float) -> list:
+        """
+        Splits a decoded window at its timestamp tokens into timed segments.
+        Trailing text with no closing timestamp (speech cut off by the window's
+        end) becomes a last segment ending at window_end, marked "partial".
+        """
+        segments = []
+        start = None
+        last_end = offset
+        text_tokens = []
+
+        for token in tokens:
+            if token >= tokenizer.timestamp_begin:
+                t = offset + (token - tokenizer.timestamp_begin) * 0.02
+                if start is None or not text_tokens:
+                    start = t
+                else:
+                    segments.append({"start": start, "end": t, "text": tokenizer.decode(text_tokens)})
+                    last_end = t
+                    start = None
+                    text_tokens = []
+            elif token < tokenizer.eot:
+                if start is None:
+                    start = last_end
+                text_tokens.append(token)
+
+        if text_tokens:
+            segments.append({"start": start, "end": window_end, "text": tokenizer.decode(text_tokens), "partial": True})
+        return segments
+
+    @staticmethod
+    def _merge_windows(windows: list, overlap: float) -> list:
+        """
+        Merges the segments of overlapping windows by timestamp.
+
+        Args:
+            windows (list): (offset, window_end, segments) per window in order;
+                segments is None for a window skipped as silence.
+
+        A window owns segments starting from where the previous one stopped up to
+        the middle of its overlap with the next window. A segment cut off by the
+        window's end is left to the next window, which hears it whole, as long as
+        it starts inside that window; otherwise it is kept as cut.
+        """
+        merged = []
+        boundary = 0.0
+        for i, (offset, window_end, segments) in enumerate(windows):
+            last = i == len(windows) - 1
+            owned_end = window_end if last else window_end - overlap / 2
+            next_offset = window_end if last else windows[i + 1][0]
+            next_boundary = owned_end
+            for seg in segments or []:
+                if seg["start"] < boundary or seg["start"] >= owned_end:
+                    continue
+                if seg.pop("partial", False) and not last and seg["start"] >= next_offset:
+                    next_boundary = seg["start"]
+                    break
+                merged.append(seg)
+                next_boundary = max(next_boundary, seg["end"])
+            boundary = next_boundary
+        return merged
+
+    def transcribe(self, audio_source: str) -> dict:
+        import torch
+        import whisper
+        from whisper.audio import N_SAMPLES, SAMPLE_RATE
+
+        model, tokenizer = self._load()
+
+        # ffmpeg decodes straight from a URL or path to 16 kHz mono float32
+        audio = whisper.load_audio(audio_source)
+        duration = len(audio) / SAMPLE_RATE
+        stride = N_SAMPLES - int(self.overlap * SAMPLE_RATE)
+        starts = list(range(0, max(len(audio) - N_SAMPLES, 0) + stride, stride))
+        windows = [audio[i:i + N_SAMPLES] for i in starts]
+        print(f"🎙️ Whisper: {duration:.0f}s of audio in {len(windows)} window(s)")
+
+        options = whisper.DecodingOptions(
+            task="transcribe",
+            language=self.language,
+            without_timestamps=False,
+            fp16=False
+        )
+
+        decoded = []
+        for batch_start in range(0, len(windows), self.batch_size):
+            batch = windows[batch_start:batch_start + self.batch_size]
+            mel = torch.stack([
+                whisper.log_mel_spectrogram(whisper.pad_or_trim(window), model.dims.n_mels)
+                for window in batch
+            ])
+
+            with LocalWhisperEngine._inference_lock, torch.inference_mode():
+                results = whisper.decode(model, mel, options)
+
+            for i, result in enumerate(results):
+                offset = starts[batch_start + i] / SAMPLE_RATE
+                window_end = offset + len(batch[i]) / SAMPLE_RATE
+                if result.no_speech_prob > 0.6 and result.avg_logprob < -1.0:
+                    decoded.append((offset, window_end, None))
+                else:
+                    decoded.append((offset, window_end, self._tokens_to_segments(result.tokens, tokenizer, offset, window_end)))
+
+        segments = self._merge_windows(decoded, self.overlap)
+
+        for idx, seg in enumerate(segments):
+            seg["id"] = idx
+            seg["start"] = round(seg["start"], 3)
+            seg["end"] = round(seg["end"], 3)
+
+        return {
+            "text": " ".join(seg["text"].strip() for seg in segments),
+            "language": self.language,
+            "duration": duration,
+            "segments": segments
+        }
+
+    def transcribe_video_stream(self, video_url: str) -> dict:
+        # whisper.load_audio already pipes 16 kHz mono PCM out of FFmpeg,
+        # and FFmpeg can read the video's audio track straight from the URL
+        return self.transcribe(video_url)
+
+
+ENGINES = {
+    LemonFoxEngine.name: LemonFoxEngine,
+    LocalWhisperEngine.name: LocalWhisperEngine,
+}
+
+_engines = {}
+
+
+def get_transcription_engine(name: str = None) -> TranscriptionEngine:
+    """Returns the process-wide engine instance for `name` (default: TRANSCRIPTION_ENGINE)."""
+    name = name or TRANSCRIPTION_ENGINE
+    if name not in ENGINES:
+        raise ValueError(f"Unknown transcription engine: {name}")
+    if name not in _engines:
+        _engines[name] = ENGINES[name]()
+    return _engines[name]
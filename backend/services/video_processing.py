@@ -97,6 +97,30 @@ def extract_audio(video_s3_url: str, video_filename: str) -> str:
     return f"https://{AWS_S3_BUCKET}.s3.{AWS_REGION}.amazonaws.com/{s3_audio_key}"
 
 
+def open_audio_stream(video_url: str, stderr_file) -> subprocess.Popen:
+    """
+    Starts FFmpeg reading the video straight from a URL and writing 16 kHz mono
+    MP3 to stdout, so the audio track never touches disk or S3.
+    The caller reads proc.stdout and must wait() on the process. FFmpeg's
+    stderr goes to stderr_file (e.g. a tempfile) so it can never fill a pipe
+    and stall the encode while only stdout is being read.
+    """
+    command = [
+        FFMPEG_PATH,
+        "-v", "error",
+        "-i", video_url,
+        "-vn",
+        "-ac", "1",
+        "-ar", "16000",
+        "-acodec", "libmp3lame",
+        "-b:a", "48k",
+        "-f", "mp3",
+        "pipe:1"
+    ]
+    print("📢 Streaming audio with FFmpeg from video URL")
+    return subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr_file)
+
+
 # import os
 # import subprocess
 # from fastapi import HTTPException
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# services.database builds its engine at import time; tests bring their own
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
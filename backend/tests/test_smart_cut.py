@@ -0,0 +1,97 @@
+import re
+import json
+import shutil
+import subprocess
+import pytest
+from services.smart_cut import smart_cut, probe_start_time
+
+pytestmark = pytest.mark.skipif(
+    not (shutil.which("ffmpeg") and shutil.which("ffprobe")), reason="needs ffmpeg and ffprobe on PATH"
+)
+
+
+def _ffprobe(path, entries, *options):
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", *options, "-show_entries", entries, "-of", "json", path],
+        check=True, stdout=subprocess.PIPE
+    )
+    return json.loads(result.stdout)
+
+
+def _decoded_frames(path):
+    """Decodes every video frame, failing on any decode error."""
+    result = subprocess.run(
+        ["ffmpeg", "-v", "error", "-xerror", "-i", path, "-map", "0:v:0", "-f", "null", "-"],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    assert result.returncode == 0 and not result.stderr.strip(), result.stderr.decode(errors="replace")
+    info = _ffprobe(path, "stream=nb_read_frames", "-count_frames", "-select_streams", "v:0")
+    return int(info["streams"][0]["nb_read_frames"])
+
+
+def _psnr(path, reference):
+    """Average PSNR (dB) of path's frames against reference's, frame by frame."""
+    result = subprocess.run(
+        ["ffmpeg", "-i", path, "-i", reference, "-lavfi", "[0:v][1:v]psnr", "-f", "null", "-"],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True
+    )
+    match = re.search(r"average:(inf|[\d.]+)", result.stderr.decode(errors="replace"))
+    return float(match.group(1))
+
+
+def _reference(source, start, end, path):
+    """Frame-exact re-encode of the same range, without vsync padding frames."""
+    subprocess.run([
+        "ffmpeg", "-v", "error", "-y", "-ss", str(start), "-t", str(end - start), "-i", source,
+        "-map", "0:v:0", "-an", "-fps_mode", "passthrough", "-c:v", "libx264", "-crf", "18", path
+    ], check=True)
+    return path
+
+
+@pytest.fixture(scope="module")
+def source(tmp_path_factory):
+    """20s 360p H.264 with 1s GOPs whose timestamps start at 5s, plus AAC audio."""
+    path = str(tmp_path_factory.mktemp("smart_cut") / "source.mp4")
+    subprocess.run([
+        "ffmpeg", "-v", "error", "-y",
+        "-f", "lavfi", "-i", "testsrc2=size=640x360:rate=30:duration=20",
+        "-f", "lavfi", "-i", "sine=frequency=440:duration=20",
+        "-c:v", "libx264", "-profile:v", "main", "-pix_fmt", "yuv420p", "-preset", "veryfast",
+        "-g", "30", "-keyint_min", "30", "-sc_threshold", "0",
+        "-c:a", "aac", "-shortest", "-output_ts_offset", "5", path
+    ], check=True)
+    return path
+
+
+def test_smart_cut_output_decodes_end_to_end(source, tmp_path):
+    output = str(tmp_path / "smart.mp4")
+    result = smart_cut(source, 3.3, 11.7, output)
+
+    assert result["mode"] == "smart", result["reason"]
+    assert result["copied"] > 0
+    video = _ffprobe(output, "stream=codec_tag_string", "-select_streams", "v:0")["streams"][0]
+    assert video["codec_tag_string"] == "avc3"
+
+    # Same frames as a re-encode of the range: no repeat at the head/copy junction
+    # and no packets of the next GOP leaking out of the copied interior
+    reference = _reference(source, 3.3, 11.7, str(tmp_path / "reference.mp4"))
+    assert _decoded_frames(output) == _decoded_frames(reference)
+    assert _psnr(output, reference) > 30
+
+
+def test_keyframes_from_index_are_shifted_by_start_time(source, tmp_path):
+    start_time = probe_start_time(source)
+    assert start_time > 4
+
+    # Absolute keyframe pts, as the media index stores them
+    packets = _ffprobe(source, "packet=pts_time,flags", "-select_streams", "v:0")["packets"]
+    keyframes = sorted(float(p["pts_time"]) for p in packets if "K" in p["flags"])
+
+    output = str(tmp_path / "indexed.mp4")
+    result = smart_cut(source, 2.5, 9.5, output, keyframes=keyframes, start_time=start_time)
+
+    assert result["mode"] == "smart", result["reason"]
+    # Unshifted keyframes would copy from the wrong GOP, putting the picture out of step
+    reference = _reference(source, 2.5, 9.5, str(tmp_path / "reference.mp4"))
+    assert _decoded_frames(output) == _decoded_frames(reference)
+    assert _psnr(output, reference) > 30
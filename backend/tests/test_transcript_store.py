@@ -0,0 +1,172 @@
+import json
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from services.database import Base, Transcription
+from services.transcript_store import (
+    store_segments, all_segments, segments_in_range, page_segments, apply_segment_edits, SegmentEditError
+)
+
+FILENAME = "episode.mp4"
+
+# The long second segment sets max_segment_duration to 10s
+SEGMENTS = [
+    {"start": 0.0, "end": 2.0, "text": "Welcome back."},
+    {"start": 2.0, "end": 12.0, "text": "This is one very long answer."},
+    {"start": 12.0, "end": 13.0, "text": "Right."},
+    {"start": 13.5, "end": 15.0, "text": "Next question."},
+    {"start": 15.0, "end": 16.0, "text": "Sure."},
+]
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine, autoflush=False, autocommit=False)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def record(db):
+    transcript = {"text": " ".join(seg["text"] for seg in SEGMENTS), "segments": [dict(seg) for seg in SEGMENTS]}
+    record = Transcription(filename=FILENAME, transcript=json.dumps(transcript), revision=0)
+    db.add(record)
+    db.flush()
+    store_segments(db, FILENAME, transcript)
+    db.commit()
+    return record
+
+
+def _ids(segments):
+    return [seg["id"] for seg in segments]
+
+
+# --------------------------
+# segments_in_range
+# --------------------------
+def test_store_segments_records_the_longest_segment(record):
+    assert record.max_segment_duration == pytest.approx(10.0)
+    assert record.revision == 1
+
+
+def test_range_finds_long_segment_starting_a_full_max_duration_earlier(db, record):
+    # Segment 1 starts at 2.0 = 12.0 - max_segment_duration, the edge of the index scan
+    assert _ids(segments_in_range(db, FILENAME, 12.0, 12.5, record=record)) == [1, 2]
+
+
+def test_range_inside_long_segment_returns_only_it(db, record):
+    assert _ids(segments_in_range(db, FILENAME, 5.0, 6.0, record=record)) == [1]
+
+
+def test_range_excludes_segments_ending_before_start(db, record):
+    assert _ids(segments_in_range(db, FILENAME, 12.5, 14.0, record=record)) == [2, 3]
+
+
+def test_range_finds_segment_lengthened_by_an_edit(db, record):
+    # Segment 0 now runs 0-14s, longer than any stored before; the bound has to grow with it
+    apply_segment_edits(db, FILENAME, [{"id": 0, "end": 14.0}])
+    db.commit()
+    assert record.max_segment_duration == pytest.approx(14.0)
+    assert _ids(segments_in_range(db, FILENAME, 13.8, 13.9, record=record)) == [0, 3]
+
+
+# --------------------------
+# page_segments
+# --------------------------
+def test_pages_follow_the_cursor_to_the_end(db, record):
+    seen = []
+    cursor = None
+    pages = 0
+    while True:
+        page, cursor = page_segments(db, record, cursor=cursor, limit=2)
+        seen += _ids(page)
+        pages += 1
+        if cursor is None:
+            break
+    assert seen == [0, 1, 2, 3, 4]
+    assert pages == 3
+
+
+def test_full_final_page_has_no_next_cursor(db, record):
+    page, cursor = page_segments(db, record, cursor=3, limit=2)
+    assert _ids(page) == [3, 4]
+    assert cursor is None
+
+
+def test_page_past_the_end_is_empty(db, record):
+    assert page_segments(db, record, cursor=5, limit=2) == ([], None)
+
+
+def test_paged_range_matches_segments_in_range(db, record):
+    page, cursor = page_segments(db, record, start=12.0, end=14.0, limit=10)
+    assert _ids(page) == _ids(segments_in_range(db, FILENAME, 12.0, 14.0, record=record))
+    assert cursor is None
+
+
+# --------------------------
+# apply_segment_edits
+# --------------------------
+def test_stale_revision_is_rejected(db, record):
+    with pytest.raises(SegmentEditError):
+        apply_segment_edits(db, FILENAME, [{"id": 0, "text": "Hi."}], expected_revision=record.revision - 1)
+    db.rollback()
+    assert all_segments(db, FILENAME)[0]["text"] == "Welcome back."
+    assert record.revision == 1
+
+
+def test_missing_segment_id_is_rejected(db, record):
+    with pytest.raises(LookupError, match=r"\[99\]"):
+        apply_segment_edits(db, FILENAME, [{"id": 0, "text": "Hi."}, {"id": 99, "text": "Nope."}])
+    db.rollback()
+    assert all_segments(db, FILENAME)[0]["text"] == "Welcome back."
+
+
+def test_missing_transcript_is_rejected(db):
+    with pytest.raises(LookupError):
+        apply_segment_edits(db, "missing.mp4", [{"id": 0, "text": "Hi."}])
+
+
+def test_start_after_end_is_rejected(db, record):
+    with pytest.raises(SegmentEditError):
+        apply_segment_edits(db, FILENAME, [{"id": 2, "start": 13.0, "end": 12.5}])
+    db.rollback()
+    assert all_segments(db, FILENAME)[2]["start"] == 12.0
+
+
+def test_edit_bumps_revision(db, record):
+    apply_segment_edits(db, FILENAME, [{"id": 2, "text": "Exactly."}], expected_revision=1)
+    db.commit()
+    assert record.revision == 2
+    assert all_segments(db, FILENAME)[2]["text"] == "Exactly."
+
+
+# --------------------------
+# _sync_transcript_json
+# --------------------------
+def test_edits_are_copied_into_the_transcript_json(db, record):
+    apply_segment_edits(db, FILENAME, [
+        {"id": 1, "text": "A shorter answer.", "end": 10.0},
+        {"id": 4, "start": 15.2},
+    ])
+    db.commit()
+
+    transcript = json.loads(record.transcript)
+    rows = all_segments(db, FILENAME)
+    assert [(seg["start"], seg["end"], seg["text"]) for seg in transcript["segments"]] == [
+        (row["start"], row["end"], row["text"]) for row in rows
+    ]
+    assert transcript["segments"][1]["text"] == "A shorter answer."
+    assert transcript["segments"][4]["start"] == 15.2
+    assert transcript["text"] == " ".join(row["text"] for row in rows)
+
+
+def test_transcript_json_without_segments_is_left_alone(db, record):
+    record.transcript = json.dumps({"text": "plain"})
+    db.commit()
+    apply_segment_edits(db, FILENAME, [{"id": 0, "text": "Hi."}])
+    db.commit()
+    assert json.loads(record.transcript) == {"text": "plain"}
+    assert all_segments(db, FILENAME)[0]["text"] == "Hi."
@@ -0,0 +1,95 @@
+"""
+Media index: one ffprobe pass over a video at ingest, stored as a JSON sidecar
+next to it, so clip renders can plan cuts without probing the source again.
+
+Layout (version 2):
+    duration, size, format, bit_rate
+    start_time: container start in seconds; clip times (and ffmpeg's -ss) are relative to it
+    video: codec_name, profile, level, pix_fmt, width, height, fps, time_base, bit_rate
+    audio: codec_name, channels, channel_layout, sample_rate, bit_rate (or null)
+    keyframes: keyframe pts in seconds (ms precision, absolute), ascending
+    keyframe_offsets: byte position of each keyframe packet (-1 if unknown)
+"""
+import json
+import subprocess
+
+MEDIA_INDEX_VERSION = 2
+
+VIDEO_FIELDS = ("codec_name", "profile", "level", "pix_fmt", "width", "height", "time_base", "bit_rate")
+AUDIO_FIELDS = ("codec_name", "channels", "channel_layout", "sample_rate", "bit_rate")
+
+
+def _probe_json(source, input_options, entries):
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", *input_options, "-show_entries", entries, "-of", "json", source],
+        check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    return json.loads(result.stdout)
+
+
+def _number(value, cast=float):
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _rate(value):
+    num, _, den = str(value or "").partition("/")
+    num, den = _number(num), _number(den or 1)
+    return round(num / den, 3) if num and den else None
+
+
+def _fields(stream, fields):
+    values = {field: stream.get(field) for field in fields}
+    for field in ("bit_rate", "sample_rate"):
+        if field in values:
+            values[field] = _number(values[field], int)
+    return values
+
+
+def build_media_index(source, input_options=()):
+    """Probes the container, streams and every video keyframe packet of source."""
+    input_options = list(input_options)
+    info = _probe_json(
+        source, input_options,
+        "format=duration,size,format_name,bit_rate,start_time"
+        ":stream=codec_type,codec_name,profile,level,pix_fmt,width,height,r_frame_rate,time_base,"
+        "bit_rate,channels,channel_layout,sample_rate"
+    )
+    streams = info.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"), None)
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+    fmt = info.get("format", {})
+
+    keyframes, offsets = [], []
+    if video:
+        packets = subprocess.run(
+            ["ffprobe", "-v", "error", *input_options, "-select_streams", "v:0",
+             "-show_entries", "packet=pts_time,pos,flags", "-of", "csv=p=0", source],
+            check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        for line in packets.stdout.decode().splitlines():
+            parts = line.strip().split(",")
+            if len(parts) < 3 or "K" not in parts[2]:
+                continue
+            pts, pos = _number(parts[0]), _number(parts[1], int)
+            if pts is not None:
+                keyframes.append(round(pts, 3))
+                offsets.append(pos if pos is not None else -1)
+        order = sorted(range(len(keyframes)), key=keyframes.__getitem__)
+        keyframes = [keyframes[i] for i in order]
+        offsets = [offsets[i] for i in order]
+
+    return {
+        "version": MEDIA_INDEX_VERSION,
+        "duration": _number(fmt.get("duration")),
+        "size": _number(fmt.get("size"), int),
+        "format": fmt.get("format_name"),
+        "bit_rate": _number(fmt.get("bit_rate"), int),
+        "start_time": _number(fmt.get("start_time")) or 0.0,
+        "video": dict(_fields(video, VIDEO_FIELDS), fps=_rate(video.get("r_frame_rate"))) if video else None,
+        "audio": _fields(audio, AUDIO_FIELDS) if audio else None,
+        "keyframes": keyframes,
+        "keyframe_offsets": offsets,
+    }
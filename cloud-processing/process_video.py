@@ -1,18 +1,59 @@
 import os
+import json
 import subprocess
 import boto3
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from smart_cut import smart_cut
+from media_index import build_media_index
+from renditions import RENDITIONS, rendition_key, check_profiles, render_renditions
 
 # Load envs passed via ECS task
-MODE = os.environ.get("MODE")  # "extract_audio" or "generate_clip"
+MODE = os.environ.get("MODE")  # "extract_audio", "index_media", "generate_clip" or "generate_clips"
 
 BUCKET = os.environ["BUCKET"]
 INPUT_KEY = os.environ["INPUT_KEY"]
-OUTPUT_KEY = os.environ["OUTPUT_KEY"]
+OUTPUT_KEY = os.environ.get("OUTPUT_KEY", "")  # Not used by "generate_clips"
+
+# Media index sidecar (see media_index.py): written by "extract_audio" and
+# "index_media", read by the clip modes so cuts are planned without ffprobe
+MEDIA_INDEX_KEY = os.environ.get("MEDIA_INDEX_KEY")
 
 START = float(os.environ.get("START", 0))
 END = float(os.environ.get("END", 0))
 
+# "generate_clip": comma-separated render profiles (see renditions.py); each is
+# uploaded to rendition_key(OUTPUT_KEY, profile)
+PROFILES = [p.strip() for p in os.environ.get("PROFILES", "default").split(",") if p.strip()]
+
+# Optional completion callback (POST /ecs/callback on the API)
+CALLBACK_URL = os.environ.get("CALLBACK_URL")
+CALLBACK_TOKEN = os.environ.get("CALLBACK_TOKEN", "")
+
+# "generate_clips": JSON list of {"start", "end", "output_key", "profiles"},
+# inline in MANIFEST or as an S3 object (MANIFEST_KEY) when too big for an env var
+MANIFEST = os.environ.get("MANIFEST")
+MANIFEST_KEY = os.environ.get("MANIFEST_KEY")
+
+# "stream": ffmpeg reads a presigned URL and seeks on the input, so only the
+# byte ranges of the clip (plus the index) are fetched. "download": copy the
+# whole source to /tmp first. "auto" streams single clips and downloads for
+# audio extraction and batches, which read most of the file anyway.
+INPUT_MODE = os.environ.get("INPUT_MODE", "auto")
+PRESIGN_EXPIRES = int(os.environ.get("PRESIGN_EXPIRES", "3600"))
+
+# Keep HTTP inputs alive across dropped connections instead of failing the cut
+HTTP_INPUT_ARGS = ["-reconnect", "1", "-reconnect_streamed", "1", "-reconnect_delay_max", "5"]
+
+# Concurrent ffmpeg processes; the vCPUs are split between them
+VCPUS = os.cpu_count() or 1
+CLIP_WORKERS = int(os.environ.get("CLIP_WORKERS", VCPUS))
+
+# "smart": stream-copy whole GOPs and re-encode only the clip's edges
+# (falls back to a full re-encode when the source can't be copied). "full": always re-encode.
+RENDER_MODE = os.environ.get("RENDER_MODE", "smart")
+
+
 s3 = boto3.client("s3")
 
 INPUT_FILE = "/tmp/input.mp4"
@@ -28,32 +69,190 @@ def upload_to_s3(bucket, key, file_path, content_type):
     s3.upload_file(file_path, bucket, key, ExtraArgs={"ContentType": content_type})
     print("✅ Upload complete")
 
-def extract_audio():
+def presigned_input_url(bucket, key):
+    return s3.generate_presigned_url(
+        "get_object", Params={"Bucket": bucket, "Key": key}, ExpiresIn=PRESIGN_EXPIRES
+    )
+
+def resolve_input(streamable):
+    """Returns what ffmpeg should read: a presigned URL or the downloaded file."""
+    if INPUT_MODE == "stream" or (INPUT_MODE == "auto" and streamable):
+        print(f"🌐 Streaming s3://{BUCKET}/{INPUT_KEY} with input-side seeking")
+        return presigned_input_url(BUCKET, INPUT_KEY)
+    download_from_s3(BUCKET, INPUT_KEY, INPUT_FILE)
+    return INPUT_FILE
+
+def input_options(source):
+    """Reconnect options for URL sources, nothing for local files."""
+    return HTTP_INPUT_ARGS if source.startswith("http") else []
+
+def input_args(source):
+    return input_options(source) + ["-i", source]
+
+def write_media_index(source, key):
+    print(f"🗂️ Indexing {INPUT_KEY}")
+    index = build_media_index(source, input_options(source))
+    s3.put_object(Bucket=BUCKET, Key=key, Body=json.dumps(index), ContentType="application/json")
+    print(f"✅ Media index: {len(index['keyframes'])} keyframes, {index['duration']}s -> s3://{BUCKET}/{key}")
+
+def load_media_index():
+    """The sidecar index for INPUT_KEY, or None (clips then probe the source themselves)."""
+    if not MEDIA_INDEX_KEY:
+        return None
+    try:
+        return json.loads(s3.get_object(Bucket=BUCKET, Key=MEDIA_INDEX_KEY)["Body"].read())
+    except Exception as e:
+        print(f"⚠️ Could not load media index {MEDIA_INDEX_KEY}: {e}")
+        return None
+
+def notify_completion(output_key, status="succeeded", error=None):
+    if not CALLBACK_URL:
+        return
+    try:
+        requests.post(
+            CALLBACK_URL,
+            json={"output_key": output_key, "status": status, "error": error},
+            headers={"X-Callback-Token": CALLBACK_TOKEN},
+            timeout=10,
+        )
+        print(f"📬 Notified {CALLBACK_URL}: {output_key} {status}")
+    except requests.RequestException as e:
+        # The API falls back to polling S3, so a lost callback only adds latency
+        print(f"⚠️ Completion callback failed: {e}")
+
+def extract_audio(source):
+    if MEDIA_INDEX_KEY:
+        # The whole file is local already; indexing it here saves a separate task
+        try:
+            write_media_index(source, MEDIA_INDEX_KEY)
+        except Exception as e:
+            print(f"⚠️ Media indexing failed: {e}")
+
     audio_path = OUTPUT_FILE + ".mp3"
     cmd = [
-        "ffmpeg", "-y", "-i", INPUT_FILE,
+        "ffmpeg", "-y", *input_args(source),
         "-vn", "-acodec", "mp3", "-ar", "16000", audio_path
     ]
     subprocess.run(cmd, check=True)
     upload_to_s3(BUCKET, OUTPUT_KEY, audio_path, "audio/mpeg")
 
-def generate_clip():
-    clip_path = OUTPUT_FILE + ".mp4"
-    cmd = [
-        "ffmpeg", "-y", "-ss", str(START), "-t", str(END - START),
-        "-i", INPUT_FILE,
-        "-c:v", "libx264", "-c:a", "aac", "-strict", "experimental",
-        clip_path
-    ]
-    subprocess.run(cmd, check=True)
-    upload_to_s3(BUCKET, OUTPUT_KEY, clip_path, "video/mp4")
+def render_clip(source, start, end, outputs, threads=None, index=None):
+    """
+    Renders {profile: local path}. A smart-cut "default" copies most of its
+    GOPs; all other profiles share one decode of the clip window.
+    """
+    outputs = dict(outputs)
+    if RENDER_MODE == "smart" and "default" in outputs:
+        known = {
+            "keyframes": index["keyframes"],
+            "streams": (index["video"], index["audio"]),
+            "start_time": index.get("start_time"),  # version 1 indexes predate it; probed then
+        } if index else {}
+        result = smart_cut(source, start, end, outputs.pop("default"), input_options(source), threads, **known)
+        print(f"✂️ {result['mode']} cut: {result['copied']:.1f}s copied, {result['reencoded']:.1f}s re-encoded")
 
-if __name__ == "__main__":
-    download_from_s3(BUCKET, INPUT_KEY, INPUT_FILE)
+    if outputs:
+        # -ss before the input seeks in the demuxer, so a URL source only fetches the window
+        render_renditions(source, start, end, outputs, input_options(source), threads)
 
-    if MODE == "extract_audio":
-        extract_audio()
-    elif MODE == "generate_clip":
-        generate_clip()
+def upload_renditions(output_key, outputs, notify_default=True):
+    """Uploads every rendition and reports each key; the default key only if notify_default."""
+    for profile, path in outputs.items():
+        key = rendition_key(output_key, profile)
+        upload_to_s3(BUCKET, key, path, RENDITIONS[profile]["content_type"])
+        if profile != "default" or notify_default:
+            notify_completion(key)
+
+def local_outputs(prefix, profiles):
+    return {profile: f"{prefix}_{profile}{RENDITIONS[profile]['ext']}" for profile in profiles}
+
+def generate_clip(source):
+    check_profiles(PROFILES)
+    outputs = local_outputs(OUTPUT_FILE, PROFILES)
+    render_clip(source, START, END, outputs, index=load_media_index())
+    # OUTPUT_KEY itself is reported by the caller, like in the other modes
+    upload_renditions(OUTPUT_KEY, outputs, notify_default=False)
+
+def load_manifest():
+    if MANIFEST:
+        entries = json.loads(MANIFEST)
+    elif MANIFEST_KEY:
+        body = s3.get_object(Bucket=BUCKET, Key=MANIFEST_KEY)["Body"].read()
+        entries = json.loads(body)
     else:
-        raise ValueError("Invalid MODE. Must be 'extract_audio' or 'generate_clip'.")
+        raise ValueError("MODE 'generate_clips' needs MANIFEST or MANIFEST_KEY.")
+    for entry in entries:
+        entry["start"] = float(entry["start"])
+        entry["end"] = float(entry["end"])
+        entry["profiles"] = entry.get("profiles") or [entry.get("profile", "default")]
+        check_profiles(entry["profiles"])
+    return entries
+
+def generate_clips(source, entries, index=None):
+    """
+    Renders every manifest entry from the one downloaded input, at most
+    CLIP_WORKERS at a time, and reports each output as soon as it is uploaded.
+    Returns the number of failed clips.
+    """
+    workers = max(1, min(CLIP_WORKERS, len(entries)))
+    threads = max(1, VCPUS // workers)
+    print(f"🎬 Rendering {len(entries)} clips, {workers} at a time ({threads} threads each)")
+
+    def run(item):
+        i, entry = item
+        outputs = local_outputs(f"{OUTPUT_FILE}_{i}", entry["profiles"])
+        try:
+            render_clip(source, entry["start"], entry["end"], outputs, threads, index)
+            upload_renditions(entry["output_key"], outputs)
+        except Exception as e:
+            print(f"❌ Clip {entry['output_key']} failed: {e}")
+            notify_completion(entry["output_key"], status="failed", error=str(e))
+            return False
+        finally:
+            for path in outputs.values():
+                if os.path.exists(path):
+                    os.remove(path)
+        return True
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(run, enumerate(entries)))
+    return results.count(False)
+
+def run_batch():
+    # Every output is reported individually, including when the shared download fails
+    entries = []
+    try:
+        entries = load_manifest()
+        source = resolve_input(streamable=False)
+    except Exception as e:
+        for entry in entries:
+            notify_completion(entry["output_key"], status="failed", error=str(e))
+        raise
+    failed = generate_clips(source, entries, load_media_index())
+    if failed:
+        raise SystemExit(f"❌ {failed} of {len(entries)} clips failed")
+
+if __name__ == "__main__":
+    if MODE == "generate_clips":
+        run_batch()
+        raise SystemExit(0)
+
+    try:
+        if MODE not in ("extract_audio", "index_media", "generate_clip"):
+            raise ValueError(
+                "Invalid MODE. Must be 'extract_audio', 'index_media', 'generate_clip' or 'generate_clips'."
+            )
+
+        source = resolve_input(streamable=MODE in ("index_media", "generate_clip"))
+
+        if MODE == "extract_audio":
+            extract_audio(source)
+        elif MODE == "index_media":
+            write_media_index(source, OUTPUT_KEY)
+        else:
+            generate_clip(source)
+    except Exception as e:
+        notify_completion(OUTPUT_KEY, status="failed", error=str(e))
+        raise
+
+    notify_completion(OUTPUT_KEY)
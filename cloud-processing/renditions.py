@@ -0,0 +1,92 @@
+"""
+Render profiles for a clip. Every profile except a smart-cut "default" is
+produced by one ffmpeg invocation: the clip window is decoded once, split into
+one filter branch per profile and encoded N times, instead of N full passes.
+
+Output keys follow rendition_key(); the backend derives the same keys
+(services/artifact_store.rendition_key) to record the rendition URLs.
+"""
+import os
+import subprocess
+
+# Frames in the animated WebP thumbnail strip, played back at THUMBNAIL_FPS
+THUMBNAIL_FRAMES = int(os.environ.get("THUMBNAIL_FRAMES", "12"))
+THUMBNAIL_FPS = 4
+
+RENDITIONS = {
+    # Source resolution; the clip_url of the clip
+    "default": {
+        "filter": "null",
+        "args": ["-c:v", "libx264", "-c:a", "aac", "-strict", "experimental"],
+        "audio": True, "ext": ".mp4", "content_type": "video/mp4",
+    },
+    # 9:16 1080p for TikTok/Reels/Shorts: fill the frame, crop the sides
+    "tiktok": {
+        "filter": "scale=1080:1920:force_original_aspect_ratio=increase,crop=1080:1920,setsar=1",
+        "args": ["-c:v", "libx264", "-preset", "veryfast", "-crf", "21", "-pix_fmt", "yuv420p",
+                 "-c:a", "aac", "-b:a", "128k", "-movflags", "+faststart"],
+        "audio": True, "ext": ".mp4", "content_type": "video/mp4",
+    },
+    # Light copy (at most 720p) for in-app playback
+    "preview": {
+        "filter": "scale=-2:min(720\\,ih)",
+        "args": ["-c:v", "libx264", "-preset", "veryfast", "-crf", "28", "-pix_fmt", "yuv420p",
+                 "-c:a", "aac", "-b:a", "96k", "-movflags", "+faststart"],
+        "audio": True, "ext": ".mp4", "content_type": "video/mp4",
+    },
+    # Most representative frame of the opening seconds
+    "poster": {
+        "filter": "thumbnail=90,scale=-2:min(720\\,ih)",
+        "args": ["-frames:v", "1", "-q:v", "3"],
+        "audio": False, "ext": ".jpg", "content_type": "image/jpeg",
+    },
+    # Animated strip of THUMBNAIL_FRAMES frames spread over the clip
+    "thumbnail": {
+        "filter": "fps={strip_fps},scale=320:-2,setpts=N/(%d*TB)" % THUMBNAIL_FPS,
+        "args": ["-c:v", "libwebp_anim", "-loop", "0", "-quality", "60"],
+        "audio": False, "ext": ".webp", "content_type": "image/webp",
+    },
+}
+
+
+def rendition_key(output_key, profile):
+    """The "default" rendition is output_key itself; others get a suffix and their extension."""
+    if profile == "default":
+        return output_key
+    root, _ = os.path.splitext(output_key)
+    return f"{root}_{profile}{RENDITIONS[profile]['ext']}"
+
+
+def check_profiles(profiles):
+    unknown = [profile for profile in profiles if profile not in RENDITIONS]
+    if unknown:
+        raise ValueError(f"Unknown render profiles: {', '.join(unknown)}")
+
+
+def render_renditions(source, start, end, outputs, input_options=(), threads=None):
+    """
+    Renders every profile in outputs ({profile: local path}) from a single
+    decode of [start, end).
+    """
+    profiles = list(outputs)
+    duration = end - start
+    branches = "".join(f"[s{i}]" for i in range(len(profiles)))
+    graph = [f"[0:v:0]split={len(profiles)}{branches}"]
+    for i, profile in enumerate(profiles):
+        video_filter = RENDITIONS[profile]["filter"].format(strip_fps=round(THUMBNAIL_FRAMES / duration, 4))
+        graph.append(f"[s{i}]{video_filter}[o{i}]")
+
+    cmd = [
+        "ffmpeg", "-y", "-ss", str(start), "-t", str(duration),
+        *input_options, "-i", source,
+        "-filter_complex", ";".join(graph),
+    ]
+    for i, profile in enumerate(profiles):
+        rendition = RENDITIONS[profile]
+        cmd += ["-map", f"[o{i}]"]
+        cmd += ["-map", "0:a:0?"] if rendition["audio"] else ["-an"]
+        cmd += rendition["args"]
+        if threads:
+            cmd += ["-threads", str(threads)]
+        cmd.append(outputs[profile])
+    subprocess.run(cmd, check=True)
@@ -68,20 +68,86 @@ const Upload = ({ refreshVideos }) => {
   };
 
 
+  // Poll the background ingest job until the transcript is ready
+  const waitForJob = async (jobId) => {
+    while (true) {
+      const { data } = await api.get(`http://127.0.0.1:8000/jobs/${jobId}`);
+      if (data.status === "succeeded") return true;
+      if (data.status === "failed") {
+        toast.error(`❌ Processing failed: ${data.error}`);
+        return false;
+      }
+      await new Promise((resolve) => setTimeout(resolve, 2000));
+    }
+  };
+
+  // Presigned multipart upload: parts go straight to S3 in parallel.
+  // The upload id is kept in localStorage so a retry resumes missing parts only.
+  const PARALLEL_PARTS = 4;
+
+  const uploadParts = async (parts, partSize) => {
+    const queue = [...parts];
+    const worker = async () => {
+      while (queue.length) {
+        const { part_number, url } = queue.shift();
+        const start = (part_number - 1) * partSize;
+        const body = file.slice(start, start + partSize);
+        // S3 checks each part against its SHA-256 and derives the content hash from them
+        const digest = await crypto.subtle.digest("SHA-256", await body.arrayBuffer());
+        const res = await fetch(url, {
+          method: "PUT",
+          body,
+          headers: {
+            "x-amz-checksum-sha256": btoa(String.fromCharCode(...new Uint8Array(digest))),
+          },
+        });
+        if (!res.ok) throw new Error(`Part ${part_number} failed: ${res.status}`);
+      }
+    };
+    await Promise.all(Array.from({ length: PARALLEL_PARTS }, worker));
+  };
+
   const handleUpload = async () => {
     if (!file) return null;
 
     setLoading(true);
-    const formData = new FormData();
-    formData.append("file", file);
+    const resumeKey = `upload:${file.name}:${file.size}:${file.lastModified}`;
 
     try {
-      const response = await api.post("http://127.0.0.1:8000/upload/", formData, {
-        headers: { "Content-Type": "multipart/form-data" },
-      });
+      let uploadId = localStorage.getItem(resumeKey);
+      let session = null;
+
+      if (uploadId) {
+        try {
+          session = (await api.get(`http://127.0.0.1:8000/uploads/${uploadId}`)).data;
+        } catch {
+          localStorage.removeItem(resumeKey);
+        }
+      }
+
+      if (!session) {
+        session = (
+          await api.post("http://127.0.0.1:8000/uploads/initiate", {
+            filename: file.name,
+            size: file.size,
+            content_type: file.type,
+          })
+        ).data;
+        uploadId = session.upload_id;
+        localStorage.setItem(resumeKey, uploadId);
+      }
+
+      await uploadParts(session.parts, session.part_size);
+
+      const response = await api.post(`http://127.0.0.1:8000/uploads/${uploadId}/complete`);
+      localStorage.removeItem(resumeKey);
 
       toast.success(`✅ Upload Successful: ${response.data.filename}`);
       refreshVideos();
+
+      if (response.data.job_id && !(await waitForJob(response.data.job_id))) {
+        return null;
+      }
       return response.data.filename;
     } catch (error) {
       console.error("Upload failed:", error);